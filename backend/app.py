@@ -1,26 +1,88 @@
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Request, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+from pydantic import BaseModel
 import os
-import tempfile
+import time
+import uuid
 import asyncio
-import subprocess
 
-# ── TEST MODE: set to False to use real AI APIs ──
-TEST_MODE = True
+import providers
+from jobs import JobStore, JobQueue, QUEUED, RUNNING, DONE, FAILED, EXPIRED, public_view
+from cache import get_cache
+from uploads import save_upload, UploadError
+from pipeline import TEST_MODE, FINAL_VIDEO_NAME, parse_languages, close_loop_clients
+from video_processor import language_video_name
+from workspace import WorkspaceManager
+from delivery import range_file_response, follow_file
+from batch import load_manifest, run_batch
+from progress import ProgressBus
+from ratelimit import estimated_wait
+import metrics
 
-if not TEST_MODE:
-    from trickshot_summary import getSummary
-    from commentator_script import getScript
-    from eleven_sfx import generate_crowd_sfx_mp3
-    from tts_chris import generate_chris_mp3
-    from video_processor import VideoProcessor
+# Top the crowd-audio bank up in the background when the server starts
+CROWD_BANK_FILL_ON_STARTUP = os.getenv("CROWD_BANK_FILL_ON_STARTUP", "1") == "1"
 
-# Sample files for test mode (no API calls)
-SAMPLE_VOICE = os.path.join(os.path.dirname(__file__), "..", "test-vids", "trickshot-voice.mp3")
-SAMPLE_CROWD = os.path.join(os.path.dirname(__file__), "..", "test-vids", "crowd-noises.mp3")
 
-app = FastAPI(title="From the Sidelines", description="AI-powered trickshot commentary generator")
+# A socket that can't take a progress message within this many seconds is closed
+PROGRESS_SEND_TIMEOUT = float(os.getenv("PROGRESS_SEND_TIMEOUT", "10"))
+
+# Uploads are turned away (503 with Retry-After) while a new job would wait
+# longer than this many seconds for a worker and the external APIs
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "300"))
+
+# Finished /batch runs stay visible at GET /batch/{id} for this many seconds
+BATCH_TTL = float(os.getenv("BATCH_TTL", str(24 * 3600)))
+
+# /batch only reads clips and manifests from, and writes results to, this directory
+BATCH_ROOT = os.path.realpath(os.getenv("BATCH_ROOT", os.path.join(os.path.dirname(__file__), "batch_data")))
+
+job_store = JobStore()
+progress_bus = ProgressBus()
+job_queue = JobQueue(job_store, bus=progress_bus)
+
+metrics.Gauge("job_queue_depth", "Jobs waiting for a worker", function=job_queue.depth)
+metrics.Gauge("jobs_in_flight", "Jobs currently being processed", function=job_queue.in_flight)
+metrics.Gauge("progress_subscribers", "Open progress subscriptions", function=progress_bus.subscriber_count)
+
+
+def job_is_active(job_id: str) -> bool:
+    job = job_store.get(job_id)
+    return job is not None and job["status"] in (QUEUED, RUNNING)
+
+
+def job_workspace_removed(job_id: str):
+    job = job_store.get(job_id)
+    # Failed jobs keep their status so /result still reports the error
+    if job is not None and job["status"] == DONE:
+        job_store.update(job_id, status=EXPIRED, result_path=None)
+        progress_bus.update_threadsafe(job, status=EXPIRED)
+
+
+workspaces = WorkspaceManager(is_active=job_is_active, on_removed=job_workspace_removed)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    progress_bus.bind()
+    if CROWD_BANK_FILL_ON_STARTUP and not TEST_MODE and providers.readiness()["sfx"]["ready"]:
+        from crowd_bank import get_bank, CROWD_PROMPTS
+        for variant in CROWD_PROMPTS:
+            get_bank().refill_in_background(variant)
+    await job_queue.start()
+    workspaces.start()
+    yield
+    await workspaces.stop()
+    await job_queue.stop()
+    await close_loop_clients()
+
+
+app = FastAPI(
+    title="From the Sidelines",
+    description="AI-powered trickshot commentary generator",
+    lifespan=lifespan,
+)
 
 # CORS middleware
 app.add_middleware(
@@ -31,154 +93,312 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Active WebSocket connections keyed by client_id
-ws_connections: dict[str, WebSocket] = {}
-
+async def stream_progress(websocket: WebSocket, key: str, initial: dict | None = None):
+    """
+    Send a progress channel's snapshots to a websocket until either side goes away.
 
-async def send_progress(client_id: str, step: int, message: str):
-    ws = ws_connections.get(client_id)
-    if ws:
+    An idle socket costs two parked tasks and no polling. A client that stops
+    reading only ever has the latest few snapshots queued for it (see
+    ProgressBus), and is disconnected if a send stalls for PROGRESS_SEND_TIMEOUT.
+    """
+    with progress_bus.subscribe(key, initial) as subscription:
+        async def watch_disconnect():
+            try:
+                while (await websocket.receive())["type"] != "websocket.disconnect":
+                    pass
+            finally:
+                subscription.close()
+
+        watcher = asyncio.create_task(watch_disconnect())
         try:
-            await ws.send_json({"step": step, "total": 5, "message": message})
-        except Exception:
+            async for snapshot in subscription:
+                await asyncio.wait_for(websocket.send_json(snapshot), PROGRESS_SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"Closing stalled progress socket on {key}")
+            try:
+                await websocket.close(code=1013)
+            except Exception:
+                pass
+        except (WebSocketDisconnect, RuntimeError):
             pass
+        finally:
+            watcher.cancel()
 
 
 @app.websocket("/ws/{client_id}")
 async def websocket_endpoint(websocket: WebSocket, client_id: str):
+    """Progress of every job uploaded with this client_id."""
     await websocket.accept()
-    ws_connections[client_id] = websocket
-    try:
-        while True:
-            await websocket.receive_text()
-    except WebSocketDisconnect:
-        pass
-    finally:
-        ws_connections.pop(client_id, None)
-
-
-@app.post("/generate-commentary")
-async def generate_commentary(
-    video: UploadFile = File(...),
-    language: str = Form("en"),
-    trickshot_name: str = Form(""),
-    client_id: str = Form(""),
-):
+    await stream_progress(websocket, f"client:{client_id}")
+
+
+@app.websocket("/ws/jobs/{job_id}")
+async def job_progress_endpoint(websocket: WebSocket, job_id: str):
+    """Progress of one job; its current state is sent first, even if it has finished."""
+    await websocket.accept()
+    job = job_store.get(job_id)
+    if job is None:
+        await websocket.close(code=4404)
+        return
+    initial = {
+        **public_view(job), "stage": "", "state": "", "stages": {},
+        "percent": 100.0 if job["status"] == DONE else 0.0,
+    }
+    await stream_progress(websocket, f"job:{job_id}", initial)
+
+
+@app.post("/generate-commentary", status_code=202)
+async def generate_commentary(request: Request):
     """
-    Upload a trickshot video and get back a commentated version with crowd noise.
-    Progress updates sent via WebSocket if client_id is connected.
+    Upload a trickshot video and queue it for commentary.
+
+    Multipart form fields: video (file), language, trickshot_name, client_id.
+    language may list several codes ("en,fr,ur"): they share one analysis and
+    the result gets an audio track per language.
+    The video is streamed to disk in chunks rather than read into memory.
+    Returns a job id; poll GET /jobs/{job_id} and fetch GET /jobs/{job_id}/result when done.
+    Live progress is sent over WebSocket: /ws/jobs/{job_id} for this job, or
+    /ws/{client_id} for every job uploaded with that client_id.
     """
 
-    temp_dir = tempfile.mkdtemp()
+    # Shed load before reading the upload, rather than queueing a job that
+    # would only time out or run into provider 429s
+    wait = job_queue.estimated_wait() + estimated_wait()
+    if wait > ADMISSION_MAX_WAIT:
+        metrics.JOBS_SHED.inc()
+        retry_after = min(3600, max(1, round(wait - ADMISSION_MAX_WAIT)))
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server is busy (estimated wait {wait:.0f}s), try again later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    job_id = uuid.uuid4().hex
+    job_dir = workspaces.create(job_id)
 
     try:
-        # Save uploaded video
-        video_path = os.path.join(temp_dir, "trickshot.mp4")
-        with open(video_path, "wb") as f:
-            f.write(await video.read())
-
-        print(f"Video saved: {video_path}")
-
-        if TEST_MODE:
-            # ── TEST MODE: skip AI APIs, just overlay sample audio with ffmpeg ──
-            await send_progress(client_id, 1, "Analyzing trickshot...")
-            await asyncio.sleep(1)
-
-            await send_progress(client_id, 2, "Generating commentary script...")
-            await asyncio.sleep(1)
-
-            await send_progress(client_id, 3, "Generating voice over...")
-            await asyncio.sleep(1)
-
-            await send_progress(client_id, 4, "Generating crowd audio...")
-            await asyncio.sleep(1)
-
-            await send_progress(client_id, 5, "Combining final video...")
-            final_video = os.path.join(temp_dir, "final-output.mp4")
-
-            def run_ffmpeg():
-                subprocess.run([
-                    "ffmpeg", "-y",
-                    "-i", video_path,
-                    "-i", os.path.abspath(SAMPLE_VOICE),
-                    "-i", os.path.abspath(SAMPLE_CROWD),
-                    "-filter_complex",
-                    "[1:a]volume=1.0[voice];[2:a]volume=0.3[crowd];[voice][crowd]amix=inputs=2:duration=shortest[mixed]",
-                    "-map", "0:v",
-                    "-map", "[mixed]",
-                    "-c:v", "copy",
-                    "-shortest",
-                    final_video,
-                ], check=True)
-
-            await asyncio.to_thread(run_ffmpeg)
-
-        else:
-            # ── PRODUCTION: real AI pipeline ──
-            # Step 1: Analyze video
-            await send_progress(client_id, 1, "Analyzing trickshot...")
-            print("Step 1: Analyzing video...")
-            summary = await asyncio.to_thread(getSummary, video_path)
-
-            # Step 2: Generate script
-            await send_progress(client_id, 2, "Generating commentary script...")
-            print("Step 2: Generating commentary script...")
-            script = await asyncio.to_thread(getScript, summary, language, trickshot_name, video_path)
-
-            # Step 3: Generate commentary audio
-            await send_progress(client_id, 3, "Generating voice over...")
-            print("Step 3: Generating commentary audio...")
-            voice_file = os.path.join(temp_dir, "trickshot-voice.mp3")
-            await asyncio.to_thread(generate_chris_mp3, script, out_path=voice_file)
-
-            # Step 4: Generate crowd noise
-            await send_progress(client_id, 4, "Generating crowd audio...")
-            print("Step 4: Generating crowd noise...")
-            crowd_prompt = (
-                "Background audio of a crowded basketball arena as heard through a TV broadcast. "
-                "Include cheering, clapping, chanting, and natural crowd reactions. "
-                "No narration or music."
-            )
-            crowd_file = os.path.join(temp_dir, "crowd-noises.mp3")
-            await asyncio.to_thread(
-                generate_crowd_sfx_mp3, crowd_prompt, crowd_file,
-                duration_seconds=20, loop=False
-            )
+        # Stream uploaded video to disk, hashing and probing it as it arrives
+        video_path = os.path.join(job_dir, "trickshot.mp4")
+        fields, video = await save_upload(request, video_path)
 
-            # Step 5: Process video with audio
-            await send_progress(client_id, 5, "Combining final video...")
-            print("Step 5: Processing video with audio...")
-
-            def run_video_processing():
-                original_cwd = os.getcwd()
-                os.chdir(temp_dir)
-                try:
-                    processor = VideoProcessor(video_path, voice_file, crowd_file)
-                    processor.process(cleanup=True)
-                    return processor.final_video
-                finally:
-                    os.chdir(original_cwd)
-
-            final_video_name = await asyncio.to_thread(run_video_processing)
-            final_video = os.path.join(temp_dir, final_video_name)
-
-        print(f"Final video: {final_video}")
-
-        # Return the file
-        return FileResponse(
-            final_video,
-            media_type="video/mp4",
-            filename="commentated-trickshot.mp4"
+        print(f"Video saved: {video_path} ({video['size']} bytes)")
+
+        try:
+            languages = parse_languages(fields.get("language", "en"))
+        except ValueError as e:
+            raise UploadError(400, str(e))
+
+        job_queue.submit(
+            job_dir, video_path,
+            ",".join(languages),
+            fields.get("trickshot_name", ""),
+            fields.get("client_id", ""),
+            job_id=job_id,
+            video_sha256=video["sha256"],
+            video_info=video["info"],
         )
 
+    except UploadError as e:
+        workspaces.remove(job_id)
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     except Exception as e:
         print(f"Error: {e}")
+        workspaces.remove(job_id)
         raise HTTPException(status_code=500, detail=str(e))
 
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Current status and progress of a job."""
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return public_view(job)
+
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, request: Request, language: str | None = None):
+    """
+    The commentated video, once the job is done.
+    Supports HTTP Range requests so players can seek.
+    For multi-language jobs, ?language=fr returns a copy with only that
+    language's audio track; without it, the video carries every track.
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == FAILED:
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["status"] == EXPIRED:
+        raise HTTPException(status_code=410, detail="Result has been deleted")
+    if job["status"] != DONE:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+
+    result_path = job["result_path"]
+    # The full video carries every language, so sending it delivers the whole job
+    on_delivered = lambda: workspaces.mark_delivered(job_id)
+    if language and "," in job["language"]:
+        languages = job["language"].split(",")
+        if language not in languages:
+            raise HTTPException(status_code=404, detail=f"Job has no {language} commentary")
+        result_path = os.path.join(job["job_dir"], language_video_name(language))
+        if not os.path.exists(result_path):
+            raise HTTPException(status_code=404, detail=f"No separate {language} video for this job")
+        # The other languages' copies are kept until they've been fetched too
+        on_delivered = lambda: workspaces.mark_delivered(job_id, language, languages)
+
+    print(f"Final video: {result_path}")
+
+    # Return the file
+    return range_file_response(
+        result_path,
+        request.headers.get("range"),
+        filename="commentated-trickshot.mp4",
+        on_delivered=on_delivered,
+    )
+
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job_result(job_id: str):
+    """
+    The commentated video as it is being written. The final mux produces
+    fragmented MP4, so playback can start before the job has finished.
+    """
+    job = job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] in (FAILED, EXPIRED):
+        raise HTTPException(status_code=410, detail=f"Job is {job['status']}")
+
+    def is_finished():
+        status = job_store.get(job_id)["status"]
+        return status not in (QUEUED, RUNNING), status == DONE
+
+    return StreamingResponse(
+        follow_file(
+            os.path.join(job["job_dir"], FINAL_VIDEO_NAME),
+            is_finished,
+            on_complete=lambda: workspaces.mark_delivered(job_id),
+        ),
+        media_type="video/mp4",
+    )
+
+
+class BatchRequest(BaseModel):
+    source: str                     # directory or CSV/JSON manifest under BATCH_ROOT
+    output_dir: str                 # under BATCH_ROOT
+    language: str = "en"
+    trickshot_name: str = ""
+    workers: int = 4
+    caps: dict[str, int] = {}       # ffmpeg / twelvelabs / featherless / elevenlabs
+
+
+# Batch runs started through the API, keyed by batch id, and the tasks running
+# them (the event loop only keeps weak references to tasks)
+batches: dict[str, dict] = {}
+batch_tasks: set[asyncio.Task] = set()
+
+
+def drop_finished_batches():
+    """Forget batches that finished more than BATCH_TTL seconds ago."""
+    now = time.time()
+    for batch_id in [
+        batch_id for batch_id, batch in batches.items()
+        if batch["finished_at"] is not None and now - batch["finished_at"] > BATCH_TTL
+    ]:
+        del batches[batch_id]
+
+
+def batch_path(path: str) -> str:
+    """Resolve a path from a batch request, refusing anything outside BATCH_ROOT."""
+    resolved = os.path.realpath(os.path.join(BATCH_ROOT, path))
+    if os.path.commonpath([resolved, BATCH_ROOT]) != BATCH_ROOT:
+        raise HTTPException(status_code=400, detail=f"Path is outside the batch root: {path}")
+    return resolved
+
+
+@app.post("/batch", status_code=202)
+async def start_batch(body: BatchRequest):
+    """
+    Commentate a whole directory or manifest of clips on a process pool.
+    Re-posting the same output_dir resumes from its checkpoint. Paths are
+    relative to BATCH_ROOT, and every one (manifest entries included) must
+    resolve to somewhere inside it.
+    """
+    source, output_dir = batch_path(body.source), batch_path(body.output_dir)
+    try:
+        clips = load_manifest(source, body.language, body.trickshot_name)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    for clip in clips:
+        clip["video"] = batch_path(clip["video"])
+        try:
+            parse_languages(clip["language"])
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"{clip['video']}: {e}")
+
+    drop_finished_batches()
+    batch_id = uuid.uuid4().hex
+    batch = {"batch_id": batch_id, "status": RUNNING, "clips": len(clips),
+             "finished": 0, "failed": 0, "summary": None, "error": None, "finished_at": None}
+    batches[batch_id] = batch
+
+    def on_record(record):
+        batch["finished"] += 1
+        if record["status"] != DONE:
+            batch["failed"] += 1
+
+    async def run():
+        try:
+            batch["summary"] = await asyncio.to_thread(
+                run_batch, clips, output_dir, body.workers, body.caps, on_record
+            )
+            batch["status"] = DONE
+        except Exception as e:
+            batch["status"], batch["error"] = FAILED, str(e)
+        batch["finished_at"] = time.time()
+
+    task = asyncio.create_task(run())
+    batch_tasks.add(task)
+    task.add_done_callback(batch_tasks.discard)
+    return {"batch_id": batch_id, "clips": len(clips)}
+
+
+@app.get("/batch/{batch_id}")
+async def get_batch(batch_id: str):
+    """Progress of a batch, and its throughput summary once it's done."""
+    drop_finished_batches()
+    batch = batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return batch
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters and size for each result cache level."""
+    return get_cache().stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """Prometheus scrape endpoint: stage latencies, ffmpeg resource use, queue and cache counters."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
-    return {"status": "ok"}
+    """
+    Health check endpoint. Reports, per pipeline stage, whether its keys and
+    binaries are available, so a missing key shows up here instead of
+    stopping the server from starting.
+    """
+    if TEST_MODE:
+        return {"status": "ok", "test_mode": True, "stages": {}}
+    stages = providers.readiness()
+    status = "ok" if all(stage["ready"] for stage in stages.values()) else "degraded"
+    return {"status": status, "test_mode": False, "stages": stages}
 
 if __name__ == "__main__":
     import uvicorn
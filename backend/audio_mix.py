@@ -0,0 +1,264 @@
+# mixes the voice-over and crowd track in NumPy, so the final ffmpeg run only has to mux
+import os
+import time
+import threading
+import subprocess
+from collections import OrderedDict
+
+import numpy as np
+
+from metrics import CACHE_LOOKUPS, add_span, span, wait_with_usage
+
+# Every track is decoded to interleaved float32 PCM at this rate. The mix has
+# the voice-over's channel count, which is what amix settles on as well (the
+# crowd is downmixed under a mono voice-over)
+MIX_SAMPLE_RATE = 44100
+
+# The crowd sits under the voice at this gain and fades in over the first second,
+# the same as the afade/volume filters of the ffmpeg graph
+CROWD_GAIN = 0.25
+CROWD_FADE_SECONDS = 1.0
+
+# amix=inputs=2 scales both inputs by 1/2 while they overlap; when the crowd
+# ends first the voice is brought back to full scale over this many seconds
+AMIX_INPUT_SCALE = 0.5
+AMIX_DROPOUT_SECONDS = 2.0
+
+# Optional ducking: the crowd drops to AUDIO_DUCK_GAIN of its level while the
+# voice-over is louder than the threshold, with short ramps either side
+DUCKING = os.getenv("AUDIO_DUCKING", "0") == "1"
+DUCK_GAIN = float(os.getenv("AUDIO_DUCK_GAIN", "0.5"))
+DUCK_THRESHOLD_DB = float(os.getenv("AUDIO_DUCK_THRESHOLD_DB", "-35"))
+DUCK_WINDOW_SECONDS = 0.02   # voice level is measured over blocks this long
+DUCK_HOLD_SECONDS = 0.3      # stay ducked through pauses shorter than this
+DUCK_RAMP_SECONDS = 0.1
+
+# Decoded crowd tracks kept in memory, keyed by path, size and mtime. One
+# second of stereo float32 PCM is about 350 KB, so the default holds a few
+# minutes of bank tracks
+CROWD_PCM_CACHE_MB = int(os.getenv("CROWD_PCM_CACHE_MB", "64"))
+
+_crowd_pcm = OrderedDict()
+_crowd_pcm_bytes = 0
+_lock = threading.Lock()
+
+
+def mix_settings(ducking=DUCKING):
+    """Every parameter that changes the mixed track, for the final video's cache key."""
+    settings = {
+        "crowd_gain": CROWD_GAIN,
+        "crowd_fade_seconds": CROWD_FADE_SECONDS,
+        "ducking": ducking,
+    }
+    if ducking:
+        settings.update(
+            duck_gain=DUCK_GAIN,
+            duck_threshold_db=DUCK_THRESHOLD_DB,
+            duck_window_seconds=DUCK_WINDOW_SECONDS,
+            duck_hold_seconds=DUCK_HOLD_SECONDS,
+            duck_ramp_seconds=DUCK_RAMP_SECONDS,
+        )
+    return settings
+
+
+def _run_ffmpeg_pipe(cmd, step, stdin_bytes=None):
+    """
+    Run ffmpeg with its stdin and/or stdout as a pipe and return the stdout
+    bytes, recording an "ffmpeg:<step>" span like video_processor.run_ffmpeg.
+
+    Raises:
+        subprocess.CalledProcessError: If ffmpeg exits with an error
+    """
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        cmd,
+        stdin=subprocess.PIPE if stdin_bytes is not None else subprocess.DEVNULL,
+        stdout=subprocess.PIPE if stdin_bytes is None else subprocess.DEVNULL,
+    )
+    output = b""
+    try:
+        if stdin_bytes is not None:
+            try:
+                proc.stdin.write(stdin_bytes)
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass  # ffmpeg exited early; its return code says why
+        else:
+            output = proc.stdout.read()
+            proc.stdout.close()
+        returncode, cpu_seconds, peak_rss = wait_with_usage(proc)
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        raise
+    add_span(
+        f"ffmpeg:{step}", start, time.perf_counter(),
+        cpu_seconds=round(cpu_seconds, 3), peak_rss_bytes=peak_rss,
+    )
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd)
+    return output
+
+
+def decode_pcm(path, channels, step="decode_audio"):
+    """Decode an audio file's first audio stream to a (samples, channels) float32 array."""
+    raw = _run_ffmpeg_pipe([
+        "ffmpeg", "-v", "error",
+        "-i", path,
+        "-map", "0:a:0",
+        "-f", "f32le",
+        "-ac", str(channels),
+        "-ar", str(MIX_SAMPLE_RATE),
+        "pipe:1",
+    ], step)
+    return np.frombuffer(raw, dtype=np.float32).reshape(-1, channels)
+
+
+def crowd_pcm(path, channels):
+    """
+    decode_pcm() for crowd tracks, decoding each file at most once while it
+    stays in the in-memory cache. The returned array is shared and read-only.
+    """
+    global _crowd_pcm_bytes
+    stat = os.stat(path)
+    key = (os.path.realpath(path), stat.st_size, stat.st_mtime_ns, channels)
+    with _lock:
+        pcm = _crowd_pcm.get(key)
+        if pcm is not None:
+            _crowd_pcm.move_to_end(key)
+    if pcm is not None:
+        CACHE_LOOKUPS.inc(namespace="crowd_pcm", result="hit")
+        return pcm
+
+    CACHE_LOOKUPS.inc(namespace="crowd_pcm", result="miss")
+    pcm = decode_pcm(path, channels, "decode_crowd")
+    pcm.flags.writeable = False
+    with _lock:
+        if key not in _crowd_pcm:
+            _crowd_pcm[key] = pcm
+            _crowd_pcm_bytes += pcm.nbytes
+        while _crowd_pcm and _crowd_pcm_bytes > CROWD_PCM_CACHE_MB * 2**20:
+            _, evicted = _crowd_pcm.popitem(last=False)
+            _crowd_pcm_bytes -= evicted.nbytes
+    return pcm
+
+
+def fit_pcm(pcm, samples):
+    """Loop or trim PCM to exactly `samples` long, like crowd_bank.fit_to_duration."""
+    if len(pcm) == 0:
+        return np.zeros((samples, pcm.shape[1]), dtype=np.float32)
+    repeats = -(-samples // len(pcm))
+    return np.tile(pcm, (repeats, 1))[:samples] if repeats > 1 else pcm[:samples]
+
+
+def duck_envelope(voice, rate=MIX_SAMPLE_RATE):
+    """
+    Per-sample crowd gain that dips to DUCK_GAIN wherever the voice is speaking.
+
+    The voice level is measured over short blocks; speech blocks are widened
+    by DUCK_HOLD_SECONDS on both sides so the crowd doesn't pump between
+    words, then the block gains are smoothed and interpolated to samples.
+    """
+    block = max(1, int(rate * DUCK_WINDOW_SECONDS))
+    blocks = -(-len(voice) // block)
+    if blocks == 0:
+        return np.ones(0, dtype=np.float32)
+    mono = np.zeros(blocks * block, dtype=np.float32)
+    mono[:len(voice)] = voice.mean(axis=1)
+    rms = np.sqrt(np.mean(mono.reshape(blocks, block) ** 2, axis=1))
+    speaking = rms > 10 ** (DUCK_THRESHOLD_DB / 20)
+
+    hold = int(DUCK_HOLD_SECONDS / DUCK_WINDOW_SECONDS)
+    if hold:
+        padded = np.pad(speaking, hold)
+        speaking = np.lib.stride_tricks.sliding_window_view(padded, 2 * hold + 1).any(axis=1)
+    gains = np.where(speaking, DUCK_GAIN, 1.0)
+
+    ramp = max(1, int(DUCK_RAMP_SECONDS / DUCK_WINDOW_SECONDS))
+    if ramp > 1:
+        padded = np.pad(gains, (ramp // 2, ramp - 1 - ramp // 2), mode="edge")
+        gains = np.convolve(padded, np.full(ramp, 1.0 / ramp), mode="valid")
+
+    centers = (np.arange(blocks) + 0.5) * block
+    return np.interp(np.arange(len(voice)), centers, gains).astype(np.float32)
+
+
+def mix(voice, crowd, ducking=DUCKING, rate=MIX_SAMPLE_RATE):
+    """
+    Mix crowd PCM under voice PCM, matching the ffmpeg graph
+    "afade=t=in:d=1,volume=0.25" on the crowd into "amix=inputs=2:duration=first".
+
+    The result is as long as the voice. If the crowd is shorter, the voice
+    ramps from amix's half scale back to full scale after the crowd ends.
+
+    Args:
+        voice: (samples, channels) float32 voice-over
+        crowd: (samples, channels) float32 crowd track
+        ducking (bool): Also lower the crowd while the voice is speaking
+    """
+    samples = len(voice)
+    overlap = min(samples, len(crowd))
+
+    voice_gain = np.full(samples, AMIX_INPUT_SCALE, dtype=np.float32)
+    if overlap < samples:
+        # amix moves 1/scale linearly from the input count back to 1
+        t = np.arange(samples - overlap, dtype=np.float32) / (AMIX_DROPOUT_SECONDS * rate)
+        inputs = 1 / AMIX_INPUT_SCALE
+        voice_gain[overlap:] = 1 / np.maximum(1.0, inputs - (inputs - 1) * t)
+
+    crowd_gain = np.full(overlap, CROWD_GAIN * AMIX_INPUT_SCALE, dtype=np.float32)
+    fade = min(overlap, int(CROWD_FADE_SECONDS * rate))
+    crowd_gain[:fade] *= np.arange(fade, dtype=np.float32) / max(1, fade)
+    if ducking:
+        crowd_gain *= duck_envelope(voice[:overlap], rate)
+
+    out = voice * voice_gain[:, None]
+    out[:overlap] += crowd[:overlap] * crowd_gain[:, None]
+    return out
+
+
+def encode_aac(pcm, out_path, bitrate="128k"):
+    """Encode float32 PCM from mix() as a single AAC track in an .m4a file."""
+    _run_ffmpeg_pipe([
+        "ffmpeg", "-v", "error", "-y",
+        "-f", "f32le",
+        "-ar", str(MIX_SAMPLE_RATE),
+        "-ac", str(pcm.shape[1]),
+        "-i", "pipe:0",
+        "-c:a", "aac",
+        "-b:a", bitrate,
+        out_path,
+    ], "encode_mix", stdin_bytes=np.ascontiguousarray(pcm, dtype=np.float32).tobytes())
+    return out_path
+
+
+def mix_files(voice_file, crowd_file, out_path, channels, crowd_seconds=None, bitrate="128k",
+              ducking=DUCKING):
+    """
+    Decode the voice-over, mix the (cached) crowd track under it and encode
+    the result as one AAC track.
+
+    Args:
+        voice_file (str): Voice-over audio file
+        crowd_file (str): Crowd track; decoded through the in-memory cache
+        out_path (str): Where to write the .m4a
+        channels (int): Channel count of the mix (the voice-over's)
+        crowd_seconds (float): Loop or trim the crowd to this length first, so
+            a bank track can be passed as-is instead of a fitted copy
+        bitrate (str): AAC bitrate
+        ducking (bool): Lower the crowd while the voice is speaking
+
+    Returns:
+        float: Length of the mixed track in seconds
+
+    Raises:
+        subprocess.CalledProcessError: If decoding or encoding fails
+    """
+    crowd = crowd_pcm(crowd_file, channels)
+    voice = decode_pcm(voice_file, channels, "decode_voice")
+    if crowd_seconds is not None:
+        crowd = fit_pcm(crowd, int(round(crowd_seconds * MIX_SAMPLE_RATE)))
+    with span("audio_mix"):
+        mixed = mix(voice, crowd, ducking)
+    encode_aac(mixed, out_path, bitrate)
+    return len(mixed) / MIX_SAMPLE_RATE
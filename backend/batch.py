@@ -0,0 +1,257 @@
+# batch commentary: runs a directory or manifest of clips through the pipeline on a process pool
+import os
+import sys
+import csv
+import json
+import math
+import time
+import shutil
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cache import hash_key
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".m4v", ".webm", ".mkv"}
+CHECKPOINT_NAME = "checkpoint.jsonl"
+
+# Which shared cap each pipeline stage takes. tts is ElevenLabs; sfx only
+# loops/trims a pooled crowd track, so it counts as ffmpeg work.
+STAGE_CAPS = {
+    "analyze": "twelvelabs",
+    "script": "featherless",
+    "tts": "elevenlabs",
+    "sfx": "ffmpeg",
+    "ffmpeg": "ffmpeg",
+}
+
+
+def load_manifest(source, language="en", trickshot_name=""):
+    """
+    Read the clips to process from a directory, a CSV file or a JSON file.
+
+    A directory yields every video in it with the given language and name.
+    CSV needs a "video" column and may have "language" and "trickshot_name";
+    JSON is a list of objects with the same keys. Relative video paths are
+    resolved against the manifest's directory.
+
+    Returns:
+        A list of {"video", "language", "trickshot_name"} dicts.
+    """
+    if os.path.isdir(source):
+        return [
+            {"video": os.path.abspath(os.path.join(source, name)),
+             "language": language, "trickshot_name": trickshot_name}
+            for name in sorted(os.listdir(source))
+            if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS
+        ]
+
+    with open(source, newline="", encoding="utf-8") as f:
+        if source.lower().endswith(".json"):
+            rows = json.load(f)
+        else:
+            rows = list(csv.DictReader(f))
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    clips = []
+    for row in rows:
+        if not row.get("video"):
+            raise ValueError(f"Manifest row without a video: {row}")
+        clips.append({
+            "video": os.path.abspath(os.path.join(base_dir, row["video"])),
+            "language": row.get("language") or language,
+            "trickshot_name": row.get("trickshot_name") or trickshot_name,
+        })
+    return clips
+
+
+def clip_key(clip):
+    """Identifies a clip in the checkpoint file."""
+    return hash_key(clip["video"], clip["language"], clip["trickshot_name"])
+
+
+def load_checkpoint(path):
+    """Return {clip key: record} for every clip already finished in an earlier run."""
+    done = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if record.get("status") == "done":
+                        done[record["key"]] = record
+    return done
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(records, wall_seconds):
+    """Throughput and per-stage p50/p95 for a set of finished clip records."""
+    done = [r for r in records if r["status"] == "done"]
+    stages = {}
+    for record in done:
+        for stage, timing in record.get("timings", {}).items():
+            stages.setdefault(stage, []).append(timing["seconds"])
+    return {
+        "clips": len(records),
+        "done": len(done),
+        "failed": len(records) - len(done),
+        "wall_seconds": round(wall_seconds, 2),
+        "clips_per_minute": round(len(done) / wall_seconds * 60, 2) if wall_seconds else 0.0,
+        "stages": {
+            stage: {"p50": round(percentile(v, 50), 3), "p95": round(percentile(v, 95), 3)}
+            for stage, v in sorted(stages.items())
+        },
+    }
+
+
+def format_summary(summary):
+    lines = [
+        f"{summary['done']}/{summary['clips']} clips done, {summary['failed']} failed "
+        f"in {summary['wall_seconds']:.1f}s ({summary['clips_per_minute']:.2f} clips/minute)",
+        f"{'stage':<22}{'p50 (s)':>10}{'p95 (s)':>10}",
+    ]
+    for stage, stats in summary["stages"].items():
+        lines.append(f"{stage:<22}{stats['p50']:>10.2f}{stats['p95']:>10.2f}")
+    return "\n".join(lines)
+
+
+def _init_worker(limits):
+    from pipeline import use_shared_limits
+    use_shared_limits({stage: limits[cap] for stage, cap in STAGE_CAPS.items()})
+
+
+def _process_clip(clip, output_dir):
+    """
+    Worker-process entry point: run one clip and copy the result into
+    output_dir, one video per language.
+    """
+    from pipeline import run_pipeline_on_new_loop, parse_languages
+    from video_processor import language_video_name
+
+    key = clip_key(clip)
+    job_dir = os.path.join(output_dir, "work", key[:16])
+    os.makedirs(job_dir, exist_ok=True)
+    # The key keeps apart rows whose videos share a file name (from another
+    # directory, or the same clip with another trickshot_name)
+    stem = f"{os.path.splitext(os.path.basename(clip['video']))[0]}-{key[:12]}"
+    outputs = {}
+
+    start = time.perf_counter()
+    try:
+        languages = parse_languages(clip["language"])
+        result, timings = run_pipeline_on_new_loop(
+            job_dir, clip["video"], clip["language"], clip["trickshot_name"]
+        )
+        for language in languages:
+            # Several languages share one multi-track result, also split per
+            # language (TEST_MODE only ever makes the one result)
+            source = os.path.join(job_dir, language_video_name(language))
+            if len(languages) == 1 or not os.path.exists(source):
+                source = result
+            outputs[language] = os.path.join(output_dir, f"{stem}-{language}.mp4")
+            shutil.copyfile(source, outputs[language])
+        status, error = "done", None
+    except Exception as e:
+        timings, status, error = {}, "failed", str(e)
+    finally:
+        shutil.rmtree(job_dir, ignore_errors=True)
+
+    return {
+        "key": key,
+        **clip,
+        "status": status,
+        "error": error,
+        "outputs": outputs if status == "done" else {},
+        "seconds": round(time.perf_counter() - start, 3),
+        "timings": timings,
+    }
+
+
+def run_batch(clips, output_dir, workers=4, caps=None, on_record=None):
+    """
+    Commentate every clip, skipping those already done in output_dir's checkpoint.
+
+    Args:
+        clips: List from load_manifest
+        output_dir: Where results and checkpoint.jsonl are written
+        workers: Number of worker processes
+        caps: {"ffmpeg": n, "twelvelabs": n, "featherless": n, "elevenlabs": n},
+            shared across all workers
+        on_record: Optional callable(record) for each clip as it finishes
+
+    Returns:
+        The summary dict for this run (clips restored from the checkpoint
+        aren't counted towards throughput).
+    """
+    caps = {"ffmpeg": 2, "twelvelabs": 4, "featherless": 8, "elevenlabs": 4, **(caps or {})}
+    os.makedirs(output_dir, exist_ok=True)
+    checkpoint_path = os.path.join(output_dir, CHECKPOINT_NAME)
+    done = load_checkpoint(checkpoint_path)
+    pending = [clip for clip in clips if clip_key(clip) not in done]
+    print(f"{len(clips)} clips, {len(clips) - len(pending)} already done, {len(pending)} to go")
+
+    records = []
+    start = time.perf_counter()
+    # Spawned, not forked: the server that starts a batch holds open SQLite
+    # connections (disk cache, fingerprint index) and locks a fork would copy
+    context = multiprocessing.get_context("spawn")
+    with context.Manager() as manager:
+        limits = {name: manager.BoundedSemaphore(value) for name, value in caps.items()}
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(limits,)) as pool, \
+                open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+            futures = [pool.submit(_process_clip, clip, output_dir) for clip in pending]
+            for future in as_completed(futures):
+                record = future.result()
+                records.append(record)
+                checkpoint.write(json.dumps(record) + "\n")
+                checkpoint.flush()
+                mark = "✓" if record["status"] == "done" else "✗"
+                print(f"{mark} [{len(records)}/{len(pending)}] {record['video']} "
+                      f"({record['language']}) {record['seconds']:.1f}s"
+                      + (f": {record['error']}" if record["error"] else ""))
+                if on_record:
+                    on_record(record)
+
+    return summarize(records, time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Commentate a directory or manifest of clips.")
+    parser.add_argument("source", help="Directory of videos, or a CSV/JSON manifest")
+    parser.add_argument("output_dir", help="Where to write results and the checkpoint")
+    parser.add_argument("--language", default="en", help="Default language (default: en)")
+    parser.add_argument("--trickshot-name", default="", help="Default trickshot name")
+    parser.add_argument("--workers", type=int, default=4, help="Worker processes (default: 4)")
+    parser.add_argument("--ffmpeg", type=int, default=2, help="Max concurrent ffmpeg jobs")
+    parser.add_argument("--twelvelabs", type=int, default=4, help="Max concurrent TwelveLabs analyses")
+    parser.add_argument("--featherless", type=int, default=8, help="Max concurrent script requests")
+    parser.add_argument("--elevenlabs", type=int, default=4, help="Max concurrent ElevenLabs requests")
+    args = parser.parse_args()
+
+    clips = load_manifest(args.source, args.language, args.trickshot_name)
+    if not clips:
+        print(f"No clips found in {args.source}")
+        sys.exit(1)
+
+    summary = run_batch(clips, args.output_dir, workers=args.workers, caps={
+        "ffmpeg": args.ffmpeg,
+        "twelvelabs": args.twelvelabs,
+        "featherless": args.featherless,
+        "elevenlabs": args.elevenlabs,
+    })
+    print(f"\n{format_summary(summary)}")
+    with open(os.path.join(args.output_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
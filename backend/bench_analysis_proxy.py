@@ -0,0 +1,51 @@
+# compares analysis upload size and indexing time for original clips vs their proxies
+# (talks to the real TwelveLabs API)
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from metrics import start_trace
+from trickshot_summary import getSummaryAsync, close_client
+from video_processor import build_analysis_proxy
+
+
+async def _measure(path):
+    """Run one analysis and return (upload bytes, upload seconds, indexing seconds)."""
+    trace = start_trace()
+    await getSummaryAsync(path)
+    spans = trace["spans"]
+    upload = spans["twelvelabs:upload"]
+    return upload["bytes"], upload["seconds"], spans["twelvelabs:indexing"]["seconds"]
+
+
+async def main():
+    """Usage: python bench_analysis_proxy.py <video> [video...]"""
+    if len(sys.argv) < 2:
+        print("Usage: python bench_analysis_proxy.py <video_file> [video_file...]")
+        sys.exit(1)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for clip in sys.argv[1:]:
+            proxy = os.path.join(work_dir, f"proxy-{len(rows)}.mp4")
+            start = time.perf_counter()
+            await asyncio.to_thread(build_analysis_proxy, clip, proxy)
+            proxy_seconds = time.perf_counter() - start
+
+            name = os.path.basename(clip)
+            rows.append((name, "original", 0.0, *await _measure(clip)))
+            rows.append((name, "proxy", proxy_seconds, *await _measure(proxy)))
+    await close_client()
+
+    print(f"\n{'clip':<24}{'input':<10}{'proxy (s)':>10}{'upload (MB)':>13}{'upload (s)':>12}{'indexing (s)':>14}")
+    for name, kind, proxy_seconds, size, upload_seconds, indexing_seconds in rows:
+        print(
+            f"{name:<24}{kind:<10}{proxy_seconds:>10.2f}{size / 1e6:>13.2f}"
+            f"{upload_seconds:>12.2f}{indexing_seconds:>14.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,126 @@
+# checks the NumPy audio mix against ffmpeg's afade/amix graph and times both
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+import audio_mix
+from audio_mix import decode_pcm, crowd_pcm, mix, mix_files, MIX_SAMPLE_RATE
+from media_info import get_media_info, audio_stream
+
+# The audio half of VideoProcessor.fused_command's filter graph
+AMIX_GRAPH = "[1:a]afade=t=in:st=0:d=1,volume=0.25[crowd];[0:a:0][crowd]amix=inputs=2:duration=first[a]"
+
+# Below this the NumPy mix isn't a drop-in replacement for the amix output
+MIN_SNR_DB = 40
+
+
+def _snr_db(reference, other):
+    """Signal-to-noise ratio of `other` against `reference`, over their common length."""
+    n = min(len(reference), len(other))
+    signal = float(np.sum(reference[:n].astype(np.float64) ** 2))
+    noise = float(np.sum((reference[:n].astype(np.float64) - other[:n]) ** 2))
+    return round(10 * np.log10(signal / noise), 1) if noise else float("inf")
+
+
+def _amix_pcm(voice_file, crowd_file, channels):
+    raw = subprocess.run([
+        "ffmpeg", "-v", "error", "-i", voice_file, "-i", crowd_file,
+        "-filter_complex", AMIX_GRAPH, "-map", "[a]",
+        "-f", "f32le", "-ac", str(channels), "-ar", str(MIX_SAMPLE_RATE), "pipe:1",
+    ], capture_output=True, check=True).stdout
+    return np.frombuffer(raw, dtype=np.float32).reshape(-1, channels)
+
+
+def _amix_encode(voice_file, crowd_file, out_path, bitrate):
+    subprocess.run([
+        "ffmpeg", "-v", "error", "-y", "-i", voice_file, "-i", crowd_file,
+        "-filter_complex", AMIX_GRAPH, "-map", "[a]",
+        "-c:a", "aac", "-b:a", bitrate, out_path,
+    ], check=True)
+
+
+def _best(func, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return round(min(times), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Validate and time the NumPy audio mix against amix")
+    parser.add_argument("voice_file")
+    parser.add_argument("crowd_file")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--bitrate", default="128k")
+    args = parser.parse_args()
+
+    channels = int((audio_stream(get_media_info(args.voice_file)) or {}).get("channels") or 2)
+    work_dir = tempfile.mkdtemp(prefix="audio-mix-")
+    try:
+        # Quality: the mix itself, then both encoded tracks decoded again
+        reference = _amix_pcm(args.voice_file, args.crowd_file, channels)
+        voice = decode_pcm(args.voice_file, channels)
+        crowd = crowd_pcm(args.crowd_file, channels)
+        mixed = mix(voice, crowd, ducking=False)
+
+        amix_track = os.path.join(work_dir, "amix.m4a")
+        numpy_track = os.path.join(work_dir, "numpy.m4a")
+        _amix_encode(args.voice_file, args.crowd_file, amix_track, args.bitrate)
+        mix_files(args.voice_file, args.crowd_file, numpy_track, channels,
+                  bitrate=args.bitrate, ducking=False)
+        amix_decoded = decode_pcm(amix_track, channels)
+        numpy_decoded = decode_pcm(numpy_track, channels)
+
+        # While both tracks play, whatever isn't half the voice is crowd
+        overlap = min(len(voice), len(crowd))
+        crowd_part = mixed[:overlap] - voice[:overlap] * audio_mix.AMIX_INPUT_SCALE
+        ducked_part = mix(voice, crowd, ducking=True)[:overlap] - voice[:overlap] * audio_mix.AMIX_INPUT_SCALE
+        envelope = audio_mix.duck_envelope(voice[:overlap])
+
+        # Speed: the amix graph and its encode, against decode + mix + encode
+        # with a cold crowd cache and with the crowd already decoded
+        def cold():
+            audio_mix._crowd_pcm.clear()
+            audio_mix._crowd_pcm_bytes = 0
+            mix_files(args.voice_file, args.crowd_file, numpy_track, channels, bitrate=args.bitrate)
+
+        result = {
+            "channels": channels,
+            "seconds": round(len(voice) / MIX_SAMPLE_RATE, 2),
+            "mix_snr_db": _snr_db(reference, mixed),
+            "length_difference_samples": len(mixed) - len(reference),
+            # Two AAC encodes never match exactly; both should be as close to the amix PCM
+            "amix_encoded_snr_db": _snr_db(reference, amix_decoded),
+            "numpy_encoded_snr_db": _snr_db(reference, numpy_decoded),
+            "ducked_share": round(float(np.mean(envelope < 1.0)), 3),
+            "ducking_crowd_reduction_db": _snr_db(crowd_part, crowd_part - ducked_part) if overlap else None,
+            "amix_encode_seconds": _best(
+                lambda: _amix_encode(args.voice_file, args.crowd_file, amix_track, args.bitrate), args.runs
+            ),
+            "numpy_cold_seconds": _best(cold, args.runs),
+            "numpy_warm_seconds": _best(
+                lambda: mix_files(args.voice_file, args.crowd_file, numpy_track, channels, bitrate=args.bitrate),
+                args.runs,
+            ),
+            "mix_only_seconds": _best(lambda: mix(voice, crowd, ducking=False), args.runs),
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(json.dumps(result, indent=2))
+    if result["mix_snr_db"] < MIN_SNR_DB:
+        print(f"✗ Mix is {result['mix_snr_db']} dB from the amix output (want at least {MIN_SNR_DB})")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
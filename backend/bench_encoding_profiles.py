@@ -0,0 +1,73 @@
+# encode time vs output size for every encoding profile and thread count
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from video_processor import VideoProcessor, ENCODING_PROFILES, available_cores
+
+
+def _run(video_file, voice_file, crowd_file, profile, threads, work_dir):
+    """Fully re-encode one clip with a profile inside work_dir; return (seconds, output bytes)."""
+    processor = VideoProcessor(
+        video_file, voice_file, crowd_file, profile=profile, threads=threads, work_dir=work_dir
+    )
+    processor.plan()
+    # Copy mode never touches the encoder, so force the path the profile controls
+    processor.video_mode = "reencode"
+    start = time.perf_counter()
+    processor.process_fused()
+    elapsed = time.perf_counter() - start
+    return elapsed, os.path.getsize(processor.final_video)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encode time vs output size per encoding profile")
+    parser.add_argument("voice_file")
+    parser.add_argument("crowd_file")
+    parser.add_argument("clips", nargs="+", help="Sample videos to encode")
+    parser.add_argument("--profiles", nargs="+", default=list(ENCODING_PROFILES))
+    parser.add_argument("--threads", nargs="+", type=int,
+                        default=sorted({1, max(1, available_cores() // 2), available_cores()}))
+    parser.add_argument("--runs", type=int, default=1, help="Runs per cell; the fastest is kept")
+    parser.add_argument("--json", help="Also write the matrix to this file")
+    args = parser.parse_args()
+
+    voice_file, crowd_file = os.path.abspath(args.voice_file), os.path.abspath(args.crowd_file)
+    rows = []
+    for clip in args.clips:
+        for profile in args.profiles:
+            for threads in args.threads:
+                times, size = [], 0
+                for _ in range(args.runs):
+                    work_dir = tempfile.mkdtemp()
+                    try:
+                        elapsed, size = _run(
+                            os.path.abspath(clip), voice_file, crowd_file, profile, threads, work_dir
+                        )
+                    finally:
+                        shutil.rmtree(work_dir, ignore_errors=True)
+                    times.append(elapsed)
+                rows.append({
+                    "clip": os.path.basename(clip),
+                    "profile": profile,
+                    "threads": threads,
+                    "seconds": round(min(times), 3),
+                    "bytes": size,
+                })
+
+    print(f"\n{'clip':<24}{'profile':<14}{'threads':>8}{'best (s)':>10}{'size (MB)':>11}")
+    for row in rows:
+        print(
+            f"{row['clip']:<24}{row['profile']:<14}{row['threads']:>8}"
+            f"{row['seconds']:>10.2f}{row['bytes'] / 1e6:>11.2f}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
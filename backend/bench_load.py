@@ -0,0 +1,394 @@
+# load test: the real server and pipeline against local fakes of every external API
+import os
+import sys
+import json
+import glob
+import time
+import socket
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from batch import percentile
+from fake_services import FakeTwelveLabs, FakeFeatherless, FakeElevenLabs, parse_latency
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_CLIPS = os.path.join(BACKEND_DIR, "..", "test-vids", "*.mp4")
+SERVICE_NAMES = ("twelvelabs", "featherless", "elevenlabs")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _per_service(pairs, convert, default):
+    """Parse repeated SERVICE=VALUE options into {service: value} for every service."""
+    values = {name: default for name in SERVICE_NAMES}
+    for pair in pairs or []:
+        name, _, value = pair.partition("=")
+        if name not in values:
+            raise SystemExit(f"Unknown service {name!r}; expected one of {', '.join(SERVICE_NAMES)}")
+        values[name] = convert(value)
+    return values
+
+
+def _parse_ceiling(spec):
+    concurrent, _, rps = spec.partition(":")
+    return {"max_concurrent": int(concurrent or 0), "rps": float(rps or 0)}
+
+
+def _synth_audio(path, seconds):
+    """A real MP3 for the ElevenLabs fake to serve, so the ffmpeg stages get valid input."""
+    subprocess.run([
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"sine=frequency=330:duration={seconds}",
+        "-b:a", "128k", path,
+    ], check=True)
+    return path
+
+
+def _unique_copies(clips, count, out_dir):
+    """
+    `count` byte-distinct copies of the sample clips (stream-copied with a
+    different metadata tag), so every upload misses the result caches.
+    """
+    copies = []
+    for i in range(count):
+        clip = clips[i % len(clips)]
+        copy = os.path.join(out_dir, f"upload-{i}{os.path.splitext(clip)[1]}")
+        subprocess.run([
+            "ffmpeg", "-y", "-v", "error", "-i", clip,
+            "-map", "0", "-c", "copy", "-metadata", f"comment=load-test-{i}", copy,
+        ], check=True)
+        copies.append(copy)
+    return copies
+
+
+class Server:
+    """The FastAPI app under uvicorn in a subprocess, with its own jobs, cache and crowd dirs."""
+
+    def __init__(self, env, work_dir, port=None):
+        self.port = port or _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        self.log_path = os.path.join(work_dir, "server.log")
+        self.env = {
+            **os.environ,
+            "JOBS_DIR": os.path.join(work_dir, "jobs"),
+            "CACHE_DIR": os.path.join(work_dir, "cache"),
+            "CROWD_BANK_DIR": os.path.join(work_dir, "crowd_bank"),
+            **env,
+        }
+        self._proc = None
+        self._log = None
+
+    def start(self, timeout=60):
+        self._log = open(self.log_path, "w")
+        self._proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app:app",
+             "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=self.env, stdout=self._log, stderr=subprocess.STDOUT,
+        )
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self._proc.poll() is not None:
+                raise RuntimeError(f"Server exited during startup:\n{self._log_tail()}")
+            try:
+                if requests.get(f"{self.url}/health", timeout=1).ok:
+                    return self
+            except requests.ConnectionError:
+                pass
+            time.sleep(0.2)
+        raise RuntimeError(f"Server didn't answer /health within {timeout}s:\n{self._log_tail()}")
+
+    @property
+    def pid(self):
+        return self._proc.pid
+
+    def _log_tail(self, lines=30):
+        self._log.flush()
+        with open(self.log_path) as f:
+            return "".join(f.readlines()[-lines:])
+
+    def stop(self):
+        if self._proc and self._proc.poll() is None:
+            self._proc.terminate()
+            try:
+                self._proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._proc.kill()
+        if self._log:
+            self._log.close()
+
+
+def run_request(base_url, clip, language, poll_interval, timeout):
+    """Upload one clip, wait for its job and return a record of how it went."""
+    record = {"clip": os.path.basename(clip), "status": "failed", "error": None, "timings": {}}
+    session = requests.Session()
+    start = time.perf_counter()
+    try:
+        with open(clip, "rb") as f:
+            response = session.post(
+                f"{base_url}/generate-commentary",
+                files={"video": (os.path.basename(clip), f, "video/mp4")},
+                data={"language": language},
+                timeout=timeout,
+            )
+        record["upload_seconds"] = round(time.perf_counter() - start, 3)
+        if response.status_code != 202:
+            record["status"] = "rejected"
+            record["error"] = f"HTTP {response.status_code}: {response.text[:200]}"
+            return record
+
+        record["job_id"] = job_id = response.json()["job_id"]
+        deadline = start + timeout
+        while True:
+            job = session.get(f"{base_url}/jobs/{job_id}", timeout=10).json()
+            if job["status"] not in ("queued", "running"):
+                break
+            if time.perf_counter() > deadline:
+                raise TimeoutError(f"Job still {job['status']} after {timeout:.0f}s")
+            time.sleep(poll_interval)
+        record["status"] = job["status"]
+        record["error"] = job["error"]
+        record["timings"] = job["timings"] or {}
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        record["latency_seconds"] = round(time.perf_counter() - start, 3)
+        session.close()
+    return record
+
+
+def _stats(values):
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 3),
+        "p50": round(percentile(values, 50), 3),
+        "p95": round(percentile(values, 95), 3),
+        "p99": round(percentile(values, 99), 3),
+        "max": round(max(values), 3),
+    }
+
+
+def summarize(records, wall_seconds):
+    """Throughput, end-to-end latency, per-stage percentiles and ffmpeg usage for one run."""
+    done = [r for r in records if r["status"] == "done"]
+    stages, ffmpeg_cpu, ffmpeg_rss = {}, [], {}
+    for record in done:
+        cpu = 0.0
+        for name, timing in record["timings"].items():
+            if name == "total":
+                continue
+            # Repeated ffmpeg steps are named "ffmpeg:tail#2" etc.; pool them
+            name = name.split("#", 1)[0]
+            stages.setdefault(name, []).append(timing["seconds"])
+            if name.startswith("ffmpeg:"):
+                cpu += timing.get("cpu_seconds", 0.0)
+                ffmpeg_rss[name] = max(ffmpeg_rss.get(name, 0), timing.get("peak_rss_bytes", 0))
+        ffmpeg_cpu.append(cpu)
+
+    return {
+        "requests": len(records),
+        "done": len(done),
+        "failed": sum(r["status"] == "failed" for r in records),
+        "rejected": sum(r["status"] == "rejected" for r in records),
+        "wall_seconds": round(wall_seconds, 3),
+        "requests_per_second": round(len(done) / wall_seconds, 3) if wall_seconds else 0.0,
+        "latency": _stats([r["latency_seconds"] for r in done]),
+        "upload": _stats([r["upload_seconds"] for r in done]),
+        "stages": {name: _stats(values) for name, values in sorted(stages.items())},
+        "ffmpeg": {
+            "cpu_seconds_per_job": _stats(ffmpeg_cpu),
+            "peak_rss_bytes": dict(sorted(ffmpeg_rss.items())),
+        },
+    }
+
+
+def format_summary(summary):
+    latency = summary["latency"]
+    lines = [
+        f"{summary['done']}/{summary['requests']} done, {summary['failed']} failed, "
+        f"{summary['rejected']} rejected in {summary['wall_seconds']:.1f}s "
+        f"({summary['requests_per_second']:.2f} requests/s)",
+    ]
+    if latency["count"]:
+        lines.append(
+            f"end to end: p50 {latency['p50']:.2f}s  p95 {latency['p95']:.2f}s  p99 {latency['p99']:.2f}s"
+        )
+    lines.append(f"\n{'stage':<26}{'p50 (s)':>9}{'p95 (s)':>9}{'p99 (s)':>9}{'peak MB':>9}")
+    for name, stats in summary["stages"].items():
+        rss = summary["ffmpeg"]["peak_rss_bytes"].get(name)
+        line = f"{name:<26}{stats['p50']:>9.2f}{stats['p95']:>9.2f}{stats['p99']:>9.2f}"
+        lines.append(line + (f"{rss / 2**20:>9.0f}" if rss else ""))
+    cpu = summary["ffmpeg"]["cpu_seconds_per_job"]
+    if cpu["count"]:
+        lines.append(f"\nffmpeg CPU per job: mean {cpu['mean']:.2f}s  p95 {cpu['p95']:.2f}s")
+    return "\n".join(lines)
+
+
+def compare(old, new):
+    """Lines showing how the headline numbers moved between two result files."""
+    def row(label, before, after, lower_is_better=True):
+        if not before or after is None:
+            return f"{label:<34}{before!s:>10}{after!s:>10}"
+        change = (after - before) / before * 100
+        worse = change > 5 if lower_is_better else change < -5
+        return f"{label:<34}{before:>10.3f}{after:>10.3f}{change:>+9.1f}%{'  ✗' if worse else ''}"
+
+    old_s, new_s = old["summary"], new["summary"]
+    lines = [
+        f"{'':<34}{'before':>10}{'after':>10}{'change':>10}",
+        row("requests/s", old_s["requests_per_second"], new_s["requests_per_second"], False),
+    ]
+    for pct in ("p50", "p95", "p99"):
+        lines.append(row(f"end to end {pct} (s)", old_s["latency"].get(pct), new_s["latency"].get(pct)))
+    for name, stats in new_s["stages"].items():
+        if name in old_s["stages"]:
+            lines.append(row(f"{name} p95 (s)", old_s["stages"][name].get("p95"), stats.get("p95")))
+    lines.append(row(
+        "ffmpeg CPU per job (s)",
+        old_s["ffmpeg"]["cpu_seconds_per_job"].get("mean"),
+        new_s["ffmpeg"]["cpu_seconds_per_job"].get("mean"),
+    ))
+    return "\n".join(lines)
+
+
+def _commit():
+    result = subprocess.run(
+        ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=BACKEND_DIR
+    )
+    return result.stdout.strip() or None
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Drive /generate-commentary with concurrent uploads against local API fakes"
+    )
+    parser.add_argument("clips", nargs="*", help="Sample videos (default: test-vids/*.mp4)")
+    parser.add_argument("--requests", type=int, default=20, help="Uploads in total")
+    parser.add_argument("--concurrency", type=int, default=4, help="Uploads in flight at once")
+    parser.add_argument("--language", default="en")
+    parser.add_argument("--unique", action="store_true",
+                        help="Upload a distinct copy every time, so no stage is served from cache")
+    parser.add_argument("--latency", action="append", metavar="SERVICE=SPEC",
+                        help="Per-request latency, e.g. twelvelabs=lognormal:0.3:0.5 (see fake_services.py)")
+    parser.add_argument("--error-rate", action="append", metavar="SERVICE=RATE",
+                        help="Fraction of requests a fake fails with a 500, e.g. elevenlabs=0.05")
+    parser.add_argument("--ceiling", action="append", metavar="SERVICE=CONCURRENT:RPS",
+                        help="Answer 429 above this many requests at once or per second, e.g. elevenlabs=4:10")
+    parser.add_argument("--indexing", default="2", help="TwelveLabs indexing time (latency spec)")
+    parser.add_argument("--tts-chunk-interval", type=float, default=0.05,
+                        help="Seconds between the fake ElevenLabs audio chunks")
+    parser.add_argument("--voice-audio", help="MP3 the ElevenLabs fake serves (default: a synthesised tone)")
+    parser.add_argument("--workers", type=int, default=2, help="JOB_WORKERS for the server")
+    parser.add_argument("--server-env", action="append", metavar="NAME=VALUE", default=[],
+                        help="Extra environment for the server, e.g. STAGE_LIMIT_FFMPEG=4")
+    parser.add_argument("--timeout", type=float, default=600, help="Seconds one request may take")
+    parser.add_argument("--json", help="Where to write results (default: bench_results/load-<commit>-<time>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    clips = [os.path.abspath(p) for p in args.clips] or sorted(glob.glob(SAMPLE_CLIPS))
+    if not clips:
+        parser.error("No sample clips given and none found in test-vids/")
+
+    latency = _per_service(args.latency, parse_latency, 0.0)
+    error_rate = _per_service(args.error_rate, float, 0.0)
+    ceiling = _per_service(args.ceiling, _parse_ceiling, {})
+    work_dir = tempfile.mkdtemp(prefix="load-test-")
+    server, fakes = None, {}
+    try:
+        voice_audio = args.voice_audio or _synth_audio(os.path.join(work_dir, "voice.mp3"), 8)
+        uploads = (
+            _unique_copies(clips, args.requests, work_dir) if args.unique
+            else [clips[i % len(clips)] for i in range(args.requests)]
+        )
+
+        fakes["twelvelabs"] = FakeTwelveLabs(
+            indexing_seconds=parse_latency(args.indexing),
+            latency=latency["twelvelabs"], error_rate=error_rate["twelvelabs"], **ceiling["twelvelabs"],
+        ).start()
+        fakes["featherless"] = FakeFeatherless(
+            latency=latency["featherless"], error_rate=error_rate["featherless"], **ceiling["featherless"],
+        ).start()
+        fakes["elevenlabs"] = FakeElevenLabs(
+            audio_path=voice_audio, chunk_interval=args.tts_chunk_interval,
+            latency=latency["elevenlabs"], error_rate=error_rate["elevenlabs"], **ceiling["elevenlabs"],
+        ).start()
+
+        server_env = {
+            "TEST_MODE": "0",
+            "TWELVELABS_BASE_URL": fakes["twelvelabs"].base_url,
+            "TWELVELABS_API_KEY": "fake",
+            "INDEX_ID": "fake-index",
+            "INDEX_POLL_MIN_INTERVAL": "0.2",
+            "SCRIPT_BACKEND": "featherless",
+            "FEATHERLESS_BASE_URL": fakes["featherless"].base_url,
+            "FEATHERLESS_API_KEY": "fake",
+            "ELEVENLABS_BASE_URL": fakes["elevenlabs"].base_url,
+            "ELEVENLABS_API_KEY": "fake",
+            "JOB_WORKERS": str(args.workers),
+            # Matching a re-upload to an earlier clip would skip analysis
+            "FINGERPRINT_MATCH": "0" if args.unique else "1",
+        }
+        server_env.update(pair.split("=", 1) for pair in args.server_env)
+        print(f"Starting server with fakes ({len(uploads)} uploads, {args.concurrency} at a time)...")
+        server = Server(server_env, work_dir).start()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            records = list(pool.map(
+                lambda clip: run_request(server.url, clip, args.language, 0.25, args.timeout), uploads
+            ))
+        wall = time.perf_counter() - start
+
+        summary = summarize(records, wall)
+        print(f"\n{format_summary(summary)}")
+        for record in records:
+            if record["error"]:
+                print(f"✗ {record['clip']}: {record['error']}")
+
+        results = {
+            "run": {
+                "commit": _commit(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "host": {"platform": platform.platform(), "cpus": os.cpu_count()},
+                "args": vars(args),
+                "server_env": server_env,
+                "fake_requests": {name: fake.requests for name, fake in fakes.items()},
+                "fake_429s": {name: fake.throttled for name, fake in fakes.items()},
+            },
+            "summary": summary,
+            "requests": records,
+        }
+        out_path = args.json or os.path.join(
+            BACKEND_DIR, "bench_results",
+            f"load-{results['run']['commit'] or 'local'}-{time.strftime('%Y%m%d-%H%M%S')}.json",
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+        with open(out_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {out_path}")
+
+        if args.compare:
+            with open(args.compare) as f:
+                print(f"\nCompared with {args.compare}:\n{compare(json.load(f), results)}")
+    finally:
+        if server:
+            server.stop()
+        for fake in fakes.values():
+            fake.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+# load test for live progress: thousands of idle followers, fan-out latency and slow readers
+import os
+import sys
+import json
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+
+from batch import percentile
+from progress import ProgressBus, PROGRESS_BUFFER
+
+
+def _stats(values):
+    return {
+        "p50_ms": round(percentile(values, 50) * 1000, 2),
+        "p99_ms": round(percentile(values, 99) * 1000, 2),
+        "max_ms": round(max(values, default=0.0) * 1000, 2),
+    }
+
+
+async def _follow(subscription, latencies):
+    async for snapshot in subscription:
+        latencies.append(time.time() - snapshot["updated_at"])
+
+
+async def bench_bus(followers, jobs, idle_seconds, rounds):
+    """
+    Followers spread over `jobs` job channels, all on one event loop, the way
+    the server's websocket handlers use the bus.
+    """
+    bus = ProgressBus()
+    bus.bind()
+    job_rows = [{"id": f"job-{j}", "client_id": f"client-{j}", "status": "running"} for j in range(jobs)]
+    latencies = []
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    subscriptions = [bus.subscribe(f"job:job-{i % jobs}") for i in range(followers)]
+    tasks = [asyncio.create_task(_follow(s, latencies)) for s in subscriptions]
+    await asyncio.sleep(0)  # let every follower park on its first get()
+    per_follower = (tracemalloc.get_traced_memory()[0] - before) / followers
+    tracemalloc.stop()
+
+    # Nothing is published while idle, so the loop should be asleep throughout
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    await asyncio.sleep(idle_seconds)
+    idle_cpu = time.process_time() - cpu_start
+    idle_wall = time.perf_counter() - wall_start
+
+    # A follower that never reads: its buffer has to stay bounded
+    stalled = bus.subscribe("job:job-0")
+
+    publish_start = time.perf_counter()
+    for r in range(rounds):
+        for job in job_rows:
+            bus.update(job, stage="mux", fraction=(r + 1) / rounds, detail="fused")
+        await asyncio.sleep(0.01)
+    while len(latencies) < followers * rounds and time.perf_counter() - publish_start < 30:
+        await asyncio.sleep(0.01)
+    publish_seconds = time.perf_counter() - publish_start
+
+    late = bus.subscribe("job:job-0")
+    replayed = late.buffer[0]["stages"]["mux"]["percent"] if late.buffer else None
+
+    for subscription in subscriptions + [stalled, late]:
+        subscription.__exit__(None, None, None)
+    await asyncio.gather(*tasks)
+
+    return {
+        "followers": followers,
+        "jobs": jobs,
+        "bytes_per_follower": round(per_follower),
+        "idle_cpu_percent": round(100 * idle_cpu / idle_wall, 2),
+        "messages": len(latencies),
+        "expected_messages": followers * rounds,
+        "messages_per_second": round(len(latencies) / publish_seconds),
+        "fanout_latency": _stats(latencies),
+        "stalled_buffered": len(stalled.buffer),
+        "stalled_dropped": stalled.dropped,
+        "replayed_percent": replayed,
+        "subscribers_left": bus.subscriber_count(),
+    }
+
+
+def _proc_cpu_seconds(pid):
+    """utime + stime of a process, from /proc."""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def _proc_rss_bytes(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def _raise_fd_limit(needed):
+    try:
+        import resource
+    except ImportError:
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < needed:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, needed), hard))
+
+
+async def bench_sockets(followers, idle_seconds, clip, timeout):
+    """
+    Real websockets against the app under uvicorn (TEST_MODE, no API calls):
+    server CPU while they all sit idle, its memory per socket, and with a clip,
+    how quickly one job's progress reaches every socket following it.
+    """
+    import websockets
+    from bench_load import Server
+
+    _raise_fd_limit(2 * followers + 256)
+    work_dir = tempfile.mkdtemp(prefix="progress-fanout-")
+    server = Server({"TEST_MODE": "1", "CROWD_BANK_FILL_ON_STARTUP": "0"}, work_dir).start()
+    ws_url = server.url.replace("http://", "ws://")
+    client_id = "fanout"
+    sockets, latencies, messages = [], [], {"count": 0}
+    done = asyncio.Event()
+
+    async def follow(ws):
+        async for raw in ws:
+            snapshot = json.loads(raw)
+            latencies.append(time.time() - snapshot["updated_at"])
+            messages["count"] += 1
+            if snapshot["status"] in ("done", "failed"):
+                done.set()
+
+    try:
+        rss_before = _proc_rss_bytes(server.pid)
+        for _ in range(followers):
+            sockets.append(await websockets.connect(f"{ws_url}/ws/{client_id}", max_queue=PROGRESS_BUFFER))
+        await asyncio.sleep(1)
+        per_socket = (_proc_rss_bytes(server.pid) - rss_before) / followers
+
+        cpu_start, wall_start = _proc_cpu_seconds(server.pid), time.perf_counter()
+        await asyncio.sleep(idle_seconds)
+        idle_cpu = _proc_cpu_seconds(server.pid) - cpu_start
+        idle_wall = time.perf_counter() - wall_start
+
+        result = {
+            "followers": followers,
+            "server_bytes_per_socket": round(per_socket),
+            "server_idle_cpu_percent": round(100 * idle_cpu / idle_wall, 2),
+        }
+
+        if clip:
+            import requests
+            readers = [asyncio.create_task(follow(ws)) for ws in sockets]
+            start = time.perf_counter()
+            with open(clip, "rb") as f:
+                response = await asyncio.to_thread(
+                    requests.post, f"{server.url}/generate-commentary",
+                    files={"video": (os.path.basename(clip), f, "video/mp4")},
+                    data={"client_id": client_id}, timeout=timeout,
+                )
+            response.raise_for_status()
+            await asyncio.wait_for(done.wait(), timeout)
+            await asyncio.sleep(1)  # let the last snapshot reach the slowest sockets
+            result.update({
+                "job_seconds": round(time.perf_counter() - start, 2),
+                "messages": messages["count"],
+                "messages_per_socket": round(messages["count"] / followers, 1),
+                "fanout_latency": _stats(latencies),
+            })
+            for reader in readers:
+                reader.cancel()
+        return result
+    finally:
+        await asyncio.gather(*(ws.close() for ws in sockets), return_exceptions=True)
+        server.stop()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the progress bus and its websockets")
+    parser.add_argument("--followers", type=int, default=5000, help="Subscribers (or sockets) at once")
+    parser.add_argument("--jobs", type=int, default=100, help="Job channels the followers are spread over")
+    parser.add_argument("--idle", type=float, default=5, help="Seconds to measure idle CPU over")
+    parser.add_argument("--rounds", type=int, default=50, help="Progress updates published per job")
+    parser.add_argument("--sockets", action="store_true",
+                        help="Open real websockets to the app under uvicorn instead (needs the websockets package)")
+    parser.add_argument("--clip", help="With --sockets, upload this clip and time its progress reaching every socket")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    if args.sockets:
+        result = asyncio.run(bench_sockets(args.followers, args.idle, args.clip, args.timeout))
+    else:
+        result = asyncio.run(bench_bus(args.followers, args.jobs, args.idle, args.rounds))
+    print(json.dumps(result, indent=2))
+
+    failures = []
+    idle_cpu = result.get("idle_cpu_percent", result.get("server_idle_cpu_percent"))
+    if idle_cpu > 5:
+        failures.append(f"{idle_cpu}% CPU with every follower idle")
+    if not args.sockets:
+        if result["messages"] != result["expected_messages"]:
+            failures.append(f"{result['messages']} of {result['expected_messages']} messages delivered")
+        if result["stalled_buffered"] > PROGRESS_BUFFER:
+            failures.append(f"stalled follower has {result['stalled_buffered']} messages queued")
+        if result["replayed_percent"] != 100.0:
+            failures.append("late subscriber didn't get the latest snapshot")
+        if result["subscribers_left"]:
+            failures.append(f"{result['subscribers_left']} subscriptions left after closing")
+    for failure in failures:
+        print(f"✗ {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
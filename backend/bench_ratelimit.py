@@ -0,0 +1,107 @@
+# compares the ElevenLabs client with and without the rate limiter against a fake with a hard ceiling
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from batch import percentile
+from fake_services import FakeElevenLabs, parse_latency
+
+
+def _run(mode, args, fake, stream_audio, ratelimit):
+    """Every caller thread keeps making calls until `args.calls` have been made in total."""
+    if mode == "limiter":
+        limiter = ratelimit.set_limiter(
+            "elevenlabs", rps=args.limiter_rps, burst=max(1, int(args.limiter_rps)),
+            concurrency=args.limiter_concurrency, max_concurrency=args.callers,
+        )
+    else:
+        # Nothing but the client's own retries with backoff
+        limiter = ratelimit.set_limiter("elevenlabs", rps=0.0, concurrency=10_000, max_concurrency=10_000)
+        limiter.concurrency.minimum = 10_000
+
+    fake.requests = fake.throttled = 0
+    remaining = [args.calls]
+    lock = threading.Lock()
+    results = []
+
+    def caller(client):
+        ratelimit.set_client(client)
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            try:
+                for _ in stream_audio("/text-to-speech/bench/stream", {"text": "bench"}):
+                    pass
+                ok = True
+            except Exception:
+                ok = False
+            results.append((client, ok, time.perf_counter() - start))
+
+    # One client with most of the callers, one with a few: fair queueing should
+    # keep the light client's latency close to the heavy one's
+    clients = ["light"] * args.light_callers + ["heavy"] * (args.callers - args.light_callers)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+        list(pool.map(caller, clients))
+    wall = time.perf_counter() - start
+
+    done = [r for r in results if r[1]]
+    summary = {
+        "mode": mode,
+        "calls": len(results),
+        "succeeded": len(done),
+        "failed": len(results) - len(done),
+        "succeeded_per_second": round(len(done) / wall, 2),
+        "provider_requests": fake.requests + fake.throttled,
+        "provider_429s": fake.throttled,
+        "final_concurrency_limit": round(limiter.concurrency.limit, 2),
+    }
+    for client in ("heavy", "light"):
+        latencies = [seconds for c, ok, seconds in done if c == client]
+        summary[f"{client}_p50"] = round(percentile(latencies, 50), 3)
+        summary[f"{client}_p99"] = round(percentile(latencies, 99), 3)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Throughput against a provider ceiling, with and without the rate limiter"
+    )
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--callers", type=int, default=32, help="Threads making calls at once")
+    parser.add_argument("--light-callers", type=int, default=4, help="How many of them belong to the light client")
+    parser.add_argument("--ceiling-concurrent", type=int, default=4, help="Fake's max requests at once")
+    parser.add_argument("--ceiling-rps", type=float, default=10, help="Fake's max requests per second")
+    parser.add_argument("--latency", default="0.2", help="Fake's response time (latency spec)")
+    parser.add_argument("--limiter-rps", type=float, default=10, help="Token bucket rate (the plan's quota)")
+    parser.add_argument("--limiter-concurrency", type=int, default=2, help="Starting concurrency limit")
+    args = parser.parse_args()
+
+    with FakeElevenLabs(
+        latency=parse_latency(args.latency), chunk_size=4096, chunk_interval=0,
+        max_concurrent=args.ceiling_concurrent, rps=args.ceiling_rps,
+    ) as fake:
+        os.environ["ELEVENLABS_BASE_URL"] = fake.base_url
+        os.environ.setdefault("ELEVENLABS_API_KEY", "fake")
+        # Imported after the base URL is set, which the client reads at import
+        import ratelimit
+        from elevenlabs_client import stream_audio
+
+        latency = parse_latency(args.latency)
+        mean_latency = latency if isinstance(latency, float) else 0.0
+        ceiling = min(args.ceiling_rps, args.ceiling_concurrent / mean_latency if mean_latency else args.ceiling_rps)
+        summaries = [_run(mode, args, fake, stream_audio, ratelimit) for mode in ("retries", "limiter")]
+
+    for summary in summaries:
+        summary["ceiling_share"] = round(summary["succeeded_per_second"] / ceiling, 2)
+    print(json.dumps({"ceiling_calls_per_second": round(ceiling, 2), "runs": summaries}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# script generation throughput under concurrent jobs, using the offline stub backend
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import script_backends
+from commentator_script import getScript
+
+
+def _run(jobs, batching, latency, per_item):
+    """Generate `jobs` distinct scripts at once; return (seconds, backend calls)."""
+    backend = script_backends.StubBackend(latency=latency, per_item=per_item)
+    backend.supports_batching = batching
+    script_backends.set_backend(backend)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        list(pool.map(
+            lambda i: getScript(f"Clip {i}: a backflip into a half-court swish.", duration=10.0),
+            range(jobs),
+        ))
+    return time.perf_counter() - start, backend.calls
+
+
+def main():
+    """Usage: python bench_script_backends.py [jobs] [latency] [per_item]"""
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    latency = float(sys.argv[2]) if len(sys.argv) > 2 else 0.5
+    per_item = float(sys.argv[3]) if len(sys.argv) > 3 else 0.02
+
+    results = {mode: _run(jobs, mode == "batched", latency, per_item) for mode in ["single", "batched"]}
+
+    print(f"\n{jobs} concurrent jobs, stub latency {latency}s + {per_item}s per item")
+    print(f"{'mode':<10}{'seconds':>10}{'calls':>8}{'scripts/s':>12}")
+    for mode, (seconds, calls) in results.items():
+        print(f"{mode:<10}{seconds:>10.2f}{calls:>8}{jobs / seconds:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
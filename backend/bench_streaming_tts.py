@@ -0,0 +1,67 @@
+# compares buffered TTS-then-mux against streaming the voice-over into ffmpeg
+import os
+import sys
+import shutil
+import tempfile
+import time
+
+from fake_services import FakeElevenLabs
+
+SCRIPT = "What a shot! Off the backboard, off the rim, and in!"
+
+
+def _in_temp_dir(func):
+    """Run func(work_dir) with a fresh temp directory and return its wall time."""
+    work_dir = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        func(work_dir)
+        return time.perf_counter() - start
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    """Usage: python bench_streaming_tts.py <video> <voice_mp3> <crowd_mp3> [chunk_interval] [runs]"""
+    if len(sys.argv) < 4:
+        print("Usage: python bench_streaming_tts.py <video_file> <voice_mp3> <crowd_mp3> "
+              "[chunk_interval_seconds] [runs]")
+        sys.exit(1)
+
+    video_file, voice_file, crowd_file = (os.path.abspath(p) for p in sys.argv[1:4])
+    chunk_interval = float(sys.argv[4]) if len(sys.argv) > 4 else 0.1
+    runs = int(sys.argv[5]) if len(sys.argv) > 5 else 3
+
+    with FakeElevenLabs(audio_path=voice_file, chunk_interval=chunk_interval) as fake:
+        # The client reads these at import time
+        os.environ["ELEVENLABS_BASE_URL"] = fake.base_url
+        os.environ.setdefault("ELEVENLABS_API_KEY", "fake")
+        from tts_chris import generate_chris_mp3, stream_chris_mp3
+        from video_processor import VideoProcessor, VOICE_PIPE
+        from media_info import probe_media
+
+        # Give the streaming path the true length so both make the same padding choice
+        voice_seconds = float(probe_media(voice_file)["format"]["duration"])
+
+        def buffered(work_dir):
+            voice_path = os.path.join(work_dir, "voice.mp3")
+            generate_chris_mp3(SCRIPT, out_path=voice_path)
+            VideoProcessor(video_file, voice_path, crowd_file, work_dir=work_dir).process_fused()
+
+        def streaming(work_dir):
+            processor = VideoProcessor(video_file, VOICE_PIPE, crowd_file, work_dir=work_dir)
+            processor.process_streaming(stream_chris_mp3(SCRIPT), voice_seconds)
+
+        results = {}
+        for name, func in [("buffered", buffered), ("streaming", streaming)]:
+            times = [_in_temp_dir(func) for _ in range(runs)]
+            results[name] = (min(times), sum(times) / len(times))
+
+    print(f"\nchunk interval {chunk_interval}s, {len(fake.audio)} byte voice-over")
+    print(f"{'mode':<12}{'best (s)':>10}{'mean (s)':>10}")
+    for name, (best, mean) in results.items():
+        print(f"{name:<12}{best:>10.2f}{mean:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
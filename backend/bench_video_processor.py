@@ -0,0 +1,65 @@
+# compares the NumPy premix and the single-pass ffmpeg graph against the old three-step chain
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from video_processor import VideoProcessor
+
+
+def _run(mode, video_file, voice_file, crowd_file, work_dir):
+    """Run one processing mode inside work_dir and return (seconds, bytes_written)."""
+    processor = VideoProcessor(video_file, voice_file, crowd_file, work_dir=work_dir)
+    start = time.perf_counter()
+    if mode == "premixed":
+        processor.process_premixed()
+    elif mode == "fused":
+        processor.process_fused()
+    else:
+        processor.process_three_step(cleanup=False)
+    elapsed = time.perf_counter() - start
+    print(f"{mode}: video mode {processor.video_mode}")
+
+    # Every file the run produced counts, intermediates included
+    written = sum(
+        os.path.getsize(f)
+        for f in [
+            processor.temp_video, processor.output_video, processor.final_video,
+            processor.last_frame, processor.tail_video, processor.mixed_audio,
+        ]
+        if os.path.exists(f)
+    )
+    return elapsed, written
+
+
+def main():
+    """Usage: python bench_video_processor.py <video> <voice> <crowd> [runs]"""
+    if len(sys.argv) < 4:
+        print("Usage: python bench_video_processor.py <video_file> <voice_file> <crowd_file> [runs]")
+        sys.exit(1)
+
+    video_file, voice_file, crowd_file = (os.path.abspath(p) for p in sys.argv[1:4])
+    runs = int(sys.argv[4]) if len(sys.argv) > 4 else 3
+
+    results = {}
+    # The premix decodes the crowd once per process, so its best run is the warm-cache one
+    for mode in ["three-step", "fused", "premixed"]:
+        times, sizes = [], []
+        for _ in range(runs):
+            work_dir = tempfile.mkdtemp()
+            try:
+                elapsed, written = _run(mode, video_file, voice_file, crowd_file, work_dir)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            times.append(elapsed)
+            sizes.append(written)
+        results[mode] = (min(times), sum(times) / len(times), max(sizes))
+
+    print(f"\n{'mode':<12}{'best (s)':>10}{'mean (s)':>10}{'written (MB)':>14}")
+    for mode, (best, mean, written) in results.items():
+        print(f"{mode:<12}{best:>10.2f}{mean:>10.2f}{written / 1e6:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+# content-addressed, disk-backed cache for pipeline results
+import os
+import json
+import time
+import shutil
+import hashlib
+import sqlite3
+import tempfile
+import threading
+from collections import Counter
+
+from metrics import CACHE_LOOKUPS
+
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(__file__), "cache"))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(2 * 1024**3)))  # 2 GB
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's contents, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_key(*parts):
+    """Stable SHA-256 key for any JSON-serialisable combination of values."""
+    encoded = json.dumps(parts, sort_keys=True, ensure_ascii=False).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class DiskCache:
+    """
+    Files on disk indexed by a small SQLite table, evicted least-recently-used
+    first once the total size goes over max_bytes.
+
+    Entries live in namespaces ("summary", "script", "tts", ...) so hit and
+    miss counts can be reported per cache level.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = Counter()
+        self.misses = Counter()
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(directory, "index.db"), timeout=30, check_same_thread=False
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    namespace TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL,
+                    PRIMARY KEY (namespace, key)
+                )
+                """
+            )
+
+    def _path(self, namespace, key):
+        return os.path.join(self.directory, namespace, key[:2], key)
+
+    def get_path(self, namespace, key):
+        """Return the cached file's path and mark it as used, or None on a miss."""
+        path = self._path(namespace, key)
+        with self._lock, self._conn:
+            updated = self._conn.execute(
+                "UPDATE entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                (time.time(), namespace, key),
+            ).rowcount
+        if updated and os.path.exists(path):
+            self.hits[namespace] += 1
+            CACHE_LOOKUPS.inc(namespace=namespace, result="hit")
+            return path
+        self.misses[namespace] += 1
+        CACHE_LOOKUPS.inc(namespace=namespace, result="miss")
+        return None
+
+    def put_file(self, namespace, key, src_path):
+        """Copy a file into the cache and return the cached path."""
+        path = self._path(namespace, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Copy then rename so readers never see a half-written entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        os.close(fd)
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, path)
+
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, size, last_access) VALUES (?, ?, ?, ?)",
+                (namespace, key, os.path.getsize(path), time.time()),
+            )
+        self._evict()
+        return path
+
+    def get_text(self, namespace, key):
+        """Return cached text, or None on a miss."""
+        path = self.get_path(namespace, key)
+        if path is None:
+            return None
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+
+    def put_text(self, namespace, key, text):
+        """Store a piece of text."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(text)
+            self.put_file(namespace, key, tmp_path)
+        finally:
+            os.remove(tmp_path)
+
+    def fetch_file(self, namespace, key, dest_path):
+        """Copy a cached file to dest_path. Returns True on a hit."""
+        path = self.get_path(namespace, key)
+        if path is None:
+            return False
+        shutil.copyfile(path, dest_path)
+        return True
+
+    def _evict(self):
+        """Drop least-recently-used entries until the cache fits in max_bytes."""
+        with self._lock, self._conn:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = self._conn.execute(
+                "SELECT namespace, key, size FROM entries ORDER BY last_access"
+            ).fetchall()
+            for namespace, key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(self._path(namespace, key))
+                except FileNotFoundError:
+                    pass
+                self._conn.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+                )
+                total -= size
+
+    def stats(self):
+        """Hit/miss counters per namespace plus the current size on disk."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT namespace, COUNT(*), SUM(size) FROM entries GROUP BY namespace"
+            ).fetchall()
+        namespaces = set(self.hits) | set(self.misses) | {row[0] for row in rows}
+        sizes = {row[0]: (row[1], row[2]) for row in rows}
+        return {
+            "max_bytes": self.max_bytes,
+            "total_bytes": sum(size for _, size in sizes.values()),
+            "levels": {
+                name: {
+                    "hits": self.hits[name],
+                    "misses": self.misses[name],
+                    "entries": sizes.get(name, (0, 0))[0],
+                    "bytes": sizes.get(name, (0, 0))[1],
+                }
+                for name in sorted(namespaces)
+            },
+        }
+
+
+_cache = None
+
+
+def get_cache():
+    """The process-wide result cache, created on first use."""
+    global _cache
+    if _cache is None:
+        _cache = DiskCache()
+    return _cache
@@ -0,0 +1,53 @@
+# fails if importing the server takes longer than the startup budget (python -X importtime)
+import argparse
+import os
+import subprocess
+import sys
+
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1500"))
+
+
+def import_times(module):
+    """
+    Import `module` in a fresh interpreter and return its -X importtime rows
+    as (self_us, cumulative_us, name) tuples.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check server import time against a budget")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15, help="How many of the slowest imports to list")
+    args = parser.parse_args()
+
+    rows = import_times(args.module)
+    total_ms = next(cumulative for _, cumulative, name in rows if name.strip() == args.module) / 1000
+
+    print(f"{'self (ms)':>10}{'total (ms)':>12}  module")
+    for self_us, cumulative_us, name in sorted(rows, key=lambda row: -row[1])[:args.top]:
+        print(f"{self_us / 1000:>10.1f}{cumulative_us / 1000:>12.1f}  {name}")
+
+    print(f"\nimport {args.module}: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms)")
+    if total_ms > args.budget_ms:
+        print("✗ Over budget")
+        sys.exit(1)
+    print("✓ Within budget")
+
+
+if __name__ == "__main__":
+    main()
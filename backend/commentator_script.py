@@ -1,14 +1,5 @@
-from dotenv import load_dotenv
-from openai import OpenAI
-import os
-import subprocess
-
-load_dotenv()  # loads variables from .env into environment
-
-client = OpenAI(
-    base_url="https://api.featherless.ai/v1",
-    api_key=os.getenv("FEATHERLESS_API_KEY"),
-)
+from script_backends import get_generator
+from media_info import get_media_info, media_duration
 
 LANGUAGE_NAMES = {
     "en": "English",
@@ -18,27 +9,14 @@ LANGUAGE_NAMES = {
     "es": "Spanish",
 }
 
-def get_video_duration(video_path):
-    """Get video duration in seconds using ffprobe."""
-    result = subprocess.run(
-        ["ffprobe", "-v", "quiet", "-print_format", "json", "-show_format", video_path],
-        capture_output=True, text=True,
-    )
-    import json
-    data = json.loads(result.stdout)
-    return float(data["format"]["duration"])
-
-
 # ~3 words per second of spoken commentary
 WORDS_PER_SECOND = 3
 
 
-def getScript(trickshot, language="en", trickshot_name="", video_path=""):
+def getScript(trickshot, language="en", trickshot_name="", video_path="", duration=None):
     # Calculate target word count from video duration
-    if video_path:
-        duration = get_video_duration(video_path)
-    else:
-        duration = 10.0  # fallback
+    if duration is None:
+        duration = media_duration(get_media_info(video_path)) if video_path else 10.0  # fallback
     max_words = int(duration * WORDS_PER_SECOND)
     max_words = max(10, min(max_words, 80))  # clamp between 10-80 words
     print(f"Video duration: {duration:.1f}s -> target {max_words} words")
@@ -62,19 +40,16 @@ def getScript(trickshot, language="en", trickshot_name="", video_path=""):
         f"{lang_instruction}{name_instruction}"
     )
 
-    response = client.chat.completions.create(
-        model="meta-llama/Meta-Llama-3.1-8B-Instruct",
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {
-                "role": "user",
-                "content": (
-                    f"Summarize this trickshot in {max_words} words or fewer:\n\n{trickshot}"
-                ),
-            },
-        ],
-    )
-    raw = response.choices[0].message.content.strip()
+    # Goes through SCRIPT_BACKEND, batched with other jobs' requests when it supports that
+    raw = get_generator().generate([
+        {"role": "system", "content": system_prompt},
+        {
+            "role": "user",
+            "content": (
+                f"Summarize this trickshot in {max_words} words or fewer:\n\n{trickshot}"
+            ),
+        },
+    ]).strip()
     print(f"RAW FROM MODEL ({len(raw.split())} words):\n{raw}")
 
     # Strip surrounding quotes if the model wrapped it
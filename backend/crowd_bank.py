@@ -0,0 +1,226 @@
+# keeps a local pool of pre-generated crowd tracks so jobs don't call ElevenLabs each time
+import os
+import sys
+import json
+import fcntl
+import random
+import threading
+import uuid
+from contextlib import contextmanager
+
+from video_processor import run_ffmpeg
+
+CROWD_BANK_DIR = os.getenv("CROWD_BANK_DIR", os.path.join(os.path.dirname(__file__), "crowd_bank"))
+CROWD_POOL_SIZE = int(os.getenv("CROWD_POOL_SIZE", "8"))      # tracks kept per prompt variant
+CROWD_LOW_WATER = int(os.getenv("CROWD_LOW_WATER", "3"))      # refill when fewer are left
+CROWD_MAX_USES = int(os.getenv("CROWD_MAX_USES", "50"))       # retire a track after this many jobs
+CROWD_TRACK_SECONDS = 20
+
+CROWD_PROMPTS = {
+    "arena": (
+        "Background audio of a crowded basketball arena as heard through a TV broadcast. "
+        "Include cheering, clapping, chanting, and natural crowd reactions. "
+        "No narration or music."
+    ),
+    "eruption": (
+        "A packed basketball arena erupting after an incredible shot, as heard through a TV broadcast. "
+        "Loud roaring, cheering and applause that slowly settles into excited chatter. "
+        "No narration or music."
+    ),
+    "gym": (
+        "A small, lively school gym crowd during a basketball game. "
+        "Clapping, whistles, shouts of encouragement and sneaker squeaks. "
+        "No narration or music."
+    ),
+}
+DEFAULT_VARIANT = os.getenv("CROWD_VARIANT", "arena")
+
+
+class CrowdBank:
+    """
+    A directory of crowd tracks per prompt variant.
+
+    Jobs pick a track from the pool instead of generating one. Each track is
+    retired after CROWD_MAX_USES picks so the audio doesn't get stale, and the
+    pool is topped back up in a background thread when it gets low.
+    """
+
+    def __init__(self, directory=CROWD_BANK_DIR, pool_size=CROWD_POOL_SIZE,
+                 low_water=CROWD_LOW_WATER, max_uses=CROWD_MAX_USES):
+        self.directory = directory
+        self.pool_size = pool_size
+        self.low_water = low_water
+        self.max_uses = max_uses
+        self._lock = threading.Lock()
+        self._refilling: set[str] = set()
+        self._uses_path = os.path.join(directory, "uses.json")
+        self._lock_path = os.path.join(directory, "uses.lock")
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def _pool_lock(self):
+        """
+        Hold the pool across threads and processes: process-mode jobs and batch
+        workers share the directory and uses.json, each with its own CrowdBank.
+        """
+        with self._lock, open(self._lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _variant_dir(self, variant):
+        path = os.path.join(self.directory, variant)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _load_uses(self):
+        try:
+            with open(self._uses_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_uses(self, uses):
+        tmp_path = f"{self._uses_path}.{uuid.uuid4().hex}"
+        with open(tmp_path, "w") as f:
+            json.dump(uses, f)
+        os.replace(tmp_path, self._uses_path)
+
+    def tracks(self, variant):
+        """Paths of the tracks currently in a variant's pool."""
+        variant_dir = self._variant_dir(variant)
+        return sorted(
+            os.path.join(variant_dir, name)
+            for name in os.listdir(variant_dir)
+            if name.endswith(".mp3")
+        )
+
+    def generate_track(self, variant):
+        """Ask ElevenLabs for one new track and add it to the pool."""
+        from eleven_sfx import generate_crowd_sfx_mp3
+
+        variant_dir = self._variant_dir(variant)
+        final_path = os.path.join(variant_dir, f"{uuid.uuid4().hex}.mp3")
+        tmp_path = f"{final_path}.part"
+        generate_crowd_sfx_mp3(
+            CROWD_PROMPTS[variant], tmp_path,
+            duration_seconds=CROWD_TRACK_SECONDS, loop=False
+        )
+        os.replace(tmp_path, final_path)
+        print(f"✓ Added crowd track: {final_path}")
+        return final_path
+
+    def fill(self, variants=None):
+        """Top every variant's pool up to pool_size tracks."""
+        for variant in variants or CROWD_PROMPTS:
+            missing = self.pool_size - len(self.tracks(variant))
+            for _ in range(max(0, missing)):
+                self.generate_track(variant)
+
+    def pick(self, variant=DEFAULT_VARIANT, seed=None):
+        """
+        Pick a track from the pool, generating one only if the pool is empty.
+
+        Args:
+            variant: Key into CROWD_PROMPTS
+            seed: Optional value (e.g. the video hash) so re-uploads of the same
+                clip get the same track while it is still in the pool
+        """
+        picked = self._pick_from_pool(variant, seed)
+        if picked is None:
+            # Generated outside the lock so other jobs don't wait on ElevenLabs
+            self.generate_track(variant)
+            picked = self._pick_from_pool(variant, seed)
+            if picked is None:
+                raise RuntimeError(f"Crowd bank has no {variant} tracks")
+
+        track, pool_size = picked
+        if pool_size <= self.low_water:
+            self.refill_in_background(variant)
+        return track
+
+    def _pick_from_pool(self, variant, seed):
+        # Listing, choosing and retiring all happen under the lock, so another
+        # job can't retire the chosen track in between
+        with self._pool_lock():
+            tracks = [track for track in self.tracks(variant) if os.path.exists(track)]
+            if not tracks:
+                return None
+
+            track = random.Random(seed).choice(tracks) if seed else random.choice(tracks)
+            uses = self._load_uses()
+            uses[track] = uses.get(track, 0) + 1
+            if uses[track] >= self.max_uses and len(tracks) > 1:
+                # Retire it; the caller still gets this copy for the current job
+                retired = f"{track}.retired"
+                os.replace(track, retired)
+                del uses[track]
+                track = retired
+            self._save_uses(uses)
+        return track, len(tracks)
+
+    def refill_in_background(self, variant):
+        """Start a thread that tops the variant's pool up, unless one is already running."""
+        with self._lock:
+            if variant in self._refilling:
+                return
+            self._refilling.add(variant)
+
+        def refill():
+            try:
+                self.fill([variant])
+            except Exception as e:
+                print(f"✗ Crowd bank refill failed for {variant}: {e}")
+            finally:
+                with self._lock:
+                    self._refilling.discard(variant)
+
+        threading.Thread(target=refill, daemon=True).start()
+
+
+def fit_to_duration(track, out_path, seconds):
+    """Loop or trim a crowd track to exactly `seconds` long without re-encoding."""
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-stream_loop", "-1",
+        "-i", track,
+        "-t", f"{seconds:.3f}",
+        "-c", "copy",
+        out_path
+    ]
+    run_ffmpeg(cmd, "fit_crowd")
+    if track.endswith(".retired"):
+        os.remove(track)
+    return out_path
+
+
+_bank = None
+
+
+def get_bank():
+    """The process-wide crowd bank, created on first use."""
+    global _bank
+    if _bank is None:
+        _bank = CrowdBank()
+    return _bank
+
+
+def main():
+    """Usage: python crowd_bank.py fill [variant ...]"""
+    if len(sys.argv) < 2 or sys.argv[1] != "fill":
+        print("Usage: python crowd_bank.py fill [variant ...]")
+        print(f"\nVariants: {', '.join(CROWD_PROMPTS)}")
+        sys.exit(1)
+
+    variants = sys.argv[2:] or None
+    bank = get_bank()
+    bank.fill(variants)
+    for variant in variants or CROWD_PROMPTS:
+        print(f"{variant}: {len(bank.tracks(variant))} tracks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+# sends job results to clients: HTTP range requests and following a file while it's written
+import os
+import asyncio
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+CHUNK_SIZE = 256 * 1024
+FOLLOW_POLL_INTERVAL = 0.25
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range "bytes=..." header into an inclusive (start, end).
+
+    Returns None when there is no usable Range header (send the whole file).
+    Raises HTTPException(416) when the range can't be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if start_text:
+            start = int(start_text)
+            end = int(end_text) if end_text else size - 1
+        else:
+            # "bytes=-500" is the last 500 bytes
+            start = max(0, size - int(end_text))
+            end = size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, min(end, size - 1)
+
+
+async def _read_file(path, start, end, on_complete=None):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    if on_complete and remaining == 0:
+        on_complete()
+
+
+def range_file_response(path, range_header, media_type="video/mp4", filename=None, on_delivered=None):
+    """
+    Serve a file with HTTP Range support, so video players can seek.
+
+    Args:
+        path: File to send
+        range_header: The request's Range header, if any
+        on_delivered: Optional callable run once the last byte of the file has
+            been sent (by a full response or by a range that reaches the end)
+    """
+    size = os.path.getsize(path)
+    byte_range = parse_range(range_header, size)
+    headers = {"Accept-Ranges": "bytes"}
+    if filename:
+        headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    if byte_range is None:
+        start, end, status = 0, size - 1, 200
+    else:
+        start, end = byte_range
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+
+    on_complete = on_delivered if end == size - 1 else None
+    return StreamingResponse(
+        _read_file(path, start, end, on_complete),
+        status_code=status,
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+class FollowAborted(Exception):
+    """The followed file can't be completed: the writer failed or started over."""
+
+
+async def follow_file(path, is_finished, on_complete=None, poll_interval=FOLLOW_POLL_INTERVAL):
+    """
+    Yield a file's bytes as another process writes it, until the writer is done.
+
+    The file stays open while it is followed, so a writer that deletes it and
+    starts a new one (VideoProcessor's fallbacks) is told apart by inode.
+
+    Args:
+        path: File being written (it may not exist yet)
+        is_finished: callable() -> (finished, succeeded), checked before each read
+        on_complete: Optional callable run if the whole file was sent successfully
+
+    Raises:
+        FollowAborted: If the writer failed, or replaced or truncated the file.
+            The bytes already sent can't be taken back, so the response has to
+            end in an error rather than look like a complete download.
+    """
+    f = None
+    offset = 0
+    try:
+        while True:
+            # Check first, then drain: anything written before the writer finished
+            # is always sent
+            finished, succeeded = is_finished()
+
+            if f is None and os.path.exists(path):
+                f = open(path, "rb")
+            if f is not None:
+                try:
+                    replaced = os.stat(path).st_ino != os.fstat(f.fileno()).st_ino
+                except FileNotFoundError:
+                    replaced = True
+                size = os.fstat(f.fileno()).st_size
+                if replaced or size < offset:
+                    raise FollowAborted(f"{path} was rewritten while it was being sent")
+                while offset < size:
+                    chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, size - offset))
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    yield chunk
+                if offset < size:
+                    continue
+
+            if finished:
+                if not succeeded:
+                    raise FollowAborted(f"The writer of {path} failed")
+                if on_complete:
+                    on_complete()
+                return
+            await asyncio.sleep(poll_interval)
+    finally:
+        if f is not None:
+            f.close()
@@ -1,15 +1,7 @@
 # eleven_sfx.py, makes the crowd noises mp3 file
-import os
-import requests
-from dotenv import load_dotenv
+from elevenlabs_client import post_audio
 
-load_dotenv()
-
-BASE_URL = "https://api.elevenlabs.io/v1"
-
-API_KEY = os.getenv("ELEVENLABS_API_KEY")
-if not API_KEY:
-    raise RuntimeError("Missing ELEVENLABS_API_KEY in environment or .env")
+# A missing ELEVENLABS_API_KEY is reported by /health and raised on first request
 
 
 def generate_crowd_sfx_mp3(
@@ -26,12 +18,6 @@ def generate_crowd_sfx_mp3(
 
     Endpoint: POST /v1/sound-generation :contentReference[oaicite:2]{index=2}
     """
-    url = f"{BASE_URL}/sound-generation?output_format={output_format}"  # :contentReference[oaicite:3]{index=3}
-    headers = {
-        "xi-api-key": API_KEY,  # required :contentReference[oaicite:4]{index=4}
-        "Content-Type": "application/json",
-        "Accept": "audio/mpeg",
-    }
     payload = {
         "text": prompt,  # required :contentReference[oaicite:5]{index=5}
         "model_id": model_id,  # defaults to eleven_text_to_sound_v2 :contentReference[oaicite:6]{index=6}
@@ -40,10 +26,9 @@ def generate_crowd_sfx_mp3(
         "prompt_influence": prompt_influence,  # optional :contentReference[oaicite:9]{index=9}
     }
 
-    resp = requests.post(url, headers=headers, json=payload, timeout=120)
-    resp.raise_for_status()
-
-    with open(out_path, "wb") as f:
-        f.write(resp.content)
-
-    return out_path
+    return post_audio(
+        "/sound-generation",
+        payload,
+        out_path,
+        params={"output_format": output_format},
+    )
@@ -0,0 +1,170 @@
+# shared ElevenLabs HTTP client: pooled keep-alive session, retries, streamed downloads
+import os
+import time
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import providers  # noqa: F401  (loads .env)
+from metrics import API_RETRIES
+from ratelimit import get_limiter
+
+# Point at a local stub (see fake_services.py) with ELEVENLABS_BASE_URL=http://127.0.0.1:8100/v1
+BASE_URL = os.getenv("ELEVENLABS_BASE_URL", "https://api.elevenlabs.io/v1")
+
+POOL_SIZE = int(os.getenv("ELEVENLABS_POOL_SIZE", "16"))
+MAX_RETRIES = int(os.getenv("ELEVENLABS_MAX_RETRIES", "3"))
+BACKOFF_BASE = 0.5   # seconds, doubled on every retry
+BACKOFF_MAX = 8.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 120
+CHUNK_SIZE = 64 * 1024
+
+
+class ElevenLabsError(RuntimeError):
+    """ElevenLabs answered with an error status."""
+
+    def __init__(self, status_code, text):
+        super().__init__(f"ElevenLabs request failed ({status_code}): {text}")
+        self.status_code = status_code
+        self.text = text
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """The process-wide requests session, with a connection pool sized for our workers."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+    return _session
+
+
+def _api_key():
+    api_key = os.getenv("ELEVENLABS_API_KEY")
+    if not api_key:
+        raise RuntimeError("Missing ELEVENLABS_API_KEY in environment or .env")
+    return api_key
+
+
+def _backoff(attempt, retry_after=None):
+    """Seconds to wait before retry number `attempt` (0-based), with full jitter."""
+    if retry_after:
+        try:
+            return min(BACKOFF_MAX, float(retry_after))
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def _open(path, payload, params=None):
+    """
+    POST a JSON payload and return the open streaming response once it succeeds.
+
+    Connection errors and 429/5xx responses are retried up to MAX_RETRIES
+    times with jittered exponential backoff (honouring Retry-After). Retries
+    only happen before the first audio byte is handed back. Each retry takes
+    a token from the ElevenLabs rate limiter, and a 429 also shrinks its
+    concurrency limit and pauses it for Retry-After.
+    """
+    url = f"{BASE_URL}{path}"
+    headers = {
+        "xi-api-key": _api_key(),
+        "Content-Type": "application/json",
+        "Accept": "audio/mpeg",
+    }
+    session = get_session()
+    limiter = get_limiter("elevenlabs")
+
+    for attempt in range(MAX_RETRIES + 1):
+        last_attempt = attempt == MAX_RETRIES
+        if attempt:
+            limiter.bucket.take_sync()
+        try:
+            resp = session.post(
+                url, headers=headers, json=payload, params=params,
+                stream=True, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if last_attempt:
+                raise
+            delay = _backoff(attempt)
+            print(f"ElevenLabs {path} failed ({e}), retrying in {delay:.1f}s")
+            API_RETRIES.inc(provider="elevenlabs")
+            time.sleep(delay)
+            continue
+
+        if resp.status_code == 429:
+            limiter.throttled(resp.headers.get("Retry-After"))
+        if resp.status_code in RETRY_STATUSES and not last_attempt:
+            delay = _backoff(attempt, resp.headers.get("Retry-After"))
+            resp.close()
+            print(f"ElevenLabs {path} returned {resp.status_code}, retrying in {delay:.1f}s")
+            API_RETRIES.inc(provider="elevenlabs")
+            time.sleep(delay)
+            continue
+
+        # Helpful error message without printing mp3 bytes
+        if not resp.ok:
+            with resp:
+                raise ElevenLabsError(resp.status_code, resp.text)
+        return resp
+
+
+def stream_audio(path, payload, params=None, chunk_size=CHUNK_SIZE):
+    """
+    POST to an ElevenLabs audio endpoint and yield the audio bytes as they arrive.
+
+    Args:
+        path: Endpoint path under BASE_URL, e.g. "/text-to-speech/<voice>/stream"
+        payload: JSON body
+        params: Optional query-string parameters
+        chunk_size: Max bytes per yielded chunk
+    """
+    # The slot is held until the audio has been read: ElevenLabs counts open
+    # requests against the concurrency limit of the plan
+    with get_limiter("elevenlabs").slot_sync(path.split("/")[1]) as call:
+        with _open(path, payload, params) as resp:
+            call.responded()
+            for chunk in resp.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    yield chunk
+
+
+def post_audio(path, payload, out_path, params=None):
+    """
+    POST a JSON payload to an ElevenLabs audio endpoint and stream the response to out_path.
+
+    The audio is written chunk by chunk to a temporary file and renamed into
+    place, so a failed download never leaves a truncated out_path behind.
+
+    Args:
+        path: Endpoint path under BASE_URL, e.g. "/sound-generation"
+        payload: JSON body
+        out_path: Where to save the audio
+        params: Optional query-string parameters
+
+    Returns:
+        out_path
+    """
+    tmp_path = f"{out_path}.part"
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in stream_audio(path, payload, params):
+                f.write(chunk)
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return out_path
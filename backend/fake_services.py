@@ -0,0 +1,435 @@
+# local stand-ins for the external APIs, for trying the pipeline without real keys or credits
+import sys
+import math
+import json
+import time
+import uuid
+import random
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Served when no real audio file is given; not playable, but the right shape for HTTP tests
+PLACEHOLDER_AUDIO = b"ID3" + bytes(64 * 1024)
+
+
+def parse_latency(spec):
+    """
+    Turn a latency setting into a `latency` value for FakeService.
+
+    "0.3" is a fixed delay; "uniform:LOW:HIGH", "normal:MEAN:STDDEV" and
+    "lognormal:MEDIAN:SIGMA" draw a new delay for every request (never below 0).
+    """
+    kind, _, params = str(spec).partition(":")
+    if not params:
+        return float(kind)
+    a, b = (float(value) for value in params.split(":"))
+    if kind == "uniform":
+        return lambda: random.uniform(a, b)
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(a, b))
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(a), b)
+    raise ValueError(f"Unknown latency distribution: {kind}")
+
+
+def _value(setting):
+    return setting() if callable(setting) else setting
+
+
+class FakeService:
+    """
+    A tiny threaded HTTP server running in the background.
+
+    Subclasses fill in `routes`: a list of (method, path prefix, handler) where
+    handler(request, body) writes the response. Every request can be delayed
+    by `latency` seconds (a number, or a callable returning one) and failed
+    with `error_status` at `error_rate`, or for the first `fail_first` requests.
+    Like the real APIs, requests over `max_concurrent` at once or `rps` per
+    second get a 429 with Retry-After.
+    """
+
+    routes = []
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0,
+                 error_status=500, fail_first=0, max_concurrent=0, rps=0.0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.fail_first = fail_first
+        self.max_concurrent = max_concurrent
+        self.rps = rps
+        self.requests = 0
+        self.throttled = 0
+        self.active = 0
+        self._tokens = max(1.0, rps)
+        self._tokens_at = time.monotonic()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _delay(self):
+        return _value(self.latency)
+
+    def _admit(self):
+        """None if the request may run (and is now counted as active), else seconds for Retry-After (0 for none)."""
+        with self._lock:
+            if self.rps:
+                now = time.monotonic()
+                self._tokens = min(max(1.0, self.rps), self._tokens + (now - self._tokens_at) * self.rps)
+                self._tokens_at = now
+                if self._tokens < 1:
+                    self.throttled += 1
+                    return (1 - self._tokens) / self.rps
+            if self.max_concurrent and self.active >= self.max_concurrent:
+                self.throttled += 1
+                return 0.0
+            if self.rps:
+                self._tokens -= 1
+            self.active += 1
+            return None
+
+    def _should_fail(self):
+        with self._lock:
+            self.requests += 1
+            count = self.requests
+        return count <= self.fail_first or random.random() < self.error_rate
+
+    def _handler_class(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _read_body(self):
+                if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                    body = b""
+                    while True:
+                        size = int(self.rfile.readline().split(b";")[0], 16)
+                        chunk = self.rfile.read(size + 2)[:size]  # each chunk ends with CRLF
+                        if not size:
+                            return body
+                        body += chunk
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def _dispatch(self, method):
+                body = self._read_body()
+                retry_after = service._admit()
+                if retry_after is not None:
+                    # Over the concurrency limit there is no telling when a slot frees up
+                    self.send_json({"detail": "rate limited"}, status=429,
+                                   headers={"Retry-After": f"{retry_after:.2f}"} if retry_after else {})
+                    return
+                try:
+                    self._respond(method, body)
+                finally:
+                    with service._lock:
+                        service.active -= 1
+
+            def _respond(self, method, body):
+                time.sleep(service._delay())
+
+                if service._should_fail():
+                    self.send_json({"detail": "fake failure"}, status=service.error_status,
+                                   headers={"Retry-After": "0"})
+                    return
+
+                path = self.path.split("?", 1)[0]
+                for route_method, prefix, handler in service.routes:
+                    if route_method == method and path.startswith(prefix):
+                        handler(service, self, body)
+                        return
+                self.send_json({"detail": f"no route for {method} {path}"}, status=404)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def send_json(self, data, status=200, headers=None):
+                payload = json.dumps(data).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def send_bytes(self, data, content_type="audio/mpeg"):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_chunked(self, data, chunk_size, interval, content_type="audio/mpeg"):
+                """Send data with chunked transfer encoding, one chunk every `interval` seconds."""
+                self.send_stream(
+                    (data[start:start + chunk_size] for start in range(0, len(data), chunk_size)),
+                    interval, content_type,
+                )
+
+            def send_stream(self, chunks, interval, content_type):
+                """Send each of `chunks` as its own HTTP chunk, `interval` seconds apart."""
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for chunk in chunks:
+                    self.wfile.write(f"{len(chunk):X}\r\n".encode() + chunk + b"\r\n")
+                    self.wfile.flush()
+                    time.sleep(interval)
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+
+class FakeElevenLabs(FakeService):
+    """
+    Answers the text-to-speech and sound-generation endpoints with a fixed audio file.
+
+    The /stream text-to-speech endpoint sends it in chunk_size pieces, one
+    every chunk_interval seconds, to mimic audio being synthesised live. The
+    other endpoints take the same total time but answer in one piece.
+    """
+
+    def __init__(self, audio_path=None, chunk_size=16 * 1024, chunk_interval=0.1, **kwargs):
+        super().__init__(**kwargs)
+        self.chunk_size = chunk_size
+        self.chunk_interval = chunk_interval
+        if audio_path:
+            with open(audio_path, "rb") as f:
+                self.audio = f.read()
+        else:
+            self.audio = PLACEHOLDER_AUDIO
+        self.payloads = []
+
+    @property
+    def base_url(self):
+        """Value for ELEVENLABS_BASE_URL."""
+        return f"{self.url}/v1"
+
+    def _audio(self, request, body):
+        self.payloads.append(json.loads(body or b"{}"))
+        if request.path.split("?", 1)[0].endswith("/stream"):
+            request.send_chunked(self.audio, self.chunk_size, self.chunk_interval)
+        else:
+            # Same total synthesis time as streaming, delivered all at once
+            chunks = -(-len(self.audio) // self.chunk_size)
+            time.sleep(chunks * self.chunk_interval)
+            request.send_bytes(self.audio)
+
+    routes = [
+        ("POST", "/v1/text-to-speech/", _audio),
+        ("POST", "/v1/sound-generation", _audio),
+    ]
+
+
+class FakeTwelveLabs(FakeService):
+    """
+    The TwelveLabs (v1.3) calls getSummaryAsync makes: a direct asset upload,
+    indexing, status checks and the streamed analyze call.
+
+    An indexed asset reports "indexing" until `indexing_seconds` (a number or
+    a callable) have passed since it was created. The summary names the video
+    id, so every upload gets a different one, and is streamed back as NDJSON
+    text_generation events, one sentence every `stream_interval` seconds.
+    """
+
+    SUMMARY = (
+        "[00:00] A player stands on a ladder at half court holding a basketball. "
+        "[00:02] He spins once and launches the ball in a high arc toward the hoop. "
+        "[00:04] The ball bounces off the backboard, rolls around the rim and drops in. "
+        "[00:06] He jumps off the ladder and celebrates with his teammates."
+    )
+
+    def __init__(self, indexing_seconds=2.0, stream_interval=0.02, **kwargs):
+        super().__init__(**kwargs)
+        self.indexing_seconds = indexing_seconds
+        self.stream_interval = stream_interval
+        self.uploaded_bytes = 0
+        self._ready_at = {}  # indexed asset id -> time.monotonic() when it's ready
+
+    @property
+    def base_url(self):
+        """Value for TWELVELABS_BASE_URL."""
+        return f"{self.url}/v1.3"
+
+    def _create_asset(self, request, body):
+        with self._lock:
+            self.uploaded_bytes += len(body)
+        request.send_json({
+            "_id": uuid.uuid4().hex[:24],
+            "method": "direct",
+            "status": "ready",
+            "filename": "upload.mp4",
+            "file_type": "video/mp4",
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        })
+
+    def _create_indexed_asset(self, request, body):
+        asset_id = uuid.uuid4().hex[:24]
+        with self._lock:
+            self._ready_at[asset_id] = time.monotonic() + _value(self.indexing_seconds)
+        request.send_json({"_id": asset_id}, status=202)
+
+    def _get_indexed_asset(self, request, body):
+        asset_id = request.path.split("?", 1)[0].rstrip("/").rsplit("/", 1)[-1]
+        with self._lock:
+            ready_at = self._ready_at.get(asset_id)
+        if ready_at is None:
+            request.send_json({"code": "not_found", "message": f"No indexed asset {asset_id}"}, status=404)
+            return
+        request.send_json({
+            "_id": asset_id,
+            "status": "ready" if time.monotonic() >= ready_at else "indexing",
+        })
+
+    def _analyze(self, request, body):
+        video_id = json.loads(body or b"{}").get("video_id", "")
+        sentences = f"[video {video_id}] {self.SUMMARY}".split(". ")
+        events = [{"event_type": "stream_start", "metadata": {"generation_id": uuid.uuid4().hex}}]
+        events += [
+            {"event_type": "text_generation", "text": sentence + (". " if i < len(sentences) - 1 else "")}
+            for i, sentence in enumerate(sentences)
+        ]
+        events.append({"event_type": "stream_end", "metadata": {}})
+        request.send_stream(
+            (json.dumps(event).encode() + b"\n" for event in events),
+            self.stream_interval, "application/x-ndjson",
+        )
+
+    routes = [
+        ("POST", "/v1.3/assets", _create_asset),
+        ("POST", "/v1.3/indexes/", _create_indexed_asset),
+        ("GET", "/v1.3/indexes/", _get_indexed_asset),
+        ("POST", "/v1.3/analyze", _analyze),
+    ]
+
+
+class FakeFeatherless(FakeService):
+    """
+    OpenAI-compatible chat and text completions that return made-up
+    commentary, different for every prompt but the same for repeats.
+    `per_request_item` adds that many seconds per prompt in a batched call.
+    """
+
+    WORDS = [
+        "WHAT", "a", "shot!", "Off", "the", "backboard,", "around", "the", "rim,", "and",
+        "it", "DROPS!", "Unbelievable", "touch", "from", "way", "downtown!",
+    ]
+
+    def __init__(self, words=30, per_request_item=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.words = words
+        self.per_request_item = per_request_item
+
+    @property
+    def base_url(self):
+        """Value for FEATHERLESS_BASE_URL (or SCRIPT_LOCAL_BASE_URL)."""
+        return f"{self.url}/v1"
+
+    def _text(self, prompt):
+        rng = random.Random(hashlib.sha256(json.dumps(prompt).encode()).hexdigest())
+        return " ".join(rng.choice(self.WORDS) for _ in range(self.words))
+
+    def _usage(self, texts):
+        tokens = sum(len(text.split()) for text in texts)
+        return {"prompt_tokens": 0, "completion_tokens": tokens, "total_tokens": tokens}
+
+    def _chat(self, request, body):
+        payload = json.loads(body or b"{}")
+        text = self._text(payload.get("messages"))
+        request.send_json({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": payload.get("model", ""),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop",
+            }],
+            "usage": self._usage([text]),
+        })
+
+    def _completions(self, request, body):
+        payload = json.loads(body or b"{}")
+        prompts = payload.get("prompt", [])
+        prompts = [prompts] if isinstance(prompts, str) else prompts
+        time.sleep(self.per_request_item * len(prompts))
+        texts = [self._text(prompt) for prompt in prompts]
+        request.send_json({
+            "id": f"cmpl-{uuid.uuid4().hex}",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": payload.get("model", ""),
+            "choices": [
+                {"index": i, "text": text, "finish_reason": "stop", "logprobs": None}
+                for i, text in enumerate(texts)
+            ],
+            "usage": self._usage(texts),
+        })
+
+    routes = [
+        ("POST", "/v1/chat/completions", _chat),
+        ("POST", "/v1/completions", _completions),
+    ]
+
+
+SERVICES = {
+    "elevenlabs": FakeElevenLabs,
+    "twelvelabs": FakeTwelveLabs,
+    "featherless": FakeFeatherless,
+}
+
+
+def main():
+    """Usage: python fake_services.py <service> [port] [latency] [error_rate]"""
+    if len(sys.argv) < 2 or sys.argv[1] not in SERVICES:
+        print("Usage: python fake_services.py <service> [port] [latency] [error_rate]")
+        print(f"\nServices: {', '.join(SERVICES)}")
+        print("Latency: seconds, or uniform:LOW:HIGH, normal:MEAN:STDDEV, lognormal:MEDIAN:SIGMA")
+        sys.exit(1)
+
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8100
+    latency = parse_latency(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    error_rate = float(sys.argv[4]) if len(sys.argv) > 4 else 0.0
+
+    service = SERVICES[sys.argv[1]](port=port, latency=latency, error_rate=error_rate).start()
+    print(f"Fake {sys.argv[1]} listening on {service.url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
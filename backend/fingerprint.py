@@ -0,0 +1,218 @@
+# perceptual video fingerprints, used to reuse summaries for clips we've already analysed
+import os
+import sqlite3
+import subprocess
+import threading
+
+import numpy as np
+
+from cache import CACHE_DIR
+
+FINGERPRINT_DB = os.getenv("FINGERPRINT_DB", os.path.join(CACHE_DIR, "fingerprints.db"))
+
+# Frames are sampled at this rate, at most MAX_FRAMES per clip
+SAMPLE_FPS = float(os.getenv("FINGERPRINT_FPS", "2"))
+MAX_FRAMES = 64
+
+# A query frame matches a stored clip when some stored frame is within this many
+# bits (of 64), and the clip matches when at least MIN_COVERAGE of the query's
+# frames do. Re-encodes and light trims of a clip stay inside both; looser
+# values start matching other clips shot by the same fixed camera.
+FRAME_DISTANCE = int(os.getenv("FINGERPRINT_FRAME_DISTANCE", "6"))
+MIN_COVERAGE = float(os.getenv("FINGERPRINT_MIN_COVERAGE", "0.95"))
+
+# A match must also be about as long (the shorter at least this share of the
+# longer) and the same shape, since its summary is reused as-is
+MIN_DURATION_RATIO = float(os.getenv("FINGERPRINT_MIN_DURATION_RATIO", "0.9"))
+ASPECT_TOLERANCE = 0.02
+
+# Nearest clips (by descriptor) that get the exact frame-by-frame check
+CANDIDATES = 8
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def frame_hashes(video_file, duration=None):
+    """
+    Sample frames with ffmpeg and return their 64-bit difference hashes as an
+    (n, 8) uint8 array.
+
+    Each frame is shrunk to 9x8 greyscale and every bit records whether a pixel
+    is brighter than its left neighbour, which survives re-encoding, scaling
+    and small colour shifts.
+    """
+    fps = SAMPLE_FPS if not duration else min(SAMPLE_FPS, MAX_FRAMES / duration)
+    cmd = [
+        "ffmpeg",
+        "-v", "error",
+        "-i", video_file,
+        "-vf", f"fps={fps:.4f},scale=9:8:flags=area,format=gray",
+        "-frames:v", str(MAX_FRAMES),
+        "-f", "rawvideo",
+        "pipe:1"
+    ]
+    raw = subprocess.run(cmd, capture_output=True, check=True).stdout
+    frames = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 8, 9).astype(np.int16)
+    if len(frames) == 0:
+        raise ValueError(f"No frames decoded from {video_file}")
+    bits = frames[:, :, 1:] > frames[:, :, :-1]
+    return np.packbits(bits.reshape(len(frames), 64), axis=1)
+
+
+def descriptor(hashes):
+    """64-dim clip summary: how often each hash bit is set across the sampled frames."""
+    return np.unpackbits(hashes, axis=1).mean(axis=0).astype(np.float32)
+
+
+def hamming(a, b):
+    """Bit distances between every frame hash in a (n, 8) and b (m, 8), as (n, m)."""
+    return _POPCOUNT[a[:, None, :] ^ b[None, :, :]].sum(axis=2, dtype=np.uint16)
+
+
+def coverage(query, stored):
+    """Fraction of the query's frames that have a near-identical frame in stored."""
+    return float((hamming(query, stored).min(axis=1) <= FRAME_DISTANCE).mean())
+
+
+class FingerprintIndex:
+    """
+    On-disk index of clip fingerprints and their summaries.
+
+    Lookups are two-stage: among the stored clips of about the same duration
+    and aspect ratio, an L2 nearest-neighbour search over the per-clip
+    descriptors (one NumPy pass over an N x 64 matrix, which stays in the
+    low milliseconds for tens of thousands of clips) picks a few candidates,
+    then each candidate's frames are compared hash by hash.
+    """
+
+    def __init__(self, path=FINGERPRINT_DB):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    video_hash TEXT PRIMARY KEY,
+                    frames BLOB NOT NULL,
+                    summary TEXT NOT NULL,
+                    duration REAL,
+                    aspect REAL
+                )
+                """
+            )
+            # Indexes from before duration and aspect were stored; their rows
+            # never match until the clip is analysed again
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(fingerprints)")}
+            for column in ("duration", "aspect"):
+                if column not in columns:
+                    self._conn.execute(f"ALTER TABLE fingerprints ADD COLUMN {column} REAL")
+            rows = self._conn.execute(
+                "SELECT video_hash, frames, duration, aspect FROM fingerprints"
+            ).fetchall()
+
+        self._ids = []
+        self._frames = []
+        self._descriptors = np.zeros((max(1024, len(rows)), 64), dtype=np.float32)
+        self._shapes = np.full((len(self._descriptors), 2), np.nan, dtype=np.float32)  # duration, aspect
+        for video_hash, blob, duration, aspect in rows:
+            self._append(video_hash, np.frombuffer(blob, dtype=np.uint8).reshape(-1, 8), duration, aspect)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _append(self, video_hash, hashes, duration, aspect):
+        n = len(self._ids)
+        if n == len(self._descriptors):
+            # Grow by doubling so adds stay cheap as the index fills up
+            grown = np.zeros((2 * n, 64), dtype=np.float32)
+            grown[:n] = self._descriptors
+            self._descriptors = grown
+            shapes = np.full((2 * n, 2), np.nan, dtype=np.float32)
+            shapes[:n] = self._shapes
+            self._shapes = shapes
+        self._descriptors[n] = descriptor(hashes)
+        self._shapes[n] = (
+            np.nan if duration is None else duration,
+            np.nan if aspect is None else aspect,
+        )
+        self._ids.append(video_hash)
+        self._frames.append(hashes)
+
+    def lookup(self, hashes, duration, aspect):
+        """
+        Find a stored clip that the query is a near-duplicate or light trim of.
+
+        Args:
+            hashes: frame_hashes() of the query clip
+            duration: Its length in seconds
+            aspect: Its displayed width over height (see media_info.display_aspect)
+
+        Returns (video_hash, summary, coverage) for the best match, or None.
+        """
+        if not duration or not aspect:
+            return None
+        with self._lock:
+            n = len(self._ids)
+            if n == 0:
+                return None
+            stored_duration, stored_aspect = self._shapes[:n, 0], self._shapes[:n, 1]
+            # NaN (no stored shape) fails both comparisons
+            eligible = (
+                (np.minimum(stored_duration, duration) >= MIN_DURATION_RATIO * np.maximum(stored_duration, duration))
+                & (np.abs(stored_aspect / aspect - 1) <= ASPECT_TOLERANCE)
+            )
+            k = min(CANDIDATES, int(eligible.sum()))
+            if k == 0:
+                return None
+            distances = ((self._descriptors[:n] - descriptor(hashes)) ** 2).sum(axis=1)
+            distances[~eligible] = np.inf
+            nearest = np.argpartition(distances, k - 1)[:k]
+            candidates = [(self._ids[i], self._frames[i]) for i in nearest[np.argsort(distances[nearest])]]
+
+        best = None
+        for video_hash, stored in candidates:
+            score = coverage(hashes, stored)
+            if score >= MIN_COVERAGE and (best is None or score > best[1]):
+                best = (video_hash, score)
+        if best is None:
+            return None
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT summary FROM fingerprints WHERE video_hash = ?", (best[0],)
+            ).fetchone()
+        return (best[0], row[0], best[1]) if row else None
+
+    def add(self, video_hash, hashes, summary, duration, aspect):
+        """Store a clip's fingerprint, shape and summary."""
+        with self._lock, self._conn:
+            existing = self._conn.execute(
+                "SELECT 1 FROM fingerprints WHERE video_hash = ?", (video_hash,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fingerprints (video_hash, frames, summary, duration, aspect) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (video_hash, hashes.tobytes(), summary, duration, aspect),
+            )
+            if existing:
+                i = self._ids.index(video_hash)
+                self._shapes[i] = (
+                    np.nan if duration is None else duration,
+                    np.nan if aspect is None else aspect,
+                )
+            else:
+                self._append(video_hash, hashes, duration, aspect)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_fingerprint_index():
+    """The process-wide fingerprint index, loaded on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = FingerprintIndex()
+        return _index
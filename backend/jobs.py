@@ -0,0 +1,313 @@
+# job queue: stores commentary jobs in SQLite and runs them on a worker pool
+import os
+import json
+import time
+import uuid
+import asyncio
+import sqlite3
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import metrics
+from pipeline import run_pipeline, run_pipeline_on_new_loop
+from ratelimit import set_client
+
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(os.path.dirname(__file__), "jobs"))
+JOBS_DB = os.getenv("JOBS_DB", os.path.join(JOBS_DIR, "jobs.db"))
+
+# Number of jobs run at the same time, and whether they run in this process
+# ("thread") or in a pool of worker processes ("process")
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_WORKER_MODE = os.getenv("JOB_WORKER_MODE", "thread")
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+EXPIRED = "expired"  # result delivered or kept past its TTL, and deleted
+
+
+class JobStore:
+    """SQLite-backed record of every job, its progress and its result."""
+
+    COLUMNS = (
+        "id", "status", "language", "trickshot_name", "client_id",
+        "job_dir", "video_path", "result_path", "error",
+        "step", "message", "timings", "video_sha256", "video_info",
+        "created_at", "updated_at",
+    )
+
+    # Columns added after the table was first released, for upgrading old databases
+    ADDED_COLUMNS = {
+        "timings": "TEXT",
+        "video_sha256": "TEXT",
+        "video_info": "TEXT",
+    }
+
+    def __init__(self, path=JOBS_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    trickshot_name TEXT NOT NULL,
+                    client_id TEXT NOT NULL,
+                    job_dir TEXT NOT NULL,
+                    video_path TEXT NOT NULL,
+                    result_path TEXT,
+                    error TEXT,
+                    step INTEGER NOT NULL DEFAULT 0,
+                    message TEXT NOT NULL DEFAULT '',
+                    timings TEXT,
+                    video_sha256 TEXT,
+                    video_info TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+            for name, sql_type in self.ADDED_COLUMNS.items():
+                if name not in columns:
+                    self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {name} {sql_type}")
+
+    def create(self, job_dir, video_path, language, trickshot_name, client_id,
+               job_id=None, video_sha256=None, video_info=None):
+        """Insert a new queued job and return its id."""
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, language, trickshot_name, client_id, job_dir, "
+                "video_path, video_sha256, video_info, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id, QUEUED, language, trickshot_name, client_id, job_dir, video_path,
+                    video_sha256, json.dumps(video_info) if video_info else None, now, now,
+                ),
+            )
+        return job_id
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it doesn't exist."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def update(self, job_id, **fields):
+        """Set the given columns on a job."""
+        unknown = set(fields) - set(self.COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE id = ?",
+                (*fields.values(), job_id),
+            )
+
+    def unfinished(self):
+        """Return ids of jobs that were queued or running, oldest first."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (QUEUED, RUNNING),
+            ).fetchall()
+        return [row["id"] for row in rows]
+
+    def count(self, status):
+        """Return how many jobs are in the given status."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)
+            ).fetchone()[0]
+
+
+def _pipeline_args(job):
+    """Arguments for run_pipeline, minus the progress callback."""
+    return dict(
+        job_dir=job["job_dir"],
+        video_path=job["video_path"],
+        language=job["language"],
+        trickshot_name=job["trickshot_name"],
+        video_hash=job["video_sha256"],
+        video_info=json.loads(job["video_info"]) if job["video_info"] else None,
+    )
+
+
+def _run_job_in_process(job, db_path):
+    """Worker-process entry point: run one job, reporting progress to the store."""
+    store = JobStore(db_path)
+    set_client(job["client_id"] or job["id"])
+
+    async def progress(step, message, stage="", state=""):
+        store.update(job["id"], step=step, message=message)
+
+    return run_pipeline_on_new_loop(progress=progress, **_pipeline_args(job))
+
+
+class JobQueue:
+    """
+    Runs queued jobs on a fixed pool of workers.
+
+    Jobs survive restarts: anything still queued or running in the store when
+    the queue starts is picked up again.
+    """
+
+    def __init__(self, store, workers=JOB_WORKERS, mode=JOB_WORKER_MODE, bus=None):
+        """
+        Args:
+            store: JobStore to read jobs from and record results in
+            workers: Number of jobs to run at once
+            mode: "thread" to run jobs in this process, "process" for a process pool
+            bus: Optional ProgressBus to publish live updates on. Jobs run in
+                worker processes only publish status changes there
+        """
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown worker mode: {mode}")
+        self.store = store
+        self.workers = workers
+        self.mode = mode
+        self.bus = bus
+        self._queue: asyncio.Queue[str] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        self._executor = None
+        self.running = 0
+        self.job_seconds = None  # moving average of how long finished jobs took
+
+    async def start(self):
+        """Start the workers and re-enqueue jobs left over from a previous run."""
+        if self.mode == "process":
+            # Spawned, not forked: the server holds open SQLite connections
+            # (job store, cache, fingerprint index) and running threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        for job_id in self.store.unfinished():
+            self.store.update(job_id, status=QUEUED)
+            self._queue.put_nowait(job_id)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the workers. Interrupted jobs stay 'running' and resume on next start."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def submit(self, job_dir, video_path, language, trickshot_name, client_id,
+               job_id=None, video_sha256=None, video_info=None):
+        """Record a job and queue it. Returns the job id."""
+        job_id = self.store.create(
+            job_dir, video_path, language, trickshot_name, client_id,
+            job_id, video_sha256, video_info,
+        )
+        self._queue.put_nowait(job_id)
+        self._publish(job_id, status=QUEUED)
+        return job_id
+
+    def _publish(self, job_id, **changes):
+        if self.bus is not None:
+            job = self.store.get(job_id)
+            if job is not None:
+                self.bus.update(job, **changes)
+
+    def depth(self):
+        """Number of jobs waiting for a worker."""
+        return self._queue.qsize()
+
+    def in_flight(self):
+        """Number of jobs a worker is running right now."""
+        return self.running
+
+    def estimated_wait(self):
+        """Seconds before a job submitted now would get a worker."""
+        if self.job_seconds is None:
+            return 0.0
+        return self.depth() * self.job_seconds / self.workers
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id):
+        job = self.store.get(job_id)
+        if job is None:
+            return
+        self.store.update(job_id, status=RUNNING)
+        if self.bus:
+            self.bus.update(job, status=RUNNING)
+
+        async def progress(step, message, stage="", state=""):
+            self.store.update(job_id, step=step, message=message)
+            if self.bus:
+                self.bus.update(job, step=step, message=message, stage=stage, state=state)
+
+        def on_percent(stage, fraction, detail):
+            self.bus.update_threadsafe(job, stage=stage, fraction=fraction, detail=detail)
+
+        # External API calls are queued fairly between clients (see ratelimit.py)
+        set_client(job["client_id"] or job_id)
+        started = time.monotonic()
+        self.running += 1
+        try:
+            if self.mode == "process":
+                loop = asyncio.get_running_loop()
+                result, timings = await loop.run_in_executor(
+                    self._executor, _run_job_in_process, job, self.store.path
+                )
+            else:
+                result, timings = await run_pipeline(
+                    progress=progress, on_percent=on_percent if self.bus else None, **_pipeline_args(job)
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Job {job_id} failed: {e}")
+            self.store.update(job_id, status=FAILED, error=str(e))
+            self._publish(job_id, status=FAILED)
+            metrics.JOBS_FINISHED.inc(status=FAILED)
+            return
+        finally:
+            self.running -= 1
+
+        print(f"Job {job_id} done: {result}")
+        seconds = time.monotonic() - started
+        self.job_seconds = seconds if self.job_seconds is None else 0.8 * self.job_seconds + 0.2 * seconds
+        self.store.update(job_id, status=DONE, result_path=result, timings=json.dumps(timings))
+        self._publish(job_id, status=DONE)
+        # Recorded here rather than inside run_pipeline so jobs run in worker
+        # processes still show up in this process's metrics
+        metrics.record_timings(timings)
+        metrics.JOBS_FINISHED.inc(status=DONE)
+
+
+def public_view(job):
+    """The subset of a job row that is safe to return to clients."""
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "step": job["step"],
+        "total": 5,
+        "message": job["message"],
+        "error": job["error"],
+        "timings": json.loads(job["timings"]) if job["timings"] else None,
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
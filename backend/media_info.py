@@ -0,0 +1,136 @@
+# one ffprobe pass per media file, shared by every stage that needs durations or codecs
+import os
+import json
+import threading
+import subprocess
+from collections import OrderedDict
+
+from cache import get_cache
+from metrics import MEDIA_PROBES
+
+# In-process entries, keyed by path, size and mtime
+MEMORY_ENTRIES = 512
+
+_memory = OrderedDict()
+_lock = threading.Lock()
+
+
+def probe_media(path):
+    """Return ffprobe's JSON description (streams and format) of a media file."""
+    result = subprocess.run(
+        ["ffprobe", "-v", "quiet", "-print_format", "json", "-show_format", "-show_streams", path],
+        capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout)
+
+
+def _file_key(path):
+    stat = os.stat(path)
+    return (os.path.realpath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def _remember(key, info):
+    with _lock:
+        _memory[key] = info
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def remember_media_info(path, info, sha256=None):
+    """Record metadata obtained elsewhere (e.g. probed while uploading) for path."""
+    if not info or media_duration(info) is None:
+        return
+    _remember(_file_key(path), info)
+    if sha256:
+        get_cache().put_text("probe", sha256, json.dumps(info))
+
+
+def get_media_info(path, sha256=None):
+    """
+    ffprobe JSON for a file, probing it at most once.
+
+    Results are kept in memory by path, size and mtime, and, when the file's
+    SHA-256 is known, in the disk cache so other processes and re-uploads of
+    the same content skip the probe too.
+    """
+    key = _file_key(path)
+    with _lock:
+        info = _memory.get(key)
+        if info is not None:
+            _memory.move_to_end(key)
+    if info is not None:
+        MEDIA_PROBES.inc(source="memory")
+        return info
+
+    if sha256:
+        text = get_cache().get_text("probe", sha256)
+        if text is not None:
+            info = json.loads(text)
+            _remember(key, info)
+            MEDIA_PROBES.inc(source="disk")
+            return info
+
+    info = probe_media(path)
+    MEDIA_PROBES.inc(source="ffprobe")
+    remember_media_info(path, info, sha256)
+    return info
+
+
+def media_duration(info):
+    """Duration in seconds from probe output, or None if ffprobe couldn't tell."""
+    duration = info.get("format", {}).get("duration")
+    if duration in (None, "N/A"):
+        durations = [
+            float(stream["duration"]) for stream in info.get("streams", [])
+            if stream.get("duration") not in (None, "N/A")
+        ]
+        return max(durations) if durations else None
+    return float(duration)
+
+
+def require_duration(info, path):
+    """
+    media_duration() for files that can't be processed without one.
+
+    Raises:
+        ValueError: If ffprobe couldn't tell how long the file is
+    """
+    duration = media_duration(info)
+    if duration is None:
+        raise ValueError(f"Couldn't determine the duration of {os.path.basename(path)}")
+    return duration
+
+
+def _first_stream(info, codec_type):
+    for stream in info.get("streams", []):
+        if stream.get("codec_type") == codec_type:
+            return stream
+    return None
+
+
+def video_stream(info):
+    """The first video stream in probe output, or None."""
+    return _first_stream(info, "video")
+
+
+def audio_stream(info):
+    """The first audio stream in probe output, or None."""
+    return _first_stream(info, "audio")
+
+
+def display_aspect(info):
+    """
+    Width over height of the first video stream as it is displayed (after
+    rotation metadata, like ffmpeg's autorotate), or None without one.
+    """
+    stream = video_stream(info)
+    if not stream or not stream.get("width") or not stream.get("height"):
+        return None
+    rotation = stream.get("tags", {}).get("rotate")
+    for side_data in stream.get("side_data_list", []):
+        rotation = side_data.get("rotation", rotation)
+    aspect = stream["width"] / stream["height"]
+    if rotation is not None and abs(int(float(rotation))) % 180 == 90:
+        aspect = 1 / aspect
+    return aspect
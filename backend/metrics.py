@@ -0,0 +1,233 @@
+# in-process metrics in Prometheus text format, plus per-job timing traces
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                     for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {sorted(labels)}")
+        return tuple(labels[name] for name in self.labels)
+
+    def samples(self):
+        """Yield (suffix, label names, label values, value) for rendering."""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield "", self.labels, key, value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_label_text(names, values)} {value:g}")
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=(), function=None):
+        """
+        Args:
+            function: Optional callable returning {label values tuple: value}
+                (or a single number for an unlabelled gauge), read at scrape time
+        """
+        super().__init__(name, help, labels)
+        self.function = function
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount=1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        if self.function is None:
+            yield from super().samples()
+            return
+        values = self.function()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for key, value in values.items():
+            yield "", self.labels, key, value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total, count = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            counts = [c + (value <= bound) for c, bound in zip(counts, self.buckets)]
+            self._values[key] = (counts, total + value, count + 1)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, (counts, total, count) in items:
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield "_bucket", self.labels + ("le",), key + (f"{bound:g}",), bucket_count
+            yield "_bucket", self.labels + ("le",), key + ("+Inf",), count
+            yield "_sum", self.labels, key, total
+            yield "_count", self.labels, key, count
+
+
+REGISTRY: list[_Metric] = []
+
+
+def render():
+    """All registered metrics in Prometheus text exposition format."""
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+STAGE_SECONDS = Histogram(
+    "pipeline_stage_seconds", "Wall time of each pipeline stage", ["stage"]
+)
+FFMPEG_SECONDS = Histogram(
+    "ffmpeg_seconds", "Wall time of each ffmpeg/ffprobe invocation", ["step"]
+)
+FFMPEG_CPU_SECONDS = Counter(
+    "ffmpeg_cpu_seconds_total", "User+system CPU time used by ffmpeg child processes", ["step"]
+)
+FFMPEG_PEAK_RSS = Gauge(
+    "ffmpeg_peak_rss_bytes", "Largest peak RSS seen for an ffmpeg child process", ["step"]
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total", "Result cache lookups by namespace", ["namespace", "result"]
+)
+MEDIA_PROBES = Counter(
+    "media_probes_total", "Media metadata lookups by where the answer came from", ["source"]
+)
+UPLOAD_BYTES = Counter(
+    "upload_bytes_total", "Bytes sent to external APIs, by trace span", ["span"]
+)
+API_RETRIES = Counter(
+    "external_api_retries_total", "Retried calls to external APIs", ["provider"]
+)
+JOBS_FINISHED = Counter(
+    "jobs_finished_total", "Jobs that reached a final state", ["status"]
+)
+JOBS_SHED = Counter(
+    "jobs_shed_total", "Uploads turned away because the estimated wait was over budget"
+)
+RATE_LIMITED = Counter(
+    "external_api_throttled_total", "429 responses from external APIs", ["provider"]
+)
+RATE_LIMIT_WAIT = Histogram(
+    "rate_limit_wait_seconds", "Time calls waited for a provider slot and token", ["provider"]
+)
+
+
+# ── Per-job traces ──
+# Spans recorded anywhere in a job (including threads started with
+# asyncio.to_thread, which copy the context) land in that job's trace.
+_trace = contextvars.ContextVar("trace", default=None)
+
+
+def start_trace():
+    """Begin collecting spans for the current job. Returns the trace dict."""
+    trace = {"started": time.perf_counter(), "spans": {}}
+    _trace.set(trace)
+    return trace
+
+
+def add_span(name, start, end, **extra):
+    """Record a finished span on the current job's trace, if there is one."""
+    trace = _trace.get()
+    if trace is None:
+        return
+    span = {
+        "start": round(start - trace["started"], 3),
+        "end": round(end - trace["started"], 3),
+        "seconds": round(end - start, 3),
+        **extra,
+    }
+    # Several ffmpeg steps can share a name; keep them all
+    name_in_trace, n = name, 2
+    while name_in_trace in trace["spans"]:
+        name_in_trace, n = f"{name}#{n}", n + 1
+    trace["spans"][name_in_trace] = span
+
+
+@contextmanager
+def span(name, **extra):
+    """Time a block and add it to the current job's trace."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_span(name, start, time.perf_counter(), **extra)
+
+
+def record_timings(timings):
+    """Feed a finished job's timing trace into the histograms."""
+    for name, timing in timings.items():
+        if name == "total":
+            continue
+        if name.startswith("ffmpeg:"):
+            step = name.split(":", 1)[1].split("#", 1)[0]
+            FFMPEG_SECONDS.observe(timing["seconds"], step=step)
+            FFMPEG_CPU_SECONDS.inc(timing.get("cpu_seconds", 0.0), step=step)
+            rss = timing.get("peak_rss_bytes", 0)
+            with FFMPEG_PEAK_RSS._lock:
+                current = FFMPEG_PEAK_RSS._values.get((step,), 0)
+                FFMPEG_PEAK_RSS._values[(step,)] = max(current, rss)
+        else:
+            STAGE_SECONDS.observe(timing["seconds"], stage=name)
+            if "bytes" in timing:
+                UPLOAD_BYTES.inc(timing["bytes"], span=name)
+
+
+def wait_with_usage(proc):
+    """
+    Wait for a subprocess.Popen and return (returncode, cpu_seconds, peak_rss_bytes)
+    for that child alone, using wait4's resource usage.
+    """
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in kilobytes on Linux
+    return proc.returncode, usage.ru_utime + usage.ru_stime, usage.ru_maxrss * 1024
@@ -0,0 +1,615 @@
+# runs the five commentary steps for one uploaded video
+import os
+import sys
+import time
+import asyncio
+import threading
+
+# ── TEST MODE: set TEST_MODE=0 to use real AI APIs ──
+TEST_MODE = os.getenv("TEST_MODE", "1") == "1"
+
+from cache import get_cache, file_sha256, hash_key
+from metrics import start_trace, span
+from progress import set_stage, set_reporter, report_progress
+from media_info import (
+    get_media_info, remember_media_info, media_duration, require_duration, video_stream, display_aspect,
+)
+from video_processor import (
+    run_ffmpeg_async, encoder_threads, build_analysis_proxy,
+    ENCODING_PROFILE, PROXY_SHORT_SIDE, PROXY_FPS, PROXY_KEYFRAME_SECONDS, PROXY_MAX_BITRATE,
+)
+
+# Sample files for test mode (no API calls)
+SAMPLE_VOICE = os.path.join(os.path.dirname(__file__), "..", "test-vids", "trickshot-voice.mp3")
+SAMPLE_CROWD = os.path.join(os.path.dirname(__file__), "..", "test-vids", "crowd-noises.mp3")
+
+# Passed to generate_chris_mp3 and folded into the voice-over cache key
+TTS_SETTINGS = {
+    "stability": 0.55,
+    "similarity_boost": 0.85,
+    "style": 0.35,
+    "model_id": "eleven_multilingual_v2",
+    "output_format": "mp3_44100_128",
+}
+
+# Bump when VideoProcessor's output changes so stale final videos aren't reused
+FINAL_VIDEO_VERSION = 3
+
+# Every job writes its result here inside its job directory, so clients can
+# follow the file while it is being written
+FINAL_VIDEO_NAME = "full-trickshot.mp4"
+
+# Upload a small transcoded proxy for analysis instead of the original clip.
+# Set ANALYSIS_PROXY=0 to upload originals (e.g. to compare upload and indexing times)
+ANALYSIS_PROXY = os.getenv("ANALYSIS_PROXY", "1") == "1"
+
+# Reuse the summary of a stored clip that the upload is a near-duplicate or light
+# trim of, instead of indexing it again. Off by default until the thresholds in
+# fingerprint.py have been validated on real clips from the same venues
+FINGERPRINT_MATCH = os.getenv("FINGERPRINT_MATCH", "0") == "1"
+
+# Folded into the proxy cache key
+PROXY_SETTINGS = {
+    "short_side": PROXY_SHORT_SIDE,
+    "fps": PROXY_FPS,
+    "keyframe_seconds": PROXY_KEYFRAME_SECONDS,
+    "max_bitrate": PROXY_MAX_BITRATE,
+}
+
+# Most commentary languages one job may ask for
+MAX_LANGUAGES = 5
+
+# Pipe the voice-over into ffmpeg as ElevenLabs streams it, instead of waiting
+# for the whole MP3 before muxing
+STREAMING_TTS = os.getenv("STREAMING_TTS", "0") == "1"
+
+# Max number of jobs allowed inside each stage at once (per event loop, which
+# is per process for the server). Override with e.g. STAGE_LIMIT_FFMPEG=4
+STAGE_LIMITS = {
+    "analyze": int(os.getenv("STAGE_LIMIT_ANALYZE", "4")),
+    "script": int(os.getenv("STAGE_LIMIT_SCRIPT", "8")),
+    "tts": int(os.getenv("STAGE_LIMIT_TTS", "4")),
+    "sfx": int(os.getenv("STAGE_LIMIT_SFX", "4")),
+    "ffmpeg": int(os.getenv("STAGE_LIMIT_FFMPEG", "2")),
+}
+
+# Per event loop: an asyncio.Semaphore binds to the loop it first waits on, and
+# process-mode jobs and batch clips each run on their own asyncio.run loop
+_semaphores: dict[asyncio.AbstractEventLoop, dict[str, asyncio.Semaphore]] = {}
+
+# Jobs currently inside run_pipeline in this process, used to split the CPU
+# cores between concurrent encodes
+_active_jobs = 0
+
+
+# Cross-process semaphores (e.g. from a multiprocessing.Manager) that replace
+# the per-process ones when several worker processes share one set of caps
+_shared_limits = {}
+
+
+# How often a thread waiting on a shared limit checks whether it's still wanted
+SHARED_LIMIT_POLL = 0.5
+
+
+class _SharedLimit:
+    """
+    Async context manager around a blocking, cross-process semaphore.
+
+    The semaphore is acquired on a worker thread. If the waiting task is
+    cancelled (run_stages cancels the rest of a job once a stage fails), the
+    thread gives up, and a permit it got regardless is released again rather
+    than leaking from the shared cap.
+    """
+
+    def __init__(self, semaphore):
+        self.semaphore = semaphore
+        self._lock = threading.Lock()
+        self._abandoned = False
+        self._granted = False
+
+    def _acquire(self):
+        while not self.semaphore.acquire(timeout=SHARED_LIMIT_POLL):
+            if self._abandoned:
+                return
+        with self._lock:
+            if self._abandoned:
+                self.semaphore.release()
+            else:
+                self._granted = True
+
+    async def __aenter__(self):
+        try:
+            await asyncio.to_thread(self._acquire)
+        except asyncio.CancelledError:
+            with self._lock:
+                self._abandoned = True
+                if self._granted:
+                    self.semaphore.release()
+            raise
+
+    async def __aexit__(self, *exc):
+        self.semaphore.release()
+
+
+def use_shared_limits(limits):
+    """Cap stages with the given {stage name: semaphore} instead of per-process limits."""
+    _shared_limits.clear()
+    _shared_limits.update(limits)
+
+
+def stage_limit(name: str):
+    """Return the async context manager that caps concurrency for a pipeline stage."""
+    if name in _shared_limits:
+        return _SharedLimit(_shared_limits[name])
+    loop = asyncio.get_running_loop()
+    if loop not in _semaphores:
+        # Drop the semaphores of loops that have finished
+        for old_loop in [l for l in _semaphores if l.is_closed()]:
+            del _semaphores[old_loop]
+        _semaphores[loop] = {}
+    semaphores = _semaphores[loop]
+    if name not in semaphores:
+        semaphores[name] = asyncio.Semaphore(STAGE_LIMITS[name])
+    return semaphores[name]
+
+
+# User-facing stages, in the order the frontend lists them
+STAGE_LABELS = {
+    "analyze": "Analyzing trickshot",
+    "script": "Generating commentary script",
+    "tts": "Generating voice over",
+    "sfx": "Generating crowd audio",
+    "mux": "Combining final video",
+}
+
+
+async def _no_progress(step: int, message: str, stage: str = "", state: str = ""):
+    pass
+
+
+async def run_stages(stages, progress=_no_progress):
+    """
+    Run a DAG of stages, starting each one as soon as its dependencies finish.
+
+    Args:
+        stages: dict of name -> (dependency names, async fn(results) -> value)
+        progress: async callable(step, message, stage, state); step is the number
+            of user-facing stages finished so far, state is "started" or "done"
+
+    Returns:
+        (results, timings) where results maps stage name to its value and
+        timings maps stage name to start/end offsets and duration in seconds.
+    """
+    results, timings = {}, {}
+    started_at = time.perf_counter()
+    finished = 0
+
+    async def run(name):
+        nonlocal finished
+        deps, func = stages[name]
+        await asyncio.gather(*(tasks[dep] for dep in deps))
+
+        label = STAGE_LABELS.get(name)
+        if label:
+            await progress(finished, f"{label}...", name, "started")
+
+        set_stage(name)  # each stage runs in its own task, so this is per stage
+        start = time.perf_counter()
+        results[name] = await func(results)
+        end = time.perf_counter()
+        timings[name] = {
+            "start": round(start - started_at, 3),
+            "end": round(end - started_at, 3),
+            "seconds": round(end - start, 3),
+        }
+
+        if label:
+            finished += 1
+            await progress(finished, f"{label} done", name, "done")
+
+    tasks = {name: asyncio.create_task(run(name)) for name in stages}
+    try:
+        await asyncio.gather(*tasks.values())
+    finally:
+        for task in tasks.values():
+            task.cancel()
+
+    timings["total"] = {"start": 0.0, "end": round(time.perf_counter() - started_at, 3)}
+    timings["total"]["seconds"] = timings["total"]["end"]
+    return results, timings
+
+
+def format_timings(timings):
+    """Render a stage timing breakdown as a small text table."""
+    lines = [f"{'stage':<22}{'start':>8}{'end':>8}{'seconds':>9}{'cpu':>8}{'rss MB':>8}"]
+    for name, t in sorted(timings.items(), key=lambda item: (item[0] == "total", item[1]["start"])):
+        line = f"{name:<22}{t['start']:>8.2f}{t['end']:>8.2f}{t['seconds']:>9.2f}"
+        if "cpu_seconds" in t:
+            line += f"{t['cpu_seconds']:>8.2f}{t['peak_rss_bytes'] / 2**20:>8.0f}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+async def run_pipeline(job_dir, video_path, language="en", trickshot_name="",
+                       progress=_no_progress, video_hash=None, video_info=None, on_percent=None):
+    """
+    Turn an uploaded trickshot video into a commentated video.
+
+    Independent stages run concurrently: crowd audio is prepared while the
+    video is being analysed, and the clip is hashed and probed up front.
+
+    Args:
+        job_dir: Directory the job may write its intermediate and final files to
+        video_path: Path to the uploaded video
+        language: Commentary language code, or several as a list or comma-separated
+            string. Several languages share one analysis and crowd track, and
+            the result has an audio track per language (see process_multilingual)
+        trickshot_name: Optional name the commentator should mention
+        progress: async callable(step, message, stage, state) for stage updates
+        video_hash: SHA-256 of the video if the upload already computed it
+        video_info: ffprobe JSON for the video if the upload already probed it
+        on_percent: callable(stage, fraction, detail) for progress within a stage
+            (ffmpeg's -progress output, upload and indexing status); may be
+            called from worker threads
+
+    Returns:
+        (final_video_path, timings) where timings is the per-stage breakdown plus
+        an "ffmpeg:<step>" entry (with CPU seconds and peak RSS) per ffmpeg run.
+    """
+    stages = _test_stages(job_dir, video_path) if TEST_MODE else _production_stages(
+        job_dir, video_path, parse_languages(language), trickshot_name, video_hash, video_info
+    )
+    global _active_jobs
+    trace = start_trace()
+    if on_percent:
+        set_reporter(on_percent)
+    _active_jobs += 1
+    try:
+        results, timings = await run_stages(stages, progress)
+    finally:
+        _active_jobs -= 1
+    # ffmpeg runs inside the stages add "ffmpeg:<step>" spans with CPU and memory use
+    timings.update(trace["spans"])
+    print(f"Stage timings:\n{format_timings(timings)}")
+    return results["mux"], timings
+
+
+def run_pipeline_on_new_loop(*args, **kwargs):
+    """
+    asyncio.run(run_pipeline(...)) for worker processes and batch clips,
+    closing the loop's API clients before the loop goes away.
+    """
+    async def run():
+        try:
+            return await run_pipeline(*args, **kwargs)
+        finally:
+            await close_loop_clients()
+
+    return asyncio.run(run())
+
+
+async def close_loop_clients():
+    """Close the API clients bound to the running event loop."""
+    # Only built once analysis has run, so there's nothing to close otherwise
+    summary = sys.modules.get("trickshot_summary")
+    if summary is not None:
+        await summary.close_client()
+
+
+def parse_languages(language):
+    """
+    Normalise a language argument (a code, a comma-separated string of codes
+    or a list) to a de-duplicated list of codes.
+
+    Raises:
+        ValueError: For a code the commentator has no language for, or more
+            than MAX_LANGUAGES codes
+    """
+    from commentator_script import LANGUAGE_NAMES
+
+    if isinstance(language, str):
+        language = language.split(",")
+    languages = list(dict.fromkeys(code.strip() for code in language if code.strip()))
+    if not languages:
+        return ["en"]
+    unknown = [code for code in languages if code not in LANGUAGE_NAMES]
+    if unknown:
+        raise ValueError(
+            f"Unsupported language: {', '.join(unknown)} (supported: {', '.join(LANGUAGE_NAMES)})"
+        )
+    if len(languages) > MAX_LANGUAGES:
+        raise ValueError(f"At most {MAX_LANGUAGES} languages per job")
+    return languages
+
+
+def _report_step(step, fraction):
+    """VideoProcessor on_progress hook: report the ffmpeg step as the mux stage's detail."""
+    report_progress(fraction, step)
+
+
+def _encode_threads():
+    """-threads for an encode starting now: the cores split between jobs that can encode at once."""
+    return encoder_threads(min(_active_jobs, STAGE_LIMITS["ffmpeg"]))
+
+
+def _test_stages(job_dir, video_path):
+    """TEST MODE: skip AI APIs, just overlay sample audio with ffmpeg."""
+
+    async def fake_stage(results):
+        for tick in range(4):
+            report_progress(tick / 4)
+            await asyncio.sleep(0.25)
+
+    async def mux(results):
+        final_video = os.path.join(job_dir, FINAL_VIDEO_NAME)
+        seconds = media_duration(await asyncio.to_thread(get_media_info, video_path))
+
+        async with stage_limit("ffmpeg"):
+            await run_ffmpeg_async([
+                "ffmpeg", "-y",
+                "-i", video_path,
+                "-i", os.path.abspath(SAMPLE_VOICE),
+                "-i", os.path.abspath(SAMPLE_CROWD),
+                "-filter_complex",
+                "[1:a]volume=1.0[voice];[2:a]volume=0.3[crowd];[voice][crowd]amix=inputs=2:duration=shortest[mixed]",
+                "-map", "0:v",
+                "-map", "[mixed]",
+                "-c:v", "copy",
+                "-shortest",
+                "-movflags", "+frag_keyframe+empty_moov+default_base_moof",
+                final_video,
+            ], "mux", on_progress=lambda done: report_progress(done / seconds) if seconds else None)
+        return final_video
+
+    return {
+        "analyze": ((), fake_stage),
+        "script": (("analyze",), fake_stage),
+        "tts": (("script",), fake_stage),
+        "sfx": ((), fake_stage),
+        "mux": (("tts", "sfx"), mux),
+    }
+
+
+def _production_stages(job_dir, video_path, languages, trickshot_name, video_hash, video_info):
+    """
+    PRODUCTION: the real AI pipeline.
+
+    Every stage checks the cache first, so a re-upload of the same clip
+    skips every external call whose inputs haven't changed.
+    """
+    # Imported on first use so the server starts fast, and a missing SDK or key
+    # fails the jobs that need it rather than startup (see providers.py)
+    from trickshot_summary import getSummaryAsync
+    from commentator_script import getScript, WORDS_PER_SECOND
+    from script_backends import get_generator
+    from crowd_bank import get_bank, fit_to_duration
+    from tts_chris import generate_chris_mp3, stream_chris_mp3, CHRIS_VOICE_ID
+    from video_processor import VideoProcessor, VOICE_PIPE, AUDIO_MIX
+    from fingerprint import frame_hashes, get_fingerprint_index
+    from audio_mix import DUCKING, mix_settings
+
+    cache = get_cache()
+    voice_file = os.path.join(job_dir, "trickshot-voice.mp3")
+    if len(languages) > 1:
+        voice_files = {lang: os.path.join(job_dir, f"trickshot-voice.{lang}.mp3") for lang in languages}
+    else:
+        voice_files = {languages[0]: voice_file}
+    crowd_file = os.path.join(job_dir, "crowd-noises.mp3")
+
+    # The upload usually hashed and probed the video while streaming it in
+    async def hash_video(results):
+        if video_hash:
+            return video_hash
+        return await asyncio.to_thread(file_sha256, video_path)
+
+    # One metadata pass for the whole job: the word budget, crowd length, proxy
+    # and VideoProcessor's padding and encoder decisions all read this
+    async def probe(results):
+        if video_info and media_duration(video_info) is not None:
+            await asyncio.to_thread(remember_media_info, video_path, video_info, video_hash)
+            return video_info
+        info = await asyncio.to_thread(get_media_info, video_path, video_hash)
+        # Every later stage sizes its output from this; fail here with a clear reason
+        require_duration(info, video_path)
+        return info
+
+    async def analysis_proxy(video_hash, info):
+        stream = video_stream(info)
+        if stream and stream.get("width") and min(stream["width"], stream["height"]) <= PROXY_SHORT_SIDE:
+            return video_path  # already proxy-sized; re-encoding would only cost time
+        proxy_file = os.path.join(job_dir, "analysis-proxy.mp4")
+        proxy_key = hash_key(video_hash, PROXY_SETTINGS)
+        if not await asyncio.to_thread(cache.fetch_file, "proxy", proxy_key, proxy_file):
+            async with stage_limit("ffmpeg"):
+                await asyncio.to_thread(
+                    build_analysis_proxy, video_path, proxy_file,
+                    threads=_encode_threads(), **PROXY_SETTINGS,
+                )
+            await asyncio.to_thread(cache.put_file, "proxy", proxy_key, proxy_file)
+        return proxy_file
+
+    async def analyze(results):
+        video_hash = results["hash"]
+        summary = await asyncio.to_thread(cache.get_text, "summary", video_hash)
+        if summary is not None:
+            return summary
+
+        fingerprint = None
+        if FINGERPRINT_MATCH:
+            index = get_fingerprint_index()
+            shape = media_duration(results["probe"]), display_aspect(results["probe"])
+            with span("fingerprint"):
+                fingerprint = await asyncio.to_thread(frame_hashes, video_path, shape[0])
+                match = await asyncio.to_thread(index.lookup, fingerprint, *shape)
+            if match:
+                matched_hash, summary, score = match
+                print(f"Reusing summary of {matched_hash[:12]} ({score:.0%} of frames match)")
+
+        if summary is None:
+            # The proxy is only needed when the summary has to be computed
+            upload_path = (
+                await analysis_proxy(video_hash, results["probe"]) if ANALYSIS_PROXY else video_path
+            )
+            async with stage_limit("analyze"):
+                summary = await getSummaryAsync(upload_path)
+            if fingerprint is not None:
+                await asyncio.to_thread(index.add, video_hash, fingerprint, summary, *shape)
+        await asyncio.to_thread(cache.put_text, "summary", video_hash, summary)
+        return summary
+
+    # Scripts and voice-overs are per language; every language is generated
+    # concurrently from the same summary
+    async def language_script(language, summary, duration):
+        script_key = hash_key(
+            summary, language, trickshot_name, round(duration, 2), get_generator().backend.id
+        )
+        text = await asyncio.to_thread(cache.get_text, "script", script_key)
+        if text is None:
+            async with stage_limit("script"):
+                text = await asyncio.to_thread(
+                    getScript, summary, language, trickshot_name, video_path, duration
+                )
+            await asyncio.to_thread(cache.put_text, "script", script_key, text)
+        return text
+
+    async def script(results):
+        summary, duration = results["analyze"], media_duration(results["probe"])
+        texts = await asyncio.gather(*(
+            language_script(language, summary, duration) for language in languages
+        ))
+        return dict(zip(languages, texts))
+
+    async def language_tts(text, out_path):
+        voice_key = hash_key(text, CHRIS_VOICE_ID, TTS_SETTINGS)
+        if not await asyncio.to_thread(cache.fetch_file, "tts", voice_key, out_path):
+            # A single language can be synthesised during mux, straight into ffmpeg
+            if STREAMING_TTS and len(languages) == 1:
+                return None
+            async with stage_limit("tts"):
+                await asyncio.to_thread(generate_chris_mp3, text, out_path=out_path, **TTS_SETTINGS)
+            await asyncio.to_thread(cache.put_file, "tts", voice_key, out_path)
+        return out_path
+
+    async def tts(results):
+        paths = await asyncio.gather(*(
+            language_tts(results["script"][language], voice_files[language]) for language in languages
+        ))
+        if None in paths:
+            return None
+        return dict(zip(languages, paths))
+
+    async def sfx(results):
+        # Crowd audio comes from the pre-generated bank, looped or trimmed to the
+        # clip's length; seeding by video hash keeps re-uploads on the same track
+        track = await asyncio.to_thread(get_bank().pick, seed=results["hash"])
+        async with stage_limit("sfx"):
+            await asyncio.to_thread(fit_to_duration, track, crowd_file, media_duration(results["probe"]))
+        # The bank track itself, for the NumPy mix's decoded-crowd cache; a
+        # retired one is deleted once it has been fitted
+        return track if os.path.exists(track) else None
+
+    async def final_key(results, voices, ducking=False):
+        # Everything the final video depends on. Only the NumPy mix can duck;
+        # the ffmpeg graph (multi-language, streaming, fallback) never does,
+        # and otherwise the two produce the same mix, so they share entries
+        return hash_key(
+            results["hash"],
+            *[await asyncio.to_thread(file_sha256, voice) for voice in voices],
+            await asyncio.to_thread(file_sha256, crowd_file),
+            languages,
+            mix_settings(ducking),
+            FINAL_VIDEO_VERSION,
+            ENCODING_PROFILE,
+        )
+
+    async def mux(results):
+        if results["tts"] is None:
+            return await mux_streaming(results)
+        if len(languages) > 1:
+            return await mux_multilingual(results)
+        return await mux_voice_file(results)
+
+    async def mux_voice_file(results):
+        numpy_ducking = DUCKING and AUDIO_MIX == "numpy"
+        cached_final = os.path.join(job_dir, FINAL_VIDEO_NAME)
+        key = await final_key(results, [voice_file], numpy_ducking)
+        if await asyncio.to_thread(cache.fetch_file, "final", key, cached_final):
+            return cached_final
+
+        processor = VideoProcessor(
+            video_path, voice_file, crowd_file, threads=_encode_threads(), work_dir=job_dir,
+            on_progress=_report_step, crowd_source=results["sfx"],
+        )
+        async with stage_limit("ffmpeg"):
+            result = await processor.process_async(cleanup=True)
+        # Stored under the mix that was actually made, in case it fell back to ffmpeg
+        ducked = numpy_ducking and result["method"] == "premixed"
+        key = await final_key(results, [voice_file], ducked)
+        await asyncio.to_thread(cache.put_file, "final", key, result["final_video"])
+        return result["final_video"]
+
+    async def mux_multilingual(results):
+        final_video = os.path.join(job_dir, FINAL_VIDEO_NAME)
+        key = await final_key(results, [voice_files[language] for language in languages])
+        cached = await asyncio.to_thread(cache.fetch_file, "final", key, final_video)
+
+        processor = VideoProcessor(
+            video_path, voice_files[languages[0]], crowd_file,
+            threads=_encode_threads(), work_dir=job_dir, on_progress=_report_step,
+        )
+        async with stage_limit("ffmpeg"):
+            if cached:
+                # Only the cheap per-language stream copies are left to do
+                processor.final_video = final_video
+                await processor.split_language_tracks_async(languages)
+            else:
+                await processor.process_multilingual_async(voice_files)
+        if not cached:
+            await asyncio.to_thread(cache.put_file, "final", key, final_video)
+        return final_video
+
+    async def mux_streaming(results):
+        text = results["script"][languages[0]]
+        estimated_seconds = len(text.split()) / WORDS_PER_SECOND
+
+        def run_streaming_processing():
+            # Feeding ffmpeg's stdin from the TTS stream blocks, so this one stays on a thread
+            processor = VideoProcessor(
+                video_path, VOICE_PIPE, crowd_file, threads=_encode_threads(), work_dir=job_dir
+            )
+            try:
+                return processor.process_streaming(
+                    stream_chris_mp3(text, **TTS_SETTINGS),
+                    estimated_seconds,
+                    voice_copy=voice_file,
+                )
+            finally:
+                processor._cleanup_temp_files()
+
+        async with stage_limit("tts"), stage_limit("ffmpeg"):
+            result = await asyncio.to_thread(run_streaming_processing)
+        final_video = result["final_video"]
+
+        # The voice-over was saved as it streamed, so later runs can still hit the cache
+        voice_key = hash_key(text, CHRIS_VOICE_ID, TTS_SETTINGS)
+        await asyncio.to_thread(cache.put_file, "tts", voice_key, voice_file)
+        if result["voice_cut"]:
+            # The estimate was too short and -shortest cut the commentary off;
+            # redo the mux from the saved voice-over, whose length is now known
+            print("Falling back to muxing the saved voice-over...")
+            # Deleted, not overwritten, so /stream followers see the restart
+            os.remove(final_video)
+            return await mux_voice_file(results)
+        key = await final_key(results, [voice_file])
+        await asyncio.to_thread(cache.put_file, "final", key, final_video)
+        return final_video
+
+    return {
+        "hash": ((), hash_video),
+        "probe": ((), probe),
+        "analyze": (("hash", "probe"), analyze),
+        "script": (("analyze", "probe"), script),
+        "tts": (("script",), tts),
+        "sfx": (("hash", "probe"), sfx),
+        "mux": (("hash", "tts", "sfx"), mux),
+    }
@@ -0,0 +1,242 @@
+# live job progress: per-job pub/sub channels that any number of sockets can follow
+import os
+import time
+import asyncio
+import contextvars
+from collections import deque
+
+# Messages a subscriber may have queued before the oldest are dropped. Every
+# message is a full snapshot, so a slow reader only skips intermediate states.
+PROGRESS_BUFFER = int(os.getenv("PROGRESS_BUFFER", "16"))
+
+# How long a finished job's channel keeps its last snapshot for late subscribers
+PROGRESS_RETAIN_SECONDS = float(os.getenv("PROGRESS_RETAIN_SECONDS", "300"))
+
+# Percent-only updates smaller than this many points are not sent
+PROGRESS_MIN_STEP = 1.0
+
+# Share of the overall percentage each user-facing stage accounts for
+STAGE_WEIGHTS = {"analyze": 40, "script": 10, "tts": 15, "sfx": 5, "mux": 30}
+
+_stage = contextvars.ContextVar("progress_stage", default=None)
+_reporter = contextvars.ContextVar("progress_reporter", default=None)
+
+
+def set_stage(name):
+    """Mark the current task as running pipeline stage `name` (see run_stages)."""
+    _stage.set(name)
+
+
+def set_reporter(reporter):
+    """
+    Route report_progress calls made in this context (and tasks and threads
+    started from it) to reporter(stage, fraction, detail).
+    """
+    return _reporter.set(reporter)
+
+
+def report_progress(fraction, detail=""):
+    """Report how far the current pipeline stage has got, from 0 to 1."""
+    bound_reporter()(fraction, detail)
+
+
+def bound_reporter():
+    """
+    report_progress tied to the current job and stage, for code that reports
+    from somewhere else (e.g. a shared poller task serving many jobs).
+    """
+    reporter, stage = _reporter.get(), _stage.get()
+    if reporter is None or stage is None:
+        return lambda fraction, detail="": None
+    return lambda fraction, detail="": reporter(stage, fraction, detail)
+
+
+class Subscription:
+    """
+    One follower of a channel: a bounded buffer of snapshots plus an event to
+    wake the reader. Waiting costs nothing but the awaiting task.
+    """
+
+    def __init__(self, bus, key, buffer_size):
+        self.bus = bus
+        self.key = key
+        self.buffer = deque(maxlen=buffer_size)
+        self.dropped = 0
+        self.closed = False
+        self._ready = asyncio.Event()
+
+    def push(self, message):
+        if len(self.buffer) == self.buffer.maxlen:
+            self.dropped += 1
+        self.buffer.append(message)
+        self._ready.set()
+
+    def close(self):
+        """Stop the subscription; a pending get() returns None."""
+        self.closed = True
+        self._ready.set()
+
+    async def get(self):
+        """The next snapshot, or None once closed."""
+        while not self.buffer:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        return self.buffer.popleft()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        self.bus._unsubscribe(self)
+
+
+class ProgressBus:
+    """
+    Fans job progress out to subscribers.
+
+    Every update is folded into the job's snapshot (status, step, per-stage
+    state and percentage, overall percentage) and the whole snapshot is
+    published on the job's channel ("job:<id>") and its uploader's channel
+    ("client:<id>"). New subscribers get the latest snapshot first.
+
+    Updates must be made on the event loop's thread; update_threadsafe is for
+    worker threads.
+    """
+
+    def __init__(self, buffer_size=PROGRESS_BUFFER, retain_seconds=PROGRESS_RETAIN_SECONDS):
+        self.buffer_size = buffer_size
+        self.retain_seconds = retain_seconds
+        self._subscribers = {}  # channel key -> set of Subscription
+        self._latest = {}       # channel key -> last snapshot published on it
+        self._jobs = {}         # job id -> snapshot
+        self._expiry = {}       # job id -> TimerHandle dropping its snapshot
+        self._loop = None
+
+    def bind(self, loop=None):
+        """Attach to the event loop updates are delivered on."""
+        self._loop = loop or asyncio.get_running_loop()
+
+    def subscribe(self, key, initial=None):
+        """
+        Follow a channel. Use as a context manager and iterate it (async) for
+        snapshots. `initial` is sent first if the channel has nothing yet
+        (e.g. a finished job's state from the job store).
+        """
+        subscription = Subscription(self, key, self.buffer_size)
+        self._subscribers.setdefault(key, set()).add(subscription)
+        latest = self._latest.get(key, initial)
+        if latest is not None:
+            subscription.push(latest)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        subscribers = self._subscribers.get(subscription.key)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.key]
+
+    def subscriber_count(self):
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def update(self, job, status=None, step=None, message=None, stage=None, state=None,
+               fraction=None, detail=None):
+        """
+        Fold a change into the job's snapshot and publish it.
+
+        Args:
+            job: Job row (needs "id" and "client_id")
+            status: New job status
+            step, message: User-facing stages finished so far, and a status line
+            stage, state: A stage that just "started" or is "done"
+            fraction, detail: How far `stage` has got (0-1) and what it is doing
+        """
+        job_id = job["id"]
+        snapshot = self._jobs.get(job_id)
+        if snapshot is None:
+            snapshot = self._jobs[job_id] = {
+                "job_id": job_id, "status": job.get("status"), "step": 0, "total": len(STAGE_WEIGHTS),
+                "message": "", "stage": "", "state": "", "percent": 0.0, "stages": {},
+            }
+        snapshot = {**snapshot, "stages": dict(snapshot["stages"])}
+
+        if stage:
+            previous = snapshot["stages"].get(stage, {"state": "started", "percent": 0.0, "detail": ""})
+            entry = dict(previous)
+            if state:
+                entry["state"] = state
+                if state == "done":
+                    entry["percent"], entry["detail"] = 100.0, ""
+            if fraction is not None and entry["state"] != "done":
+                percent = round(100 * min(1.0, max(0.0, fraction)), 1)
+                if (state is None and detail in (None, previous.get("detail"))
+                        and abs(percent - previous["percent"]) < PROGRESS_MIN_STEP):
+                    return  # not worth a message
+                entry["percent"] = percent
+            if detail is not None:
+                entry["detail"] = detail
+            snapshot["stages"][stage] = entry
+            snapshot["stage"], snapshot["state"] = stage, state or entry["state"]
+        if status is not None:
+            snapshot["status"] = status
+        if step is not None:
+            snapshot["step"] = step
+        if message is not None:
+            snapshot["message"] = message
+
+        snapshot["percent"] = 100.0 if snapshot["status"] == "done" else round(sum(
+            STAGE_WEIGHTS.get(name, 0) * entry["percent"] / 100
+            for name, entry in snapshot["stages"].items()
+        ), 1)
+        snapshot["updated_at"] = time.time()
+        self._jobs[job_id] = snapshot
+
+        keys = [f"job:{job_id}"]
+        if job.get("client_id"):
+            keys.append(f"client:{job['client_id']}")
+        for key in keys:
+            self._latest[key] = snapshot
+            for subscription in self._subscribers.get(key, ()):
+                subscription.push(snapshot)
+
+        if snapshot["status"] in ("done", "failed", "expired"):
+            self._expire_later(job_id, keys)
+
+    def update_threadsafe(self, job, **changes):
+        """update() from any thread."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.update(job, **changes)
+        else:
+            loop.call_soon_threadsafe(lambda: self.update(job, **changes))
+
+    def _expire_later(self, job_id, keys):
+        if job_id in self._expiry or self._loop is None:
+            return
+
+        def expire():
+            self._expiry.pop(job_id, None)
+            self._jobs.pop(job_id, None)
+            for key in keys:
+                if self._latest.get(key, {}).get("job_id") == job_id:
+                    del self._latest[key]
+
+        self._expiry[job_id] = self._loop.call_later(self.retain_seconds, expire)
@@ -0,0 +1,125 @@
+# external service clients, built on first use, and per-stage readiness checks
+import os
+import shutil
+import threading
+
+from dotenv import load_dotenv
+
+# The one place .env is loaded; every module that needs a key imports this first
+load_dotenv()
+
+
+class Provider:
+    """
+    A lazily constructed client plus what it needs to work.
+
+    Nothing is imported or connected until get() is first called, so a missing
+    SDK or key only affects the stages that use it, not server startup.
+    """
+
+    def __init__(self, name, factory, required_env=(), binaries=(), stages=()):
+        """
+        Args:
+            name: Registry name
+            factory: Callable returning the client; may import its SDK lazily
+            required_env: Environment variables that must be set
+            binaries: Executables that must be on PATH
+            stages: Pipeline stages that can't run without this provider
+        """
+        self.name = name
+        self.factory = factory
+        self.required_env = required_env
+        self.binaries = binaries
+        self.stages = stages
+        self._client = None
+        self._lock = threading.Lock()
+
+    def problems(self):
+        """What's missing for this provider, without building the client."""
+        required_env = self.required_env() if callable(self.required_env) else self.required_env
+        missing = [f"env {name}" for name in required_env if not os.getenv(name)]
+        missing += [f"binary {name}" for name in self.binaries if shutil.which(name) is None]
+        return missing
+
+    def get(self):
+        """The client, built on the first call."""
+        with self._lock:
+            if self._client is None:
+                self._client = self.build()
+            return self._client
+
+    def build(self, **kwargs):
+        """A new client, not shared with get() (e.g. one per event loop)."""
+        missing = self.problems()
+        if missing:
+            raise RuntimeError(f"{self.name} is not configured: missing {', '.join(missing)}")
+        return self.factory(**kwargs)
+
+
+_providers: dict[str, Provider] = {}
+
+
+def register(name, factory, required_env=(), binaries=(), stages=()):
+    """Add a provider to the registry and return it."""
+    _providers[name] = Provider(name, factory, required_env, binaries, stages)
+    return _providers[name]
+
+
+def get(name):
+    """The named provider's client, built on first use."""
+    return _providers[name].get()
+
+
+def build(name, **kwargs):
+    """A new client from the named provider, passing kwargs to its factory."""
+    return _providers[name].build(**kwargs)
+
+
+def readiness():
+    """
+    Whether each pipeline stage has everything it needs.
+
+    Returns {stage: {"ready": bool, "missing": [...]}}.
+    """
+    stages = {}
+    for provider in _providers.values():
+        missing = provider.problems()
+        for stage in provider.stages:
+            entry = stages.setdefault(stage, {"ready": True, "missing": []})
+            entry["missing"] += [f"{provider.name}: {problem}" for problem in missing]
+            entry["ready"] = not entry["missing"]
+    return stages
+
+
+def _twelvelabs(httpx_client=None):
+    # The async client's connections belong to one event loop, so the pipeline
+    # builds one per loop (see trickshot_summary.get_client) rather than get()
+    from twelvelabs import AsyncTwelveLabs
+    # TWELVELABS_BASE_URL points the SDK at a stand-in (see fake_services.py)
+    base_url = os.getenv("TWELVELABS_BASE_URL")
+    kwargs = {"base_url": base_url} if base_url else {}
+    if httpx_client is not None:
+        kwargs["httpx_client"] = httpx_client
+    return AsyncTwelveLabs(api_key=os.getenv("TWELVELABS_API_KEY"), **kwargs)
+
+
+def _script_generator():
+    from script_backends import get_generator
+    return get_generator()
+
+
+def _script_env():
+    from script_backends import SCRIPT_BACKEND
+    return ("FEATHERLESS_API_KEY",) if SCRIPT_BACKEND == "featherless" else ()
+
+
+def _elevenlabs():
+    from elevenlabs_client import get_session
+    return get_session()
+
+
+register("twelvelabs", _twelvelabs, ("TWELVELABS_API_KEY", "INDEX_ID"), stages=("analyze",))
+register("script", _script_generator, _script_env, stages=("script",))
+register("elevenlabs", _elevenlabs, ("ELEVENLABS_API_KEY",), stages=("tts", "sfx"))
+register("ffmpeg", lambda: shutil.which("ffmpeg"), binaries=("ffmpeg", "ffprobe"),
+         stages=("analyze", "sfx", "mux"))
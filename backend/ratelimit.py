@@ -0,0 +1,411 @@
+# per-provider rate limits for external API calls: token buckets, adaptive concurrency, fair queueing
+import os
+import time
+import asyncio
+import threading
+import contextvars
+from collections import OrderedDict, deque
+from contextlib import contextmanager, asynccontextmanager
+
+import metrics
+from metrics import add_span
+
+# Defaults per provider: requests per second, burst, starting and largest
+# concurrency. Override with e.g. RATE_LIMIT_TWELVELABS_RPS=2,
+# RATE_LIMIT_ELEVENLABS_CONCURRENCY=3 or RATE_LIMIT_FEATHERLESS_MAX_CONCURRENCY=4.
+# An RPS of 0 turns the token bucket off.
+PROVIDER_DEFAULTS = {
+    "twelvelabs": {"rps": 4.0, "burst": 8, "concurrency": 4, "max_concurrency": 16},
+    "featherless": {"rps": 2.0, "burst": 4, "concurrency": 4, "max_concurrency": 8},
+    "elevenlabs": {"rps": 4.0, "burst": 4, "concurrency": 3, "max_concurrency": 10},
+}
+
+# Providers not listed above (e.g. a local script server) get no limits
+UNLIMITED = {"rps": 0.0, "burst": 1, "concurrency": 1024, "max_concurrency": 1024}
+
+# A call counts as slow, and shrinks the concurrency limit like a 429 does,
+# when recent calls of its kind take this many times longer than the fastest
+LATENCY_TOLERANCE = float(os.getenv("RATE_LIMIT_LATENCY_TOLERANCE", "3"))
+
+# Multiplicative decrease after a 429 and after slow calls
+THROTTLE_BACKOFF = 0.7
+SLOW_BACKOFF = 0.9
+
+_client = contextvars.ContextVar("ratelimit_client", default="")
+
+# The call holding a slot in this context, so a 429 reported through
+# throttled() isn't counted again when it leaves the slot as an exception
+_current_call = contextvars.ContextVar("ratelimit_call", default=None)
+
+
+def set_client(client_id):
+    """Queue calls made in this context (and tasks and threads started from it) as client_id's."""
+    _client.set(client_id or "")
+
+
+def is_throttle(error):
+    """Whether an exception from a provider SDK is a 429."""
+    return getattr(error, "status_code", None) == 429
+
+
+class TokenBucket:
+    """
+    `rate` tokens per second, up to `burst` saved up. Callers reserve tokens
+    and sleep off any debt, so they are served in arrival order.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _reserve(self, cost):
+        """Take `cost` tokens and return the seconds to wait before using them."""
+        with self._lock:
+            now = time.monotonic()
+            if self.rate <= 0:
+                return max(self._paused_until - now, 0.0)
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self.tokens -= cost
+            return max(-self.tokens / self.rate, self._paused_until - now, 0.0)
+
+    async def take(self, cost=1.0):
+        wait = self._reserve(cost)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def take_sync(self, cost=1.0):
+        wait = self._reserve(cost)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """Hand out nothing for the next `seconds` (a provider's Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def debt_seconds(self):
+        """How long a call arriving now would wait for a token."""
+        with self._lock:
+            now = time.monotonic()
+            if self.rate <= 0:
+                return max(self._paused_until - now, 0.0)
+            tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+            return max(-tokens / self.rate, self._paused_until - now, 0.0)
+
+
+class _Waiter:
+    """A caller queued for a concurrency slot, woken from whichever thread frees one."""
+
+    def __init__(self, loop=None):
+        self.granted = False
+        self._loop = loop
+        self._future = loop.create_future() if loop else None
+        self._event = None if loop else threading.Event()
+
+    def wake(self):
+        self.granted = True
+        if self._loop:
+            self._loop.call_soon_threadsafe(self._set)
+        else:
+            self._event.set()
+
+    def _set(self):
+        if not self._future.done():
+            self._future.set_result(None)
+
+
+class AdaptiveLimit:
+    """
+    A concurrency limit that adapts AIMD-style: it grows by about one slot per
+    limit's worth of successful calls while it is fully used, and is cut
+    multiplicatively on a 429 or when calls slow down. Queued callers are
+    served round-robin by client, so one client's burst of jobs can't starve
+    everyone else's.
+    """
+
+    def __init__(self, initial, minimum=1, maximum=64, tolerance=LATENCY_TOLERANCE):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.tolerance = tolerance
+        self.in_flight = 0
+        self.latency = {}        # call kind -> {"ewma", "floor", "count"}
+        self._queues = OrderedDict()  # client -> deque of _Waiter
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def waiting(self):
+        with self._lock:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def _enqueue(self, waiter, client):
+        """Take a slot for waiter now if one is free and nobody is queued; else queue it."""
+        with self._lock:
+            if not self._queues and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                waiter.granted = True
+                return True
+            self._queues.setdefault(client, deque()).append(waiter)
+            return False
+
+    async def acquire(self, client=""):
+        waiter = _Waiter(asyncio.get_running_loop())
+        if self._enqueue(waiter, client):
+            return
+        try:
+            await waiter._future
+        except asyncio.CancelledError:
+            with self._lock:
+                queue = self._queues.get(client)
+                if queue and waiter in queue:
+                    queue.remove(waiter)
+                    if not queue:
+                        del self._queues[client]
+            if waiter.granted:
+                self.release()
+            raise
+
+    def acquire_sync(self, client=""):
+        waiter = _Waiter()
+        if not self._enqueue(waiter, client):
+            waiter._event.wait()
+
+    def release(self, kind=None, latency=None, throttled=False, grow=True):
+        """
+        Free a slot, adjusting the limit from how the call went. grow=False
+        for calls that were held back by something else (the token bucket),
+        which say nothing about how much concurrency the provider takes.
+        """
+        with self._lock:
+            self.in_flight -= 1
+            if throttled:
+                self._decrease(THROTTLE_BACKOFF)
+            elif latency is not None and self._slow(kind, latency):
+                self._decrease(SLOW_BACKOFF)
+            elif grow and self.in_flight + 1 >= int(self.limit):
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._grant()
+
+    def throttled(self):
+        with self._lock:
+            self._decrease(THROTTLE_BACKOFF)
+
+    def _slow(self, kind, latency):
+        stats = self.latency.setdefault(kind, {"ewma": latency, "floor": latency, "count": 0})
+        stats["count"] += 1
+        stats["ewma"] = 0.8 * stats["ewma"] + 0.2 * latency
+        # The floor follows the fastest calls, creeping up slowly so a provider
+        # that has become slower for good stops counting as congested
+        stats["floor"] = min(latency, stats["floor"] + 0.01 * (stats["ewma"] - stats["floor"]))
+        return stats["count"] >= 5 and stats["ewma"] > self.tolerance * stats["floor"]
+
+    def _decrease(self, factor):
+        # One cut per round trip: the calls already in flight when the provider
+        # pushed back will report the same thing
+        now = time.monotonic()
+        round_trip = max((stats["ewma"] for stats in self.latency.values()), default=1.0)
+        if now - self._last_decrease < round_trip:
+            return
+        self._last_decrease = now
+        self.limit = max(self.minimum, self.limit * factor)
+
+    def _grant(self):
+        while self._queues and self.in_flight < int(self.limit):
+            client, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(client)
+            else:
+                del self._queues[client]
+            self.in_flight += 1
+            waiter.wake()
+
+
+class _Call:
+    """One call holding a slot; responded() marks when the provider answered."""
+
+    def __init__(self, kind, rate_bound=False):
+        self.kind = kind
+        self.rate_bound = rate_bound
+        self.start = time.monotonic()
+        self.latency = None
+        self.throttle_counted = False
+
+    def responded(self):
+        if self.latency is None:
+            self.latency = time.monotonic() - self.start
+
+
+class RateLimiter:
+    """The token bucket and adaptive concurrency limit for one provider."""
+
+    def __init__(self, name, rps, burst, concurrency, max_concurrency):
+        self.name = name
+        self.bucket = TokenBucket(rps, burst)
+        self.concurrency = AdaptiveLimit(concurrency, maximum=max_concurrency)
+        self.calls = 0
+
+    @asynccontextmanager
+    async def slot(self, kind="call", cost=1.0):
+        """
+        Hold a concurrency slot and `cost` tokens for one call.
+
+        An exception with status_code 429 leaving the block cuts the limit.
+        """
+        start = time.perf_counter()
+        await self.concurrency.acquire(_client.get())
+        try:
+            token_wait = await self.bucket.take(cost)
+        except BaseException:
+            self.concurrency.release(grow=False)
+            raise
+        self._waited(start)
+        call = _Call(kind, rate_bound=token_wait > 0)
+        token = _current_call.set(call)
+        try:
+            yield call
+        except BaseException as e:
+            self._finish(call, throttled=is_throttle(e))
+            raise
+        finally:
+            _current_call.reset(token)
+        self._finish(call)
+
+    @contextmanager
+    def slot_sync(self, kind="call", cost=1.0):
+        """slot() for blocking callers."""
+        start = time.perf_counter()
+        self.concurrency.acquire_sync(_client.get())
+        try:
+            token_wait = self.bucket.take_sync(cost)
+        except BaseException:
+            self.concurrency.release(grow=False)
+            raise
+        self._waited(start)
+        call = _Call(kind, rate_bound=token_wait > 0)
+        token = _current_call.set(call)
+        try:
+            yield call
+        except BaseException as e:
+            self._finish(call, throttled=is_throttle(e))
+            raise
+        finally:
+            _current_call.reset(token)
+        self._finish(call)
+
+    def throttled(self, retry_after=None):
+        """The provider answered 429: shrink the limit, and hold off for Retry-After if given."""
+        metrics.RATE_LIMITED.inc(provider=self.name)
+        call = _current_call.get()
+        if call is not None:
+            call.throttle_counted = True
+        self.concurrency.throttled()
+        try:
+            self.bucket.pause(float(retry_after or 0))
+        except ValueError:
+            pass  # an HTTP date; the concurrency cut has to do
+
+    def _waited(self, start):
+        end = time.perf_counter()
+        if end - start > 0.001:
+            add_span(f"ratelimit:{self.name}", start, end)
+            metrics.RATE_LIMIT_WAIT.observe(end - start, provider=self.name)
+
+    def _finish(self, call, throttled=False):
+        self.calls += 1
+        if throttled:
+            if not call.throttle_counted:
+                metrics.RATE_LIMITED.inc(provider=self.name)
+            self.concurrency.release(throttled=True)
+            return
+        call.responded()
+        self.concurrency.release(call.kind, call.latency, grow=not call.rate_bound)
+
+    def throughput(self):
+        """Calls per second this provider can take right now."""
+        stats = self.concurrency.latency.values()
+        latency = max((s["ewma"] for s in stats), default=0.0)
+        by_concurrency = int(self.concurrency.limit) / latency if latency > 0 else float("inf")
+        return min(by_concurrency, self.bucket.rate if self.bucket.rate > 0 else float("inf"))
+
+    def estimated_wait(self, calls=1):
+        """Seconds before the last of `calls` new calls would get its slot."""
+        throughput = self.throughput()
+        if throughput == float("inf"):
+            return 0.0
+        queued = self.concurrency.waiting() + max(0, self.concurrency.in_flight - int(self.concurrency.limit))
+        return self.bucket.debt_seconds() + (queued + calls) / throughput
+
+    def snapshot(self):
+        return {
+            "limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+            "waiting": self.concurrency.waiting(),
+            "tokens": round(self.bucket.tokens, 2),
+            "calls": self.calls,
+        }
+
+
+def _setting(name, key, default):
+    value = os.getenv(f"RATE_LIMIT_{name.upper()}_{key.upper()}")
+    return type(default)(value) if value else default
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(name):
+    """The process-wide limiter for a provider, created on first use."""
+    with _limiters_lock:
+        if name not in _limiters:
+            defaults = PROVIDER_DEFAULTS.get(name, UNLIMITED)
+            _limiters[name] = RateLimiter(name, **{
+                key: _setting(name, key, default) for key, default in defaults.items()
+            })
+        return _limiters[name]
+
+
+def set_limiter(name, **settings):
+    """Replace a provider's limiter, e.g. with other limits for a benchmark."""
+    defaults = PROVIDER_DEFAULTS.get(name, UNLIMITED)
+    with _limiters_lock:
+        _limiters[name] = RateLimiter(name, **{**defaults, **settings})
+        return _limiters[name]
+
+
+def limiters():
+    with _limiters_lock:
+        return dict(_limiters)
+
+
+metrics.Gauge(
+    "rate_limit_concurrency", "Adaptive concurrency limit per provider", ["provider"],
+    function=lambda: {(name,): limiter.concurrency.limit for name, limiter in limiters().items()},
+)
+metrics.Gauge(
+    "rate_limit_waiting", "Calls queued for a provider slot", ["provider"],
+    function=lambda: {(name,): limiter.concurrency.waiting() for name, limiter in limiters().items()},
+)
+
+
+# External calls one job makes per provider, for estimating a new job's wait:
+# TwelveLabs upload, index, a few status polls and analyze; then one script
+# and one voice-over per language
+CALLS_PER_JOB = {"twelvelabs": 6, "featherless": 1, "elevenlabs": 1}
+PER_LANGUAGE = {"featherless", "elevenlabs"}
+
+
+def estimated_wait(languages=1):
+    """Seconds a new job would queue behind other calls at its slowest provider."""
+    return max((
+        get_limiter(name).estimated_wait(calls * (languages if name in PER_LANGUAGE else 1))
+        for name, calls in CALLS_PER_JOB.items()
+    ), default=0.0)
@@ -0,0 +1,292 @@
+# where commentary scripts come from: the hosted API, a local server or an offline stub
+import os
+import json
+import time
+import random
+import hashlib
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import providers  # noqa: F401  (loads .env)
+from ratelimit import get_limiter
+
+# "featherless" (hosted API), "local" (OpenAI-compatible server, e.g. vLLM or
+# llama.cpp) or "stub" (deterministic text, no network)
+SCRIPT_BACKEND = os.getenv("SCRIPT_BACKEND", "featherless")
+SCRIPT_MODEL = os.getenv("SCRIPT_MODEL", "meta-llama/Meta-Llama-3.1-8B-Instruct")
+LOCAL_BASE_URL = os.getenv("SCRIPT_LOCAL_BASE_URL", "http://localhost:8001/v1")
+FEATHERLESS_BASE_URL = os.getenv("FEATHERLESS_BASE_URL", "https://api.featherless.ai/v1")
+
+# Concurrent requests are merged into one call for backends that take batches:
+# a batch is sent once it has BATCH_MAX_SIZE requests or BATCH_MAX_WAIT seconds
+# have passed since its first one arrived
+BATCH_MAX_SIZE = int(os.getenv("SCRIPT_BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT = float(os.getenv("SCRIPT_BATCH_MAX_WAIT", "0.05"))
+
+# Recent prompts and their completions, kept in memory
+PROMPT_LRU_SIZE = int(os.getenv("SCRIPT_LRU_SIZE", "256"))
+
+
+class ScriptBackend(ABC):
+    """
+    A chat model that turns a list of messages into text.
+
+    Subclasses implement complete. Backends that can serve several
+    conversations in one call set supports_batching and override complete_batch.
+    """
+
+    name = ""
+    supports_batching = False
+
+    def __init__(self, model=SCRIPT_MODEL):
+        self.model = model
+
+    @property
+    def id(self):
+        """Identifies the backend and model, e.g. for cache keys."""
+        return f"{self.name}:{self.model}"
+
+    @abstractmethod
+    def complete(self, messages):
+        """Return the model's reply to one conversation."""
+
+    def complete_batch(self, batch):
+        return [self.complete(messages) for messages in batch]
+
+
+class OpenAIChatBackend(ScriptBackend):
+    """Any OpenAI-compatible chat completions API, one request per script."""
+
+    name = "featherless"
+
+    def __init__(self, base_url=FEATHERLESS_BASE_URL, api_key_env="FEATHERLESS_API_KEY",
+                 model=SCRIPT_MODEL):
+        super().__init__(model)
+        self.base_url = base_url
+        self.api_key_env = api_key_env
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Created on first use so importing this module needs no key or network
+        with self._client_lock:
+            if self._client is None:
+                from openai import OpenAI
+                self._client = OpenAI(
+                    base_url=self.base_url,
+                    api_key=os.getenv(self.api_key_env) or "unused",
+                )
+            return self._client
+
+    def complete(self, messages):
+        with get_limiter(self.name).slot_sync("chat"):
+            response = self.client.chat.completions.create(model=self.model, messages=messages)
+        return response.choices[0].message.content
+
+
+class LocalBackend(OpenAIChatBackend):
+    """
+    A local OpenAI-compatible server. Batches go through the completions
+    endpoint, which takes a list of prompts and lets the server schedule them
+    together.
+    """
+
+    name = "local"
+    supports_batching = True
+
+    def __init__(self, base_url=LOCAL_BASE_URL, model=SCRIPT_MODEL):
+        super().__init__(base_url, "SCRIPT_LOCAL_API_KEY", model)
+
+    @staticmethod
+    def render(messages):
+        """Llama 3 chat template, for servers that only see raw prompts."""
+        parts = ["<|begin_of_text|>"]
+        for message in messages:
+            parts.append(
+                f"<|start_header_id|>{message['role']}<|end_header_id|>\n\n{message['content']}<|eot_id|>"
+            )
+        parts.append("<|start_header_id|>assistant<|end_header_id|>\n\n")
+        return "".join(parts)
+
+    def complete_batch(self, batch):
+        if len(batch) == 1:
+            return [self.complete(batch[0])]
+        response = self.client.completions.create(
+            model=self.model,
+            prompt=[self.render(messages) for messages in batch],
+            max_tokens=256,
+            stop=["<|eot_id|>"],
+        )
+        texts = [None] * len(batch)
+        for choice in response.choices:
+            if 0 <= choice.index < len(batch):
+                texts[choice.index] = choice.text
+        # A server can drop prompts from a batch; those go through the chat
+        # endpoint on their own rather than failing the whole batch
+        for i, text in enumerate(texts):
+            if text is None:
+                print(f"Local backend returned no completion for batch item {i}, retrying it alone")
+                texts[i] = self.complete(batch[i])
+        return texts
+
+
+class StubBackend(ScriptBackend):
+    """
+    Deterministic offline commentary built from the prompt, for tests and
+    benchmarks. `latency` and `per_item` simulate a model server that handles
+    `concurrency` calls at a time, each costing latency + per_item * batch size
+    seconds.
+    """
+
+    name = "stub"
+    supports_batching = True
+
+    WORDS = [
+        "WHAT", "a", "shot!", "Unbelievable", "spin,", "perfect", "arc,", "and", "it's",
+        "NOTHING", "BUT", "NET!", "He", "flips,", "he", "fires,", "pure", "precision!",
+    ]
+
+    def __init__(self, latency=None, per_item=None, concurrency=1, model="stub"):
+        super().__init__(model)
+        self.latency = float(os.getenv("SCRIPT_STUB_LATENCY", "0")) if latency is None else latency
+        self.per_item = float(os.getenv("SCRIPT_STUB_PER_ITEM", "0")) if per_item is None else per_item
+        self.calls = 0
+        self._slots = threading.Semaphore(concurrency)
+
+    def _text(self, messages):
+        seed = hashlib.sha256(json.dumps(messages, sort_keys=True).encode()).hexdigest()
+        rng = random.Random(seed)
+        return " ".join(rng.choice(self.WORDS) for _ in range(40))
+
+    def complete(self, messages):
+        return self.complete_batch([messages])[0]
+
+    def complete_batch(self, batch):
+        with self._slots:
+            self.calls += 1
+            time.sleep(self.latency + self.per_item * len(batch))
+        return [self._text(messages) for messages in batch]
+
+
+BACKENDS = {
+    "featherless": OpenAIChatBackend,
+    "local": LocalBackend,
+    "stub": StubBackend,
+}
+
+
+class MicroBatcher:
+    """
+    Merges requests from concurrent callers into complete_batch calls.
+
+    Callers block in submit() (they are usually worker threads); one
+    background thread collects requests for up to max_wait seconds and
+    sends them as a single batch.
+    """
+
+    def __init__(self, backend, max_size=BATCH_MAX_SIZE, max_wait=BATCH_MAX_WAIT):
+        self.backend = backend
+        self.max_size = max_size
+        self.max_wait = max_wait
+        self._pending = []  # (messages, Future)
+        self._cond = threading.Condition()
+        self._thread = None
+
+    def submit(self, messages):
+        """Queue one conversation and wait for its completion."""
+        future = Future()
+        with self._cond:
+            self._pending.append((messages, future))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future.result()
+
+    def _take_batch(self):
+        with self._cond:
+            while not self._pending:
+                if not self._cond.wait(timeout=5.0):
+                    return None  # idle; the next submit starts a new thread
+            deadline = time.monotonic() + self.max_wait
+            while len(self._pending) < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(timeout=remaining)
+            batch, self._pending = self._pending[:self.max_size], self._pending[self.max_size:]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                with self._cond:
+                    if not self._pending:
+                        self._thread = None
+                        return
+                continue
+            try:
+                texts = self.backend.complete_batch([messages for messages, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), text in zip(batch, texts):
+                future.set_result(text)
+
+
+class ScriptGenerator:
+    """A backend plus the prompt LRU, and a micro-batcher when the backend takes batches."""
+
+    def __init__(self, backend, lru_size=PROMPT_LRU_SIZE):
+        self.backend = backend
+        self.batcher = MicroBatcher(backend) if backend.supports_batching else None
+        self.lru_size = lru_size
+        self._lru = OrderedDict()
+        self._lru_lock = threading.Lock()
+
+    def generate(self, messages):
+        """Return the model's raw text for a conversation."""
+        key = json.dumps(messages, sort_keys=True)
+        with self._lru_lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                return self._lru[key]
+
+        if self.batcher:
+            text = self.batcher.submit(messages)
+        else:
+            text = self.backend.complete(messages)
+
+        with self._lru_lock:
+            self._lru[key] = text
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+        return text
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def get_generator():
+    """The process-wide generator for SCRIPT_BACKEND, created on first use."""
+    global _generator
+    with _generator_lock:
+        if _generator is None:
+            if SCRIPT_BACKEND not in BACKENDS:
+                raise ValueError(f"Unknown script backend: {SCRIPT_BACKEND}")
+            _generator = ScriptGenerator(BACKENDS[SCRIPT_BACKEND]())
+        return _generator
+
+
+def set_backend(backend):
+    """Swap in a backend instance (e.g. a StubBackend for tests and benchmarks)."""
+    global _generator
+    with _generator_lock:
+        _generator = ScriptGenerator(backend)
+    return _generator
@@ -0,0 +1,135 @@
+# runs many VideoProcessor jobs at once on one event loop and checks every output
+import argparse
+import asyncio
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from media_info import probe_media, media_duration, video_stream
+from video_processor import VideoProcessor, FFMPEG_TIMEOUT
+
+# Output durations may differ from the plan by about a frame or an AAC packet
+DURATION_TOLERANCE = 0.15
+
+
+def _make_inputs(source_dir, i):
+    """
+    Synthesise one job's clip, voice-over and crowd track. Each job gets its own
+    resolution and lengths, so a job that picked up another one's files fails
+    the checks below.
+    """
+    width, height = 320 + 16 * i, 240 + 8 * i
+    video_seconds = 2.0 + 0.25 * (i % 8)
+    # Every third voice-over fits inside the clip; the others need padding
+    voice_seconds = video_seconds - 0.5 if i % 3 == 0 else video_seconds + 0.5 + 0.25 * (i % 5)
+
+    video = os.path.join(source_dir, f"clip-{i}.mp4")
+    voice = os.path.join(source_dir, f"voice-{i}.mp3")
+    crowd = os.path.join(source_dir, f"crowd-{i}.mp3")
+    commands = [
+        ["ffmpeg", "-y", "-v", "error",
+         "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate=30:duration={video_seconds}",
+         "-f", "lavfi", "-i", f"sine=frequency=220:duration={video_seconds}",
+         "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p", "-c:a", "aac", "-shortest",
+         video],
+        ["ffmpeg", "-y", "-v", "error",
+         "-f", "lavfi", "-i", f"sine=frequency={300 + 20 * i}:duration={voice_seconds}", voice],
+        ["ffmpeg", "-y", "-v", "error",
+         "-f", "lavfi", "-i", f"anoisesrc=duration={video_seconds}:amplitude=0.2", crowd],
+    ]
+    for cmd in commands:
+        subprocess.run(cmd, check=True)
+    return {
+        "video": video, "voice": voice, "crowd": crowd,
+        "size": (width, height), "video_seconds": video_seconds, "voice_seconds": voice_seconds,
+    }
+
+
+async def _job(inputs, work_dir, timeout):
+    processor = VideoProcessor(
+        inputs["video"], inputs["voice"], inputs["crowd"], threads=1, work_dir=work_dir, timeout=timeout
+    )
+    start = time.perf_counter()
+    result = await processor.process_async(cleanup=True)
+    return result, time.perf_counter() - start
+
+
+def _check(inputs, result, work_dir):
+    """Problems with one job's output, or an empty list."""
+    problems = []
+    if os.path.dirname(result["final_video"]) != work_dir:
+        problems.append(f"output outside its work dir: {result['final_video']}")
+    leftovers = sorted(set(os.listdir(work_dir)) - {os.path.basename(result["final_video"])})
+    if leftovers:
+        problems.append(f"left in work dir: {', '.join(leftovers)}")
+
+    info = probe_media(result["final_video"])
+    stream = video_stream(info)
+    if (stream["width"], stream["height"]) != inputs["size"]:
+        problems.append(f"size {stream['width']}x{stream['height']}, expected {inputs['size'][0]}x{inputs['size'][1]}")
+    # The result ends with the voice-over, though -shortest with a stream-copied
+    # video may run on to the end of the clip
+    duration = media_duration(info)
+    shortest = inputs["voice_seconds"] - DURATION_TOLERANCE
+    longest = max(inputs["video_seconds"], inputs["voice_seconds"]) + DURATION_TOLERANCE
+    if not shortest <= duration <= longest:
+        problems.append(f"duration {duration:.2f}s, expected {shortest:.2f}-{longest:.2f}s")
+    return problems
+
+
+async def run(jobs, timeout):
+    root = tempfile.mkdtemp(prefix="stress-vp-")
+    original_cwd = os.getcwd()
+    try:
+        source_dir = os.path.join(root, "inputs")
+        os.makedirs(source_dir)
+        print(f"Synthesising inputs for {jobs} jobs...")
+        inputs = await asyncio.gather(*(
+            asyncio.to_thread(_make_inputs, source_dir, i) for i in range(jobs)
+        ))
+
+        work_dirs = [os.path.join(root, f"job-{i}") for i in range(jobs)]
+        start = time.perf_counter()
+        outcomes = await asyncio.gather(
+            *(_job(inputs[i], work_dirs[i], timeout) for i in range(jobs)),
+            return_exceptions=True,
+        )
+        wall = time.perf_counter() - start
+
+        failures = 0
+        print(f"\n{'job':>4}{'mode':>10}{'method':>12}{'seconds':>9}  result")
+        for i, outcome in enumerate(outcomes):
+            if isinstance(outcome, Exception):
+                failures += 1
+                print(f"{i:>4}{'':>10}{'':>12}{'':>9}  ✗ {outcome}")
+                continue
+            result, seconds = outcome
+            problems = _check(inputs[i], result, work_dirs[i])
+            failures += bool(problems)
+            status = "✗ " + "; ".join(problems) if problems else "✓"
+            print(f"{i:>4}{result['video_mode']:>10}{result['method']:>12}{seconds:>9.2f}  {status}")
+
+        if os.getcwd() != original_cwd:
+            failures += 1
+            print("✗ The working directory changed during processing")
+        print(f"\n{jobs} concurrent jobs in {wall:.2f}s, {failures} failed")
+        return failures
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run concurrent VideoProcessor jobs and verify their outputs")
+    parser.add_argument("--jobs", type=int, default=16)
+    parser.add_argument("--timeout", type=float, default=FFMPEG_TIMEOUT, help="Seconds per ffmpeg run")
+    args = parser.parse_args()
+
+    if asyncio.run(run(args.jobs, args.timeout)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,13 @@
 #makes the trickshot summary text
 import time
-from twelvelabs import TwelveLabs
-from dotenv import load_dotenv
+import asyncio
 import os
 
-load_dotenv()  # loads variables from .env into environment
+import providers
+from metrics import add_span
+from progress import bound_reporter
+from ratelimit import get_limiter
 
-apiKey = os.getenv("TWELVELABS_API_KEY")
 indexId = os.getenv("INDEX_ID")
 prompt = """
 
@@ -18,54 +19,252 @@ just describe the trickshot step by step.
  """
 
 
-# # 1. Initialize the client
-client = TwelveLabs(api_key=apiKey)
+# Indexing wait settings: polls start sparse, get dense around the expected
+# finish time and back off again if indexing runs long
+POLL_MIN_INTERVAL = float(os.getenv("INDEX_POLL_MIN_INTERVAL", "1"))
+POLL_MAX_INTERVAL = float(os.getenv("INDEX_POLL_MAX_INTERVAL", "15"))
+INDEXING_TIMEOUT = float(os.getenv("INDEXING_TIMEOUT", "900"))
+
+# Share of the analyze stage's progress that the upload and indexing account for
+UPLOAD_SHARE, INDEXING_SHARE = 0.3, 0.6
+
+
+class _ProgressFile:
+    """File wrapper that reports what fraction of the file has been read."""
+
+    def __init__(self, file, size, on_progress):
+        self._file = file
+        self._size = max(1, size)
+        self._read = 0
+        self._on_progress = on_progress
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+        self._read += len(data)
+        self._on_progress(min(1.0, self._read / self._size))
+        return data
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+# # 1. Initialize the client: get_client() builds one for each event loop
 
 # # 2. Create an index (Already done)
 
-def getSummary(videoPath):
+class IndexingPoller:
+    """
+    One asyncio task that waits on every in-flight indexing job.
+
+    Rather than each job sleeping in its own thread, jobs register their
+    indexed asset here and await a future. The poller checks all assets that
+    are due in one batch, and schedules the next check for each from how long
+    indexing has recently been taking.
+    """
+
+    def __init__(self, client, index_id, min_interval=POLL_MIN_INTERVAL,
+                 max_interval=POLL_MAX_INTERVAL, timeout=INDEXING_TIMEOUT):
+        self.client = client
+        self.index_id = index_id
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.timeout = timeout
+        self.expected_seconds = 30.0  # moving average of observed indexing times
+        self._pending = {}  # indexed asset id -> wait state
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._loop = None
+
+    async def wait_ready(self, indexed_asset_id):
+        """Wait until the asset is indexed and return it."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        now = time.monotonic()
+        self._pending[indexed_asset_id] = {
+            "future": future,
+            "started": now,
+            "next_check": now + self._next_interval(0.0, self.min_interval),
+            "interval": self.min_interval,
+            # Captured here: the poller task doesn't run in the job's context
+            "report": bound_reporter(),
+        }
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        self._wakeup.set()
+        return await future
+
+    def _next_interval(self, elapsed, last_interval):
+        remaining = self.expected_seconds - elapsed
+        if remaining > 0:
+            interval = remaining / 2
+        else:
+            interval = last_interval * 1.5
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    async def _check(self, asset_id, state):
+        try:
+            async with get_limiter("twelvelabs").slot("status"):
+                indexed_asset = await self.client.indexes.indexed_assets.retrieve(self.index_id, asset_id)
+        except Exception as e:
+            # Transient API errors just push the next check back
+            print(f"  Status check for {asset_id} failed: {e}")
+            return
+
+        elapsed = time.monotonic() - state["started"]
+        print(f"  {asset_id}: Status={indexed_asset.status} ({elapsed:.0f}s)")
+        if indexed_asset.status == "ready":
+            self.expected_seconds = 0.7 * self.expected_seconds + 0.3 * elapsed
+            self._resolve(asset_id, result=indexed_asset)
+        elif indexed_asset.status == "failed":
+            self._resolve(asset_id, error=RuntimeError("Indexing failed"))
+        else:
+            # No percentage from the API, so estimate one from past indexing times
+            done = min(0.95, elapsed / max(1.0, self.expected_seconds))
+            state["report"](UPLOAD_SHARE + INDEXING_SHARE * done, "indexing")
+
+    def _resolve(self, asset_id, result=None, error=None):
+        state = self._pending.pop(asset_id, None)
+        if state is None or state["future"].done():
+            return
+        if error is not None:
+            state["future"].set_exception(error)
+        else:
+            state["future"].set_result(result)
+
+    async def _run(self):
+        while self._pending:
+            now = time.monotonic()
+            for asset_id, state in list(self._pending.items()):
+                if state["future"].cancelled():
+                    self._pending.pop(asset_id, None)
+                elif now - state["started"] > self.timeout:
+                    self._resolve(asset_id, error=TimeoutError(
+                        f"Indexing took longer than {self.timeout:.0f}s"
+                    ))
+
+            due = {
+                asset_id: state for asset_id, state in self._pending.items()
+                if state["next_check"] <= now
+            }
+            await asyncio.gather(*(self._check(asset_id, state) for asset_id, state in due.items()))
+
+            now = time.monotonic()
+            for asset_id, state in due.items():
+                if asset_id in self._pending:
+                    state["interval"] = self._next_interval(now - state["started"], state["interval"])
+                    state["next_check"] = now + state["interval"]
+
+            if not self._pending:
+                break
+            delay = max(0.0, min(state["next_check"] for state in self._pending.values()) - now)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+
+# Per event loop: the TwelveLabs client with its httpx connection pool, and
+# the poller using it. Pooled connections can't move between loops, so every
+# asyncio.run (process-mode jobs, batch clips, getSummary) gets its own.
+_clients = {}
+_pollers = {}
+
+# The SDK's own default when it builds the httpx client itself
+HTTP_TIMEOUT = 600
+
+
+def _forget_closed_loops():
+    # Loops that ended without close_client(); their connections went with them
+    for old_loop in [l for l in _clients if l.is_closed()]:
+        _clients.pop(old_loop)
+        _pollers.pop(old_loop, None)
+
+
+def get_client():
+    """The TwelveLabs client for the running event loop, built on first use."""
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    if loop not in _clients:
+        _forget_closed_loops()
+        http = httpx.AsyncClient(timeout=HTTP_TIMEOUT, follow_redirects=True)
+        _clients[loop] = (providers.build("twelvelabs", httpx_client=http), http)
+    return _clients[loop][0]
+
+
+def get_poller():
+    """The indexing poller for the running event loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _pollers:
+        _pollers[loop] = IndexingPoller(get_client(), indexId)
+    return _pollers[loop]
+
+
+async def close_client():
+    """Close the running loop's TwelveLabs connections; await before the loop ends."""
+    loop = asyncio.get_running_loop()
+    _pollers.pop(loop, None)
+    entry = _clients.pop(loop, None)
+    if entry is not None:
+        await entry[1].aclose()
+
+
+async def getSummaryAsync(videoPath):
+    """Upload, index and analyze a video without blocking a thread while indexing runs."""
+    async_client = get_client()
+    limiter = get_limiter("twelvelabs")
+    report = bound_reporter()
+
     # 3. Upload a video
-    asset = client.assets.create(
-        method="direct",
-        file=open(videoPath, "rb") # Use direct links to raw media files. Video hosting platforms and cloud storage sharing links are not supported
-        # Or use method="direct" and file=open("<PATH_TO_VIDEO_FILE>", "rb") to upload a file from the local file system
-    )
+    upload_bytes = os.path.getsize(videoPath)
+    upload_start = time.perf_counter()
+    with open(videoPath, "rb") as f:
+        f = _ProgressFile(f, upload_bytes, lambda done: report(UPLOAD_SHARE * done, "uploading"))
+        async with limiter.slot("upload"):
+            asset = await async_client.assets.create(method="direct", file=f)
+    add_span("twelvelabs:upload", upload_start, time.perf_counter(), bytes=upload_bytes)
 
-    print(f"Created asset: id={asset.id}")
+    print(f"Created asset: id={asset.id} ({upload_bytes / 1e6:.1f} MB)")
 
     # 4. Index your video
-    indexed_asset = client.indexes.indexed_assets.create(
-        index_id=indexId,
-        asset_id=asset.id
-    )
+    async with limiter.slot("index"):
+        indexed_asset = await async_client.indexes.indexed_assets.create(
+            index_id=indexId,
+            asset_id=asset.id
+        )
     print(f"Created indexed asset: id={indexed_asset.id}")
+
     # 5. Monitor the indexing process
     print("Waiting for indexing to complete.")
-    while True:
-        indexed_asset = client.indexes.indexed_assets.retrieve(
-            indexId,
-            indexed_asset.id
-        )
-        print(f"  Status={indexed_asset.status}")
-        if indexed_asset.status == "ready":
-            print("Indexing complete!")
-            break
-        elif indexed_asset.status == "failed":
-            raise RuntimeError("Indexing failed")
-        time.sleep(5)
+    indexing_start = time.perf_counter()
+    indexed_asset = await get_poller().wait_ready(indexed_asset.id)
+    add_span("twelvelabs:indexing", indexing_start, time.perf_counter())
+    print("Indexing complete!")
 
     # 6. Analyze your video
-    text_stream = client.analyze_stream(video_id=indexed_asset.id, prompt=prompt)
-
+    report(UPLOAD_SHARE + INDEXING_SHARE, "analyzing")
     answer = ""
 
     # 7. Process the results
-    for text in text_stream:
-        if text.event_type == "text_generation":
-            answer += text.text
+    async with limiter.slot("analyze") as call:
+        async for text in async_client.analyze_stream(video_id=indexed_asset.id, prompt=prompt):
+            call.responded()
+            if text.event_type == "text_generation":
+                answer += text.text
     print(f"TRICKSHOT SUMMARY:\n{answer}")
     return answer
 
+
+def getSummary(videoPath):
+    """Blocking wrapper around getSummaryAsync for scripts."""
+    async def summarize():
+        try:
+            return await getSummaryAsync(videoPath)
+        finally:
+            await close_client()
+
+    return asyncio.run(summarize())
+
 # videoPath = "trickshot.mp4"
 # answer = getSummary(videoPath)
 # print (f"ANSWER: {answer}")
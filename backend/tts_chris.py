@@ -1,20 +1,27 @@
 # makes a mp3 file of the commentary to be overlayed on the video
-import os
-import requests
-from dotenv import load_dotenv
+from elevenlabs_client import post_audio, stream_audio
 
-load_dotenv()
-
-API_KEY = os.getenv("ELEVENLABS_API_KEY")
-if not API_KEY:
-    raise RuntimeError("Missing ELEVENLABS_API_KEY in environment or .env")
-
-BASE_URL = "https://api.elevenlabs.io/v1"
+# A missing ELEVENLABS_API_KEY is reported by /health and raised on first request
 
 # Hardcode Chris voice id (works now that you're paid)
 CHRIS_VOICE_ID = "Anr9GtYh2VRXxiPplzxM"
 
 
+def _tts_payload(text, stability, similarity_boost, style, model_id):
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError("text must be a non-empty string")
+
+    return {
+        "text": text,
+        "model_id": model_id,
+        "voice_settings": {
+            "stability": stability,
+            "similarity_boost": similarity_boost,
+            "style": style,
+        },
+    }
+
+
 def generate_chris_mp3(
     text: str,
     out_path: str = "chris.mp3",
@@ -40,34 +47,35 @@ def generate_chris_mp3(
     Returns:
         The path to the saved mp3 file.
     """
-    if not isinstance(text, str) or not text.strip():
-        raise ValueError("text must be a non-empty string")
+    payload = _tts_payload(text, stability, similarity_boost, style, model_id)
 
-    url = f"{BASE_URL}/text-to-speech/{CHRIS_VOICE_ID}?output_format={output_format}"
+    return post_audio(
+        f"/text-to-speech/{CHRIS_VOICE_ID}",
+        payload,
+        out_path,
+        params={"output_format": output_format},
+    )
 
-    headers = {
-        "xi-api-key": API_KEY,
-        "Content-Type": "application/json",
-        "Accept": "audio/mpeg",
-    }
 
-    payload = {
-        "text": text,
-        "model_id": model_id,
-        "voice_settings": {
-            "stability": stability,
-            "similarity_boost": similarity_boost,
-            "style": style,
-        },
-    }
-
-    resp = requests.post(url, headers=headers, json=payload, timeout=120)
-
-    # Helpful error message without printing mp3 bytes
-    if not resp.ok:
-        raise RuntimeError(f"ElevenLabs TTS failed ({resp.status_code}): {resp.text}")
+def stream_chris_mp3(
+    text: str,
+    *,
+    stability: float = 0.55,
+    similarity_boost: float = 0.85,
+    style: float = 0.35,
+    model_id: str = "eleven_multilingual_v2",
+    output_format: str = "mp3_44100_128",
+):
+    """
+    Like generate_chris_mp3, but uses the streaming endpoint and yields MP3
+    bytes as ElevenLabs produces them instead of saving a file.
+    """
+    print(f"This is what Chris will say (streaming): \n\n{text}")
 
-    with open(out_path, "wb") as f:
-        f.write(resp.content)
+    payload = _tts_payload(text, stability, similarity_boost, style, model_id)
 
-    return out_path
+    yield from stream_audio(
+        f"/text-to-speech/{CHRIS_VOICE_ID}/stream",
+        payload,
+        params={"output_format": output_format},
+    )
@@ -0,0 +1,173 @@
+# streams an uploaded video to disk in chunks, hashing and probing it on the way
+import os
+import json
+import asyncio
+import hashlib
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(500 * 1024**2)))  # 500 MB
+MAX_FIELD_BYTES = 64 * 1024
+
+
+class UploadError(Exception):
+    """The upload was rejected; status_code is the HTTP status to answer with."""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class _VideoSink:
+    """Writes video bytes to disk while hashing them and feeding ffprobe's stdin."""
+
+    def __init__(self, path):
+        self.path = path
+        self.size = 0
+        self._file = open(path, "wb")
+        self._sha256 = hashlib.sha256()
+        self._probe = None
+
+    async def start(self):
+        try:
+            self._probe = await asyncio.create_subprocess_exec(
+                "ffprobe", "-v", "quiet", "-print_format", "json",
+                "-show_format", "-show_streams", "-i", "pipe:0",
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+        except FileNotFoundError:
+            self._probe = None
+
+    async def write(self, data):
+        self.size += len(data)
+        self._file.write(data)
+        self._sha256.update(data)
+        if self._probe and self._probe.stdin:
+            try:
+                self._probe.stdin.write(data)
+                await self._probe.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                # ffprobe has read all it needs and exited
+                self._probe.stdin = None
+
+    async def finish(self):
+        """Close the file and return (sha256, probe info or None)."""
+        self._file.close()
+        info = None
+        if self._probe:
+            if self._probe.stdin:
+                try:
+                    self._probe.stdin.close()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+            try:
+                stdout, _ = await asyncio.wait_for(self._probe.communicate(), timeout=30)
+                info = json.loads(stdout) if stdout else None
+            except (asyncio.TimeoutError, json.JSONDecodeError):
+                self._probe.kill()
+            # MP4s with the moov atom at the end can't be fully probed from a pipe
+            if info and "duration" not in info.get("format", {}):
+                info = None
+        return self._sha256.hexdigest(), info
+
+    async def abort(self):
+        self._file.close()
+        if self._probe and self._probe.returncode is None:
+            self._probe.kill()
+            await self._probe.wait()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+async def save_upload(request, video_path, file_field="video", max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Parse a multipart request body as it arrives, streaming the video part to disk.
+
+    Only one chunk of the body is held in memory at a time. The upload is
+    rejected before reading if Content-Length is over max_bytes, and as soon as
+    the streamed video goes over it otherwise.
+
+    Returns:
+        (fields, video) where fields holds the small form fields and video is a
+        dict with "size", "sha256" and "info" (ffprobe JSON, or None if the
+        header couldn't be probed from the stream).
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise UploadError(400, "Expected a multipart/form-data upload")
+
+    content_length = request.headers.get("content-length")
+    if content_length and int(content_length) > max_bytes + MAX_FIELD_BYTES:
+        raise UploadError(413, f"Upload is larger than {max_bytes} bytes")
+
+    fields: dict[str, bytearray] = {}
+    events = []  # (kind, value) queued by the sync parser callbacks
+    header_field = bytearray()
+    header_value = bytearray()
+    part_name = None
+    part_is_file = False
+
+    def on_header_field(data, start, end):
+        header_field.extend(data[start:end])
+
+    def on_header_value(data, start, end):
+        header_value.extend(data[start:end])
+
+    def on_header_end():
+        nonlocal part_name, part_is_file
+        if header_field.lower() == b"content-disposition":
+            _, disposition = parse_options_header(bytes(header_value))
+            part_name = disposition.get(b"name", b"").decode()
+            part_is_file = b"filename" in disposition
+        header_field.clear()
+        header_value.clear()
+
+    def on_part_begin():
+        nonlocal part_name, part_is_file
+        part_name, part_is_file = None, False
+
+    def on_part_data(data, start, end):
+        events.append((part_name, part_is_file, data[start:end]))
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+    })
+
+    sink = _VideoSink(video_path)
+    await sink.start()
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for name, is_file, data in events:
+                if is_file and name == file_field:
+                    if sink.size + len(data) > max_bytes:
+                        raise UploadError(413, f"Upload is larger than {max_bytes} bytes")
+                    await sink.write(data)
+                elif not is_file and name:
+                    value = fields.setdefault(name, bytearray())
+                    if len(value) + len(data) > MAX_FIELD_BYTES:
+                        raise UploadError(413, f"Form field {name!r} is too large")
+                    value.extend(data)
+            events.clear()
+        parser.finalize()
+    except BaseException:
+        await sink.abort()
+        raise
+
+    if sink.size == 0:
+        await sink.abort()
+        raise UploadError(400, f"Missing {file_field!r} file")
+
+    sha256, info = await sink.finish()
+    video = {"size": sink.size, "sha256": sha256, "info": info}
+    return {name: value.decode() for name, value in fields.items()}, video
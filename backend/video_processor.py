@@ -1,14 +1,244 @@
 #used to actually overlay audio on video using ffmpeg
 import os
+import re
+import asyncio
 import subprocess
 import sys
+import time
 from pathlib import Path
 
+from metrics import add_span, wait_with_usage
+from media_info import get_media_info, media_duration, require_duration, video_stream, audio_stream
+
+# Voice-overs at most this much longer than the clip are treated as fitting inside it
+PAD_TOLERANCE = 0.05
+
+# Write the final video as fragmented MP4 so it can be streamed to a client
+# while ffmpeg is still producing it
+FRAGMENTED_MP4_FLAGS = ["-movflags", "+frag_keyframe+empty_moov+default_base_moof"]
+
+# Pass as voice_file to read the voice-over from ffmpeg's stdin (see process_streaming)
+VOICE_PIPE = "pipe:0"
+
+# A streamed voice-over's length isn't known up front, so the estimate is padded
+# by a factor and a fixed number of seconds; a too-long tail is cheap and gets
+# cut by -shortest anyway, while a too-short video cuts off the commentary
+STREAM_ESTIMATE_MARGIN = 1.3
+STREAM_ESTIMATE_SLACK = float(os.getenv("STREAM_ESTIMATE_SLACK", "1.5"))
+
+# Named x264/AAC settings for every encode VideoProcessor does. max_height caps
+# the resolution when the whole clip has to be re-encoded anyway; stream-copied
+# video keeps its original size.
+ENCODING_PROFILES = {
+    "default": {"preset": "medium", "crf": 23, "max_height": None, "audio_bitrate": "128k"},
+    "fast-preview": {"preset": "ultrafast", "crf": 28, "max_height": 720, "audio_bitrate": "96k"},
+    "archive": {"preset": "slow", "crf": 18, "max_height": None, "audio_bitrate": "192k"},
+}
+ENCODING_PROFILE = os.getenv("ENCODING_PROFILE", "default")
+
+# Encoder threads per ffmpeg run; 0 splits the available cores between active jobs
+FFMPEG_THREADS = int(os.getenv("FFMPEG_THREADS", "0"))
+
+# Audio track language tags for multi-language output (ISO 639-2)
+ISO_639_2 = {"en": "eng", "fr": "fra", "ar": "ara", "ur": "urd", "es": "spa"}
+
+
+def language_video_name(language):
+    """File name for the single-language copy of a multi-language result."""
+    return f"full-trickshot.{language}.mp4"
+
+
+# Small copy of the clip uploaded for analysis: the short side is scaled down to
+# PROXY_SHORT_SIDE (never up), frame rate and keyframe spacing are reduced
+PROXY_SHORT_SIDE = int(os.getenv("PROXY_SHORT_SIDE", "360"))
+PROXY_FPS = int(os.getenv("PROXY_FPS", "15"))
+PROXY_KEYFRAME_SECONDS = float(os.getenv("PROXY_KEYFRAME_SECONDS", "2"))
+PROXY_MAX_BITRATE = os.getenv("PROXY_MAX_BITRATE", "500k")
+
+# An ffmpeg run taking longer than this many seconds is killed (run_ffmpeg_async)
+FFMPEG_TIMEOUT = float(os.getenv("FFMPEG_TIMEOUT", "900"))
+
+# How process() mixes the crowd under the voice-over: "numpy" mixes the PCM in
+# audio_mix and the last ffmpeg run only muxes (falling back to the ffmpeg
+# graph if that fails), "ffmpeg" goes straight to the afade/amix graph
+AUDIO_MIX = os.getenv("AUDIO_MIX", "numpy")
+
+
+class FFmpegError(subprocess.CalledProcessError):
+    """
+    An ffmpeg step exited with an error or was killed after its timeout, or a
+    Python step (e.g. the NumPy mix) raised `reason`.
+    """
+
+    def __init__(self, step, returncode, cmd, timed_out=False, reason=None):
+        super().__init__(returncode, cmd)
+        self.step = step
+        self.timed_out = timed_out
+        self.reason = reason
+
+    def __str__(self):
+        if self.timed_out:
+            return f"ffmpeg step '{self.step}' timed out"
+        if self.reason is not None:
+            return f"step '{self.step}' failed: {self.reason!r}"
+        return f"ffmpeg step '{self.step}' exited with status {self.returncode}"
+
+
+def run_ffmpeg(cmd, step):
+    """
+    Run an ffmpeg command like subprocess.run(check=True), recording its wall
+    time, CPU time and peak memory as an "ffmpeg:<step>" span on the job trace.
+    """
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd)
+    try:
+        returncode, cpu_seconds, peak_rss = wait_with_usage(proc)
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        raise
+    _record_ffmpeg(step, start, cpu_seconds, peak_rss)
+    if returncode != 0:
+        raise FFmpegError(step, returncode, cmd)
+
+
+async def run_ffmpeg_async(cmd, step, timeout=FFMPEG_TIMEOUT, on_progress=None):
+    """
+    Run an ffmpeg command as an asyncio subprocess, so one event loop can
+    supervise many concurrent runs without a blocked thread each.
+    
+    ffmpeg is killed if it runs for more than `timeout` seconds (FFmpegError
+    with timed_out set) or if the awaiting task is cancelled. asyncio reaps
+    the child itself, so instead of wait4 the CPU time and peak memory for the
+    "ffmpeg:<step>" span come from ffmpeg's own -benchmark report.
+    
+    on_progress, if given, is called with the seconds of output written so
+    far each time ffmpeg's -progress report updates (about twice a second).
+    """
+    start = time.perf_counter()
+    progress_args = ["-progress", "pipe:1"] if on_progress else []
+    proc = await asyncio.create_subprocess_exec(
+        cmd[0], "-benchmark", *progress_args, *cmd[1:],
+        stdin=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE if on_progress else None,
+    )
+    reader = asyncio.create_task(_forward_stderr(proc.stderr))
+    progress_reader = asyncio.create_task(_read_progress(proc.stdout, on_progress)) if on_progress else None
+    timed_out = False
+    try:
+        await asyncio.wait_for(proc.wait(), timeout)
+    except asyncio.TimeoutError:
+        timed_out = True
+    finally:
+        if proc.returncode is None:
+            # Timed out or cancelled; don't leave ffmpeg writing into the job directory
+            proc.kill()
+            await proc.wait()
+        stderr_tail = await reader
+        if progress_reader:
+            await progress_reader
+        _record_ffmpeg(step, start, *_benchmark_usage(stderr_tail))
+    if timed_out or proc.returncode != 0:
+        raise FFmpegError(step, proc.returncode, cmd, timed_out)
+
+
+async def _forward_stderr(stream):
+    """Copy ffmpeg's log through to our stderr and return its last few KB."""
+    tail = b""
+    while chunk := await stream.read(4096):
+        sys.stderr.write(chunk.decode(errors="replace"))
+        tail = (tail + chunk)[-4096:]
+    return tail
+
+
+async def _read_progress(stream, on_progress):
+    """Call on_progress(seconds) for each out_time_us line of ffmpeg's -progress output."""
+    while line := await stream.readline():
+        key, _, value = line.decode(errors="replace").strip().partition("=")
+        if key == "out_time_us" and value.isdigit():
+            on_progress(int(value) / 1e6)
+
+
+_BENCH_TIMES = re.compile(rb"bench: utime=([\d.]+)s stime=([\d.]+)s")
+_BENCH_RSS = re.compile(rb"bench: maxrss=(\d+)\s*(?:KiB|kB)")
+
+
+def _benchmark_usage(stderr_tail):
+    """(cpu_seconds, peak_rss_bytes) from ffmpeg's -benchmark lines, 0 where missing."""
+    times = _BENCH_TIMES.search(stderr_tail)
+    rss = _BENCH_RSS.search(stderr_tail)
+    cpu_seconds = float(times.group(1)) + float(times.group(2)) if times else 0.0
+    return cpu_seconds, int(rss.group(1)) * 1024 if rss else 0
+
+
+def _record_ffmpeg(step, start, cpu_seconds, peak_rss):
+    add_span(
+        f"ffmpeg:{step}", start, time.perf_counter(),
+        cpu_seconds=round(cpu_seconds, 3), peak_rss_bytes=peak_rss,
+    )
+
+
+def available_cores():
+    """CPU cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def encoder_threads(active_jobs=1):
+    """-threads value for one encode when `active_jobs` encodes share the machine."""
+    if FFMPEG_THREADS > 0:
+        return FFMPEG_THREADS
+    return max(1, available_cores() // max(1, active_jobs))
+
+
+def build_analysis_proxy(video_file, out_path, short_side=PROXY_SHORT_SIDE, fps=PROXY_FPS,
+                         keyframe_seconds=PROXY_KEYFRAME_SECONDS, max_bitrate=PROXY_MAX_BITRATE,
+                         threads=None):
+    """
+    Transcode a small, low-bitrate copy of a clip for analysis uploads.
+    
+    The analysis only needs to follow the motion and hear the audio, so a
+    360p/15fps proxy carries the same information as a 4K phone original at a
+    fraction of the upload size. The original is left alone for the final mux.
+    """
+    short = f"min({short_side},min(iw,ih))"
+    scale = f"scale='if(gt(iw,ih),-2,{short})':'if(gt(iw,ih),{short},-2)'"
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-i", video_file,
+        "-vf", f"{scale},fps={fps}",
+        "-c:v", "libx264",
+        "-preset", "veryfast",
+        "-crf", "30",
+        "-maxrate", max_bitrate,
+        "-bufsize", max_bitrate,
+        "-g", str(max(1, round(fps * keyframe_seconds))),
+        "-threads", str(threads or encoder_threads()),
+        "-c:a", "aac",
+        "-ac", "1",
+        "-b:a", "48k",
+        "-movflags", "+faststart",
+        out_path
+    ]
+    run_ffmpeg(cmd, "proxy")
+    return out_path
+
 
 class VideoProcessor:
-    """Process video files with FFmpeg to add audio overlays."""
+    """
+    Process video files with FFmpeg to add audio overlays.
     
-    def __init__(self, video_file, voice_file="trickshot-voice.mp3", crowd_file="crowd-noises.mp3"):
+    Every intermediate and output file lives in work_dir, so any number of
+    processors can run at once in one process as long as each job has its own
+    directory. Each processing method exists in a blocking form (run_ffmpeg)
+    and an async one (run_ffmpeg_async) built from the same ffmpeg steps.
+    """
+    
+    def __init__(self, video_file, voice_file="trickshot-voice.mp3", crowd_file="crowd-noises.mp3",
+                 profile=ENCODING_PROFILE, threads=None, work_dir=".", timeout=FFMPEG_TIMEOUT,
+                 on_progress=None, audio_mix=AUDIO_MIX, crowd_source=None):
         """
         Initialize the video processor.
         
@@ -16,29 +246,300 @@ class VideoProcessor:
             video_file (str): Path to the input video file
             voice_file (str): Path to the voice-over audio file (default: trickshot-voice.mp3)
             crowd_file (str): Path to the crowd noise audio file (default: crowd-noises.mp3)
+            profile (str): Name of an entry in ENCODING_PROFILES (default: ENCODING_PROFILE)
+            threads (int): Encoder threads per ffmpeg run (default: all available cores)
+            work_dir (str): Directory for intermediate and output files (default: current directory)
+            timeout (float): Seconds each ffmpeg run may take in the async methods
+            on_progress (callable): Called as on_progress(step, fraction) while the
+                async methods run each ffmpeg step
+            audio_mix (str): "numpy" or "ffmpeg" (default: AUDIO_MIX)
+            crowd_source (str): Optional bank track crowd_file was looped or trimmed
+                from; the NumPy mix decodes this instead, so the decoded PCM is
+                shared by every job that picks the same track
         """
+        if profile not in ENCODING_PROFILES:
+            raise ValueError(f"Unknown encoding profile: {profile}")
+        if audio_mix not in ("numpy", "ffmpeg"):
+            raise ValueError(f"Unknown audio mix mode: {audio_mix}")
         self.video_file = video_file
         self.voice_file = voice_file
         self.crowd_file = crowd_file
-        self.temp_video = "flipshot.mp4"
-        self.output_video = "trickshot_output.mp4"
-        self.final_video = "full-trickshot.mp4"
+        self.profile_name = profile
+        self.profile = ENCODING_PROFILES[profile]
+        self.threads = threads or encoder_threads()
+        self.timeout = timeout
+        self.on_progress = on_progress
+        self.audio_mix = audio_mix
+        self.crowd_source = crowd_source
+        self.work_dir = work_dir
+        os.makedirs(work_dir, exist_ok=True)
+        self.temp_video = self._work_path("flipshot.mp4")
+        self.output_video = self._work_path("trickshot_output.mp4")
+        self.final_video = self._work_path("full-trickshot.mp4")
+        self.last_frame = self._work_path("last-frame.png")
+        self.tail_video = self._work_path("tail.mp4")
+        self.concat_list = self._work_path("concat.txt")
+        self.mixed_audio = self._work_path("mix.m4a")
+        
+        # Filled in by plan()
+        self.video_mode = None
+        self.pad_seconds = 0.0
+        self.output_seconds = 0.0
+        self.video_seconds = 0.0
+        self._video_stream = None
         
         # Validate that all input files exist
         self._validate_files()
     
+    def _work_path(self, name):
+        return os.path.join(self.work_dir, name)
+    
     def _validate_files(self):
-        """Check that all input files exist in the current directory."""
+        """Check that all input files exist."""
         for file in [self.video_file, self.voice_file, self.crowd_file]:
-            if not os.path.exists(file):
+            if file != VOICE_PIPE and not os.path.exists(file):
                 raise FileNotFoundError(f"File not found: {file}")
     
+    def _result(self, method, outputs=None):
+        """What a processing run produced, as returned by process() and friends."""
+        return {
+            "final_video": self.final_video,
+            "method": method,
+            "video_mode": self.video_mode,
+            "pad_seconds": self.pad_seconds,
+            "outputs": outputs or {},
+        }
+    
+    # Processing is written as generators that yield (cmd, step) for each ffmpeg
+    # run and resume once it has succeeded (or get the FFmpegError thrown in),
+    # so the blocking and async drivers below share the same sequence of steps.
+    # cmd can also be a function for work done in Python (the NumPy audio mix),
+    # which the async driver runs on a worker thread.
+    
+    def _run_steps(self, steps):
+        """Run each command a step generator yields with run_ffmpeg; return its result."""
+        try:
+            cmd, step = steps.send(None)
+            while True:
+                try:
+                    if callable(cmd):
+                        self._call_step(cmd, step)
+                    else:
+                        run_ffmpeg(cmd, step)
+                except FFmpegError as e:
+                    cmd, step = steps.throw(e)
+                else:
+                    cmd, step = steps.send(None)
+        except StopIteration as done:
+            return done.value
+        finally:
+            steps.close()
+    
+    async def _run_steps_async(self, steps):
+        """_run_steps with run_ffmpeg_async; cancelling it kills the running ffmpeg."""
+        try:
+            cmd, step = steps.send(None)
+            while True:
+                try:
+                    if callable(cmd):
+                        await asyncio.to_thread(self._call_step, cmd, step)
+                    else:
+                        await run_ffmpeg_async(cmd, step, self.timeout, self._step_progress(step))
+                except FFmpegError as e:
+                    cmd, step = steps.throw(e)
+                else:
+                    cmd, step = steps.send(None)
+        except StopIteration as done:
+            return done.value
+        finally:
+            steps.close()
+    
+    def _call_step(self, func, step):
+        """
+        Run a Python step, raising FFmpegError if it fails in any way, so the
+        same fallbacks apply as when an ffmpeg step fails.
+        """
+        if self.on_progress:
+            self.on_progress(step, 0.0)
+        try:
+            func()
+        except FFmpegError:
+            raise
+        except subprocess.CalledProcessError as e:
+            raise FFmpegError(step, e.returncode, e.cmd) from e
+        except Exception as e:
+            raise FFmpegError(step, -1, step, reason=e) from e
+        if self.on_progress:
+            self.on_progress(step, 1.0)
+    
+    def _step_progress(self, step):
+        """-progress callback turning one step's output seconds into on_progress(step, fraction)."""
+        if self.on_progress is None or step == "last_frame":
+            return None
+        # Seconds of output the step writes: most write the finished length
+        expected = {
+            "remove_audio": self.output_seconds - self.pad_seconds,
+            "tail": self.pad_seconds + 0.5,
+        }.get(step, self.output_seconds)
+        if expected <= 0:
+            return None
+        return lambda seconds: self.on_progress(step, min(1.0, seconds / expected))
+    
+    def plan(self, voice_duration=None):
+        """
+        Probe the video and voice durations and decide how to produce the video track.
+        
+        Args:
+            voice_duration (float): Voice-over length in seconds, if already known
+                (or estimated); otherwise the voice file is probed
+        
+        Sets self.video_mode to one of:
+            "copy"     - the voice fits inside the clip, so the video is stream-copied
+            "pad_tail" - the voice is longer, so only a frozen-last-frame tail is
+                         encoded and concatenated onto the stream-copied original
+            "reencode" - the voice is longer and the source can't be concatenated
+                         with an H.264 tail, so the whole clip goes through tpad
+        """
+        if self.video_mode is not None:
+            return self.video_mode
+        
+        # Usually already probed by the upload or the pipeline, so no new ffprobe runs
+        video_info = get_media_info(self.video_file)
+        self._video_stream = video_stream(video_info)
+        
+        video_duration = require_duration(video_info, self.video_file)
+        if voice_duration is None:
+            voice_duration = require_duration(get_media_info(self.voice_file), self.voice_file)
+        self.pad_seconds = max(0.0, voice_duration - video_duration)
+        self.output_seconds = max(video_duration, voice_duration)
+        self.video_seconds = video_duration
+        
+        if self.pad_seconds <= PAD_TOLERANCE:
+            self.video_mode = "copy"
+        elif self._video_stream and self._video_stream.get("codec_name") == "h264":
+            self.video_mode = "pad_tail"
+        else:
+            self.video_mode = "reencode"
+        
+        print(
+            f"Video {video_duration:.2f}s, voice {voice_duration:.2f}s "
+            f"-> video mode: {self.video_mode}"
+        )
+        return self.video_mode
+    
+    def plan_multilingual(self, voices):
+        """
+        plan() for several voice-overs: the video has to cover the longest one.
+        
+        Returns:
+            float: The longest voice-over's length in seconds
+        """
+        longest = max(require_duration(get_media_info(path), path) for path in voices.values())
+        self.plan(voice_duration=longest)
+        return longest
+    
+    def build_tail_segment(self):
+        """
+        Encode a short clip of the frozen last frame, just long enough to cover
+        the voice-over, and write a concat list of the silent video plus that tail.
+        
+        Only the tail goes through libx264, so the CPU cost scales with how much
+        longer the voice is than the clip instead of with the clip's resolution.
+        """
+        self._run_steps(self._tail_steps())
+    
+    def _tail_steps(self):
+        stream = self._video_stream
+        fps = stream.get("r_frame_rate", "30/1")
+        timescale = stream.get("time_base", "1/15360").split("/")[-1]
+        
+        print(f"\nEncoding {self.pad_seconds:.2f}s tail segment...")
+        
+        # -update 1 keeps overwriting the image, leaving the last decoded frame.
+        # -noautorotate keeps it in coded orientation like the stream-copied
+        # body, whose rotation metadata the concatenated output inherits
+        grab_cmd = [
+            "ffmpeg",
+            "-y",
+            "-sseof", "-1",
+            "-noautorotate",
+            "-i", self.video_file,
+            "-update", "1",
+            self.last_frame
+        ]
+        tail_cmd = [
+            "ffmpeg",
+            "-y",
+            "-loop", "1",
+            "-framerate", fps,
+            "-i", self.last_frame,
+            "-t", f"{self.pad_seconds + 0.5:.3f}",
+            "-vf", f"scale={stream['width']}:{stream['height']},format={stream.get('pix_fmt', 'yuv420p')}",
+            "-r", fps,
+            *self._x264_args(),
+            "-video_track_timescale", timescale,
+            self.tail_video
+        ]
+        
+        try:
+            yield grab_cmd, "last_frame"
+            yield tail_cmd, "tail"
+        except FFmpegError as e:
+            print(f"✗ Error encoding tail segment: {e}")
+            raise
+        
+        # The concat demuxer resolves relative entries against the list's own
+        # directory, which is work_dir, like the two segments
+        with open(self.concat_list, "w") as f:
+            f.write(
+                f"file '{os.path.basename(self.temp_video)}'\n"
+                f"file '{os.path.basename(self.tail_video)}'\n"
+            )
+        print(f"✓ Tail segment ready. Created: {self.tail_video}")
+    
+    def _x264_args(self):
+        """Video encoder arguments for the chosen profile and thread count."""
+        return [
+            "-c:v", "libx264",
+            "-preset", self.profile["preset"],
+            "-crf", str(self.profile["crf"]),
+            "-threads", str(self.threads),
+        ]
+    
+    def _aac_args(self):
+        """Audio encoder arguments for the chosen profile."""
+        return ["-c:a", "aac", "-b:a", self.profile["audio_bitrate"]]
+    
+    def _video_source(self, source):
+        """
+        Return (input_args, filter, video_map, video_codec_args) for the chosen video mode.
+        
+        Args:
+            source (str): The video file to read when no tail is concatenated
+        """
+        if self.video_mode == "copy":
+            return ["-i", source], "", "0:v:0", ["-c:v", "copy"]
+        if self.video_mode == "pad_tail":
+            return (
+                ["-f", "concat", "-safe", "0", "-i", self.concat_list],
+                "", "0:v:0", ["-c:v", "copy"],
+            )
+        video_filter = "[0:v]tpad=stop_mode=clone:stop_duration=999"
+        max_height = self.profile["max_height"]
+        if max_height and self._video_stream and self._video_stream.get("height", 0) > max_height:
+            video_filter += f",scale=-2:{max_height}"
+        return ["-i", source], f"{video_filter}[v]", "[v]", self._x264_args()
+    
     def remove_audio(self):
         """Remove audio from the original video file."""
+        self._run_steps(self._remove_audio_steps())
+    
+    def _remove_audio_steps(self):
         print(f"Step 1: Removing audio from {self.video_file}...")
         
         cmd = [
             "ffmpeg",
+            "-y",
             "-i", self.video_file,
             "-c:v", "copy",
             "-an",
@@ -46,39 +547,49 @@ class VideoProcessor:
         ]
         
         try:
-            subprocess.run(cmd, check=True, capture_output=False)
-            print(f"✓ Audio removed. Created: {self.temp_video}")
-        except subprocess.CalledProcessError as e:
+            yield cmd, "remove_audio"
+        except FFmpegError as e:
             print(f"✗ Error removing audio: {e}")
             raise
+        print(f"✓ Audio removed. Created: {self.temp_video}")
     
     def add_voice_over(self):
         """Add voice-over commentary to the video."""
+        self._run_steps(self._voice_over_steps())
+    
+    def _voice_over_steps(self):
         print(f"\nStep 2: Adding voice-over ({self.voice_file})...")
         
-        cmd = [
-            "ffmpeg",
-            "-y",
-            "-i", self.temp_video,
-            "-i", self.voice_file,
-            "-filter_complex", "[0:v]tpad=stop_mode=clone:stop_duration=999[v]",
-            "-map", "[v]",
+        self.plan()
+        if self.video_mode == "pad_tail" and not os.path.exists(self.concat_list):
+            yield from self._tail_steps()
+        
+        input_args, video_filter, video_map, video_codec = self._video_source(self.temp_video)
+        cmd = ["ffmpeg", "-y", *input_args, "-i", self.voice_file]
+        if video_filter:
+            cmd += ["-filter_complex", video_filter]
+        cmd += [
+            "-map", video_map,
             "-map", "1:a:0",
             "-shortest",
-            "-c:v", "libx264",
-            "-c:a", "aac",
+            *video_codec,
+            # add_crowd_noise re-encodes the mix, so encoding the voice here would be wasted
+            "-c:a", "copy",
             self.output_video
         ]
         
         try:
-            subprocess.run(cmd, check=True, capture_output=False)
-            print(f"✓ Voice-over added. Created: {self.output_video}")
-        except subprocess.CalledProcessError as e:
+            yield cmd, "voice_over"
+        except FFmpegError as e:
             print(f"✗ Error adding voice-over: {e}")
             raise
+        print(f"✓ Voice-over added. Created: {self.output_video}")
     
     def add_crowd_noise(self):
         """Add crowd noise as background audio mixed with voice-over."""
+        self._run_steps(self._crowd_noise_steps())
+    
+    def _crowd_noise_steps(self):
         print(f"\nStep 3: Adding crowd noise ({self.crowd_file})...")
         
         cmd = [
@@ -91,43 +602,421 @@ class VideoProcessor:
             "-map", "0:v",
             "-map", "[a]",
             "-c:v", "copy",
-            "-c:a", "aac",
+            *self._aac_args(),
             "-shortest",
+            *FRAGMENTED_MP4_FLAGS,
             self.final_video
         ]
         
         try:
-            subprocess.run(cmd, check=True, capture_output=False)
-            print(f"✓ Crowd noise added. Created: {self.final_video}")
-        except subprocess.CalledProcessError as e:
+            yield cmd, "crowd_noise"
+        except FFmpegError as e:
             print(f"✗ Error adding crowd noise: {e}")
             raise
+        print(f"✓ Crowd noise added. Created: {self.final_video}")
     
-    def process(self, cleanup=True):
+    def fused_command(self):
         """
-        Execute the full video processing pipeline.
+        Build a single ffmpeg command that does all three steps in one pass.
+        
+        The original audio is dropped simply by never mapping it, and the voice
+        and faded crowd track are mixed with amix. The video is stream-copied
+        unless plan() decided the whole clip has to be padded with tpad.
+        """
+        self.plan()
+        input_args, video_filter, video_map, video_codec = self._video_source(self.video_file)
+        audio_filter = (
+            "[2:a]afade=t=in:st=0:d=1,volume=0.25[crowd];"
+            "[1:a:0][crowd]amix=inputs=2:duration=first[a]"
+        )
+        filter_graph = f"{video_filter};{audio_filter}" if video_filter else audio_filter
+        voice_args = ["-i", self.voice_file]
+        if self.voice_file == VOICE_PIPE:
+            voice_args = ["-f", "mp3", *voice_args]
+        return [
+            "ffmpeg",
+            "-y",
+            *input_args,
+            *voice_args,
+            "-i", self.crowd_file,
+            "-filter_complex", filter_graph,
+            "-map", video_map,
+            "-map", "[a]",
+            "-shortest",
+            *video_codec,
+            *self._aac_args(),
+            *FRAGMENTED_MP4_FLAGS,
+            self.final_video
+        ]
+    
+    def mix_audio(self):
+        """
+        Mix the faded crowd under the voice-over in NumPy (see audio_mix) and
+        encode the result as the one AAC track premixed_command() muxes.
+        
+        With a crowd_source, that bank track is looped or trimmed to the clip's
+        length in memory instead of decoding the job's fitted copy, so the
+        decoded crowd comes from the cache whenever the track was used before.
+        """
+        # NumPy is only loaded once a job gets this far, not at server start
+        from audio_mix import mix_files
+        
+        self.plan()
+        voice = audio_stream(get_media_info(self.voice_file)) or {}
+        crowd_file, crowd_seconds = self.crowd_file, None
+        if self.crowd_source and os.path.exists(self.crowd_source):
+            crowd_file, crowd_seconds = self.crowd_source, self.video_seconds
+        print(f"Mixing {self.voice_file} with {crowd_file}...")
+        mix_files(
+            self.voice_file, crowd_file, self.mixed_audio,
+            channels=int(voice.get("channels") or 2),
+            crowd_seconds=crowd_seconds,
+            bitrate=self.profile["audio_bitrate"],
+        )
+    
+    def premixed_command(self):
+        """
+        Build the ffmpeg command that muxes the video with the track mix_audio()
+        wrote. The audio is stream-copied, and so is the video unless plan()
+        decided the whole clip has to be padded with tpad.
+        """
+        self.plan()
+        input_args, video_filter, video_map, video_codec = self._video_source(self.video_file)
+        cmd = ["ffmpeg", "-y", *input_args, "-i", self.mixed_audio]
+        if video_filter:
+            cmd += ["-filter_complex", video_filter]
+        return cmd + [
+            "-map", video_map,
+            "-map", "1:a:0",
+            "-shortest",
+            *video_codec,
+            "-c:a", "copy",
+            *FRAGMENTED_MP4_FLAGS,
+            self.final_video
+        ]
+    
+    def process_premixed(self):
+        """Mix the audio in NumPy, then mux it with the video in one ffmpeg run."""
+        self._run_steps(self._premixed_steps())
+    
+    def _premixed_steps(self):
+        print(f"Processing {self.video_file} with the audio mixed in NumPy...")
+        
+        self.plan()
+        if self.video_mode == "pad_tail":
+            yield from self._remove_audio_steps()
+            yield from self._tail_steps()
+        
+        try:
+            yield self.mix_audio, "audio_mix"
+            yield self.premixed_command(), "premixed"
+        except FFmpegError as e:
+            print(f"✗ Error in pre-mixed processing: {e}")
+            raise
+        print(f"✓ Voice-over and crowd noise added. Created: {self.final_video}")
+    
+    def process_fused(self):
+        """Remove audio, add voice-over and mix in crowd noise with one ffmpeg run."""
+        self._run_steps(self._fused_steps())
+    
+    def _fused_steps(self):
+        print(f"Processing {self.video_file} in a single ffmpeg pass...")
+        
+        self.plan()
+        if self.video_mode == "pad_tail":
+            # The concat demuxer needs a silent copy of the clip to append the tail to
+            yield from self._remove_audio_steps()
+            yield from self._tail_steps()
+        
+        try:
+            yield self.fused_command(), "fused"
+        except FFmpegError as e:
+            print(f"✗ Error in single-pass processing: {e}")
+            raise
+        print(f"✓ Voice-over and crowd noise added. Created: {self.final_video}")
+    
+    def multilingual_command(self, voices):
+        """
+        Build one ffmpeg command that mixes the crowd under every language's
+        voice-over and writes them all as audio tracks of a single MP4.
+        
+        The crowd track is faded and split once, so it is decoded a single time
+        however many languages there are, and the video is handled exactly as in
+        fused_command. The output runs to the end of the longest voice-over.
         
         Args:
-            cleanup (bool): If True, remove temporary files after processing (default: True)
+            voices (dict): Language code -> voice-over file, in track order
         """
+        longest_voice = self.plan_multilingual(voices)
+        input_args, video_filter, video_map, video_codec = self._video_source(self.video_file)
+        
+        n = len(voices)
+        crowd_labels = "".join(f"[c{i}]" for i in range(n))
+        audio_filter = f"[1:a]afade=t=in:st=0:d=1,volume=0.25,asplit={n}{crowd_labels}"
+        for i in range(n):
+            audio_filter += f";[{i + 2}:a:0][c{i}]amix=inputs=2:duration=first[a{i}]"
+        filter_graph = f"{video_filter};{audio_filter}" if video_filter else audio_filter
+        
+        cmd = ["ffmpeg", "-y", *input_args, "-i", self.crowd_file]
+        for path in voices.values():
+            cmd += ["-i", path]
+        cmd += ["-filter_complex", filter_graph, "-map", video_map]
+        for i, language in enumerate(voices):
+            cmd += [
+                "-map", f"[a{i}]",
+                f"-metadata:s:a:{i}", f"language={ISO_639_2.get(language, language)}",
+                f"-disposition:a:{i}", "default" if i == 0 else "0",
+            ]
+        return cmd + [
+            "-t", f"{longest_voice:.3f}",
+            *video_codec,
+            *self._aac_args(),
+            *FRAGMENTED_MP4_FLAGS,
+            self.final_video
+        ]
+    
+    def process_multilingual(self, voices, cleanup=True):
+        """
+        Produce one video with an audio track per language in a single ffmpeg
+        pass, then stream-copy each track out into its own MP4 (for players,
+        like browsers, that can't switch audio tracks).
+        
+        Args:
+            voices (dict): Language code -> voice-over file, in track order
+            cleanup (bool): If True, remove intermediate files afterwards (default: True)
+        
+        Returns:
+            dict: The run's result; "outputs" maps language code -> single-language video file
+        """
+        return self._run_steps(self._multilingual_steps(voices, cleanup))
+    
+    async def process_multilingual_async(self, voices, cleanup=True):
+        """process_multilingual() with async ffmpeg runs."""
+        await asyncio.to_thread(self.plan_multilingual, voices)
+        return await self._run_steps_async(self._multilingual_steps(voices, cleanup))
+    
+    def _multilingual_steps(self, voices, cleanup):
+        print(f"Processing {self.video_file} with {len(voices)} commentary tracks...")
+        
         try:
-            self.remove_audio()
-            self.add_voice_over()
-            self.add_crowd_noise()
+            cmd = self.multilingual_command(voices)
+            if self.video_mode == "pad_tail":
+                yield from self._remove_audio_steps()
+                yield from self._tail_steps()
             
+            try:
+                yield cmd, "multilingual"
+                print(f"✓ {len(voices)} commentary tracks added. Created: {self.final_video}")
+                outputs = yield from self._split_steps(list(voices))
+            except FFmpegError as e:
+                print(f"✗ Error in multi-language processing: {e}")
+                raise
+        finally:
             if cleanup:
                 self._cleanup_temp_files()
-            
-            print(f"\n✓ Processing complete! Final video: {self.final_video}")
-            
+        return self._result("multilingual", outputs)
+    
+    def split_language_tracks(self, languages):
+        """
+        Stream-copy each audio track of the multi-language video into its own MP4.
+        
+        Args:
+            languages (list): Language codes in track order
+        
+        Returns:
+            dict: Language code -> single-language video file
+        """
+        return self._run_steps(self._split_steps(languages))
+    
+    async def split_language_tracks_async(self, languages):
+        """split_language_tracks() with async ffmpeg runs."""
+        return await self._run_steps_async(self._split_steps(languages))
+    
+    def _split_steps(self, languages):
+        outputs = {}
+        for i, language in enumerate(languages):
+            outputs[language] = self._work_path(language_video_name(language))
+            yield [
+                "ffmpeg", "-y",
+                "-i", self.final_video,
+                "-map", "0:v:0",
+                "-map", f"0:a:{i}",
+                "-c", "copy",
+                *FRAGMENTED_MP4_FLAGS,
+                outputs[language]
+            ], "split_language"
+        return outputs
+    
+    def process_streaming(self, voice_chunks, estimated_voice_seconds, voice_copy=None):
+        """
+        Run the single-pass graph while the voice-over is still being synthesised.
+        
+        The MP3 bytes are written to ffmpeg's stdin as they arrive, so encoding
+        overlaps with text-to-speech instead of waiting for the whole file.
+        The VideoProcessor must have been created with voice_file=VOICE_PIPE.
+        
+        Args:
+            voice_chunks: Iterable of MP3 byte chunks
+            estimated_voice_seconds (float): Expected voice-over length, used to
+                decide whether the video needs padding
+            voice_copy (str): Optional path to also save the voice-over to. The
+                whole voice-over is saved even if ffmpeg stops reading early
+        
+        Returns:
+            dict: The run's result (see process), plus voice_cut: True if the
+                saved voice-over turned out longer than the video and -shortest
+                cut its end off (only checked with voice_copy)
+        """
+        print(f"Processing {self.video_file} while streaming the voice-over...")
+        
+        self.plan(voice_duration=estimated_voice_seconds * STREAM_ESTIMATE_MARGIN + STREAM_ESTIMATE_SLACK)
+        if self.video_mode == "pad_tail":
+            self.remove_audio()
+            self.build_tail_segment()
+        
+        cmd = self.fused_command()
+        start = time.perf_counter()
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE)
+        copy_file = open(voice_copy, "wb") if voice_copy else None
+        piping = True
+        try:
+            for chunk in voice_chunks:
+                if copy_file:
+                    copy_file.write(chunk)
+                if piping:
+                    try:
+                        proc.stdin.write(chunk)
+                    except BrokenPipeError:
+                        # ffmpeg exited early (its return code says why, or
+                        # -shortest ended the video); keep saving the copy
+                        piping = False
+                if not piping and not copy_file:
+                    break
+            try:
+                proc.stdin.close()
+            except BrokenPipeError:
+                pass
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            if copy_file:
+                copy_file.close()
+        
+        returncode, cpu_seconds, peak_rss = wait_with_usage(proc)
+        _record_ffmpeg("streaming", start, cpu_seconds, peak_rss)
+        if returncode != 0:
+            error = FFmpegError("streaming", returncode, cmd)
+            print(f"✗ Error in streaming processing: {error}")
+            raise error
+        print(f"✓ Voice-over and crowd noise added. Created: {self.final_video}")
+        result = self._result("streaming")
+        result["voice_cut"] = False
+        if voice_copy:
+            voice_seconds = media_duration(get_media_info(voice_copy))
+            if voice_seconds is not None and voice_seconds > self.output_seconds + PAD_TOLERANCE:
+                print(f"✗ Voice-over ran {voice_seconds:.2f}s, past the {self.output_seconds:.2f}s video")
+                result["voice_cut"] = True
+        return result
+    
+    def process_three_step(self, cleanup=True):
+        """
+        Run the original remove_audio -> add_voice_over -> add_crowd_noise chain.
+        
+        Args:
+            cleanup (bool): If True, remove intermediate files afterwards (default: True)
+        """
+        self._run_steps(self._three_step_steps())
+        
+        if cleanup:
+            self._cleanup_temp_files()
+    
+    def _three_step_steps(self):
+        yield from self._remove_audio_steps()
+        yield from self._voice_over_steps()
+        yield from self._crowd_noise_steps()
+    
+    def process(self, cleanup=True, fused=True):
+        """
+        Execute the full video processing pipeline.
+        
+        Args:
+            cleanup (bool): If True, remove temporary files after processing,
+                whether it succeeded or not (default: True)
+            fused (bool): If True, try the NumPy mix with a stream-copy mux (when
+                audio_mix is "numpy"), then the single-pass ffmpeg graph, and fall
+                back to the three-step chain if both fail (default: True)
+        
+        Returns:
+            dict: final_video, method ("premixed", "fused" or "three_step"), video_mode,
+                pad_seconds and outputs (empty for a single language)
+        
+        Raises:
+            FFmpegError: If an ffmpeg step failed (after the fallback, if any)
+                or, in process_async, ran past the timeout
+        """
+        return self._run_steps(self._process_steps(cleanup, fused))
+    
+    async def process_async(self, cleanup=True, fused=True):
+        """
+        process() with async ffmpeg runs, for running many jobs on one event loop.
+        
+        Cancelling the task kills the ffmpeg run in progress and, with cleanup,
+        removes the intermediate files.
+        """
+        # Probing is the only blocking work outside ffmpeg; do it off the loop
+        await asyncio.to_thread(self.plan)
+        return await self._run_steps_async(self._process_steps(cleanup, fused))
+    
+    def _discard_final(self):
+        # A failed attempt's output is deleted rather than overwritten, so a
+        # client following it (delivery.follow_file) sees a new file instead
+        # of a silently rewritten one
+        if os.path.exists(self.final_video):
+            os.remove(self.final_video)
+    
+    def _process_steps(self, cleanup, fused):
+        method = None
+        try:
+            if fused and self.audio_mix == "numpy":
+                try:
+                    yield from self._premixed_steps()
+                    method = "premixed"
+                except FFmpegError as e:
+                    if e.timed_out:
+                        raise
+                    self._discard_final()
+                    print("\nFalling back to the ffmpeg mixing graph...")
+            if fused and method is None:
+                try:
+                    yield from self._fused_steps()
+                    method = "fused"
+                except FFmpegError as e:
+                    if e.timed_out:
+                        raise
+                    self._discard_final()
+                    print("\nFalling back to three-step processing...")
+            if method is None:
+                yield from self._three_step_steps()
+                method = "three_step"
         except Exception as e:
             print(f"\n✗ Processing failed: {e}")
-            sys.exit(1)
+            raise
+        finally:
+            if cleanup:
+                self._cleanup_temp_files()
+        
+        print(f"\n✓ Processing complete! Final video: {self.final_video}")
+        return self._result(method)
     
     def _cleanup_temp_files(self):
         """Remove temporary files created during processing."""
         print(f"\nCleaning up temporary files...")
-        temp_files = [self.temp_video, self.output_video]
+        temp_files = [
+            self.temp_video, self.output_video,
+            self.last_frame, self.tail_video, self.concat_list, self.mixed_audio,
+        ]
         
         for file in temp_files:
             if os.path.exists(file):
@@ -137,16 +1026,28 @@ class VideoProcessor:
 
 def main():
     """Main entry point for command-line usage."""
-    if len(sys.argv) < 2:
-        print("Usage: python video_processor.py <video_file> [voice_file] [crowd_file]")
+    args = sys.argv[1:]
+    fused = "--three-step" not in args
+    args = [a for a in args if a != "--three-step"]
+    
+    if len(args) < 1:
+        print("Usage: python video_processor.py [--three-step] <video_file> [voice_file] [crowd_file]")
         print("\nExample: python video_processor.py trickshot.mp4")
         print("         python video_processor.py trickshot.mp4 my-voice.mp3 my-crowd.mp3")
+        print("         python video_processor.py --three-step trickshot.mp4")
         sys.exit(1)
     
-    video_file = sys.argv[1]
-    voice_file = sys.argv[2] if len(sys.argv) > 2 else "trickshot-voice.mp3"
-    crowd_file = sys.argv[3] if len(sys.argv) > 3 else "crowd-noises.mp3"
+    video_file = args[0]
+    voice_file = args[1] if len(args) > 1 else "trickshot-voice.mp3"
+    crowd_file = args[2] if len(args) > 2 else "crowd-noises.mp3"
     
     processor = VideoProcessor(video_file, voice_file, crowd_file)
-    processor.process(cleanup=True)
+    try:
+        processor.process(cleanup=True, fused=fused)
+    except FFmpegError:
+        # process() has already reported which step failed
+        sys.exit(1)
+
 
+if __name__ == "__main__":
+    main()
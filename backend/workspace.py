@@ -0,0 +1,123 @@
+# per-job working directories, removed after the result is delivered or after a TTL
+import os
+import time
+import shutil
+import asyncio
+
+from jobs import JOBS_DIR
+
+WORKSPACE_TTL = float(os.getenv("WORKSPACE_TTL", str(24 * 3600)))     # seconds
+DELIVERY_GRACE = float(os.getenv("DELIVERY_GRACE", "300"))            # keep for re-downloads/seeks
+SWEEP_INTERVAL = float(os.getenv("WORKSPACE_SWEEP_INTERVAL", "60"))
+
+DELIVERED_MARKER = ".delivered"
+
+
+class WorkspaceManager:
+    """
+    Creates one directory per job under root and deletes it again once it's
+    no longer needed: DELIVERY_GRACE seconds after the result was fully sent
+    to a client, or WORKSPACE_TTL seconds after it was last touched.
+
+    Directories of jobs that are still queued or running are never removed.
+    """
+
+    def __init__(self, root=JOBS_DIR, ttl=WORKSPACE_TTL, grace=DELIVERY_GRACE,
+                 is_active=lambda job_id: False, on_removed=None):
+        """
+        Args:
+            root: Directory the job directories live in
+            ttl: Seconds of inactivity after which a finished job's directory goes
+            grace: Seconds a delivered result is kept for range requests/re-downloads
+            is_active: callable(job_id) -> True while the job may still write files
+            on_removed: Optional callable(job_id) run after a directory is deleted
+        """
+        self.root = root
+        self.ttl = ttl
+        self.grace = grace
+        self.is_active = is_active
+        self.on_removed = on_removed
+        self._task = None
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, job_id):
+        return os.path.join(self.root, job_id)
+
+    def create(self, job_id):
+        """Make and return a fresh directory for a job."""
+        path = self.path(job_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def remove(self, job_id):
+        """Delete a job's directory now."""
+        shutil.rmtree(self.path(job_id), ignore_errors=True)
+        if self.on_removed:
+            self.on_removed(job_id)
+
+    def mark_delivered(self, job_id, part=None, parts=()):
+        """
+        Record that the result was sent in full; the directory goes after the grace period.
+
+        For results that are fetched in parts (e.g. one video per language),
+        pass the part that was sent and the names of all of them: the grace
+        period only starts once every part has been delivered.
+        """
+        path = self.path(job_id)
+        if not os.path.isdir(path):
+            return
+        if part is not None:
+            open(os.path.join(path, f"{DELIVERED_MARKER}.{part}"), "w").close()
+            if not all(os.path.exists(os.path.join(path, f"{DELIVERED_MARKER}.{p}")) for p in parts):
+                return
+        marker = os.path.join(path, DELIVERED_MARKER)
+        if not os.path.exists(marker):
+            with open(marker, "w") as f:
+                f.write(str(time.time()))
+
+    def _expired(self, job_id, now):
+        path = self.path(job_id)
+        marker = os.path.join(path, DELIVERED_MARKER)
+        try:
+            if os.path.exists(marker):
+                return now - os.path.getmtime(marker) > self.grace
+            last_touched = max(
+                (os.path.getmtime(os.path.join(path, name)) for name in os.listdir(path)),
+                default=os.path.getmtime(path),
+            )
+        except FileNotFoundError:
+            return False
+        return now - last_touched > self.ttl
+
+    def sweep(self):
+        """Delete every workspace that is finished and past its grace period or TTL."""
+        now = time.time()
+        removed = []
+        for job_id in os.listdir(self.root):
+            if not os.path.isdir(self.path(job_id)) or self.is_active(job_id):
+                continue
+            if self._expired(job_id, now):
+                self.remove(job_id)
+                removed.append(job_id)
+        if removed:
+            print(f"Removed {len(removed)} expired job workspaces")
+        return removed
+
+    async def _run(self, interval):
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                print(f"✗ Workspace sweep failed: {e}")
+            await asyncio.sleep(interval)
+
+    def start(self, interval=SWEEP_INTERVAL):
+        """Sweep in the background every `interval` seconds."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(interval))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
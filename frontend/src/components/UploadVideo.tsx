@@ -1,13 +1,17 @@
 import { useState, useRef, type ChangeEvent} from "react";
 
+// Stages can overlap (crowd audio is generated while the video is analysed),
+// so each one tracks its own state instead of a single current step.
 const STEPS = [
-  "Analyzing trickshot",
-  "Writing commentary script",
-  "Generating voice over",
-  "Generating crowd audio",
-  "Combining final video",
+  { stage: "analyze", label: "Analyzing trickshot" },
+  { stage: "script", label: "Writing commentary script" },
+  { stage: "tts", label: "Generating voice over" },
+  { stage: "sfx", label: "Generating crowd audio" },
+  { stage: "mux", label: "Combining final video" },
 ];
 
+type StageState = "started" | "done";
+
 function UploadVideo({ language, trickshotName }: { language: string; trickshotName: string }) {
   const [file, setFile] = useState<File | null>(null);
   const [loading, setLoading] = useState<boolean>(false);
@@ -15,6 +19,9 @@ function UploadVideo({ language, trickshotName }: { language: string; trickshotN
   const [videoUrl, setVideoUrl] = useState<string | null>(null);
   const [currentStep, setCurrentStep] = useState<number>(0);
   const [stepMessage, setStepMessage] = useState<string>("");
+  const [stageStates, setStageStates] = useState<Record<string, StageState>>({});
+  const [stagePercents, setStagePercents] = useState<Record<string, number>>({});
+  const [percent, setPercent] = useState<number | null>(null);
   const wsRef = useRef<WebSocket | null>(null);
 
   const handleFileChange = (e: ChangeEvent<HTMLInputElement>): void => {
@@ -51,6 +58,9 @@ function UploadVideo({ language, trickshotName }: { language: string; trickshotN
     setLoading(true);
     setError(null);
     setCurrentStep(0);
+    setStageStates({});
+    setStagePercents({});
+    setPercent(null);
     setStepMessage("Uploading video...");
 
     const clientId = crypto.randomUUID();
@@ -62,7 +72,21 @@ function UploadVideo({ language, trickshotName }: { language: string; trickshotN
     ws.onmessage = (event) => {
       const data = JSON.parse(event.data);
       setCurrentStep(data.step);
-      setStepMessage(data.message);
+      if (data.message) setStepMessage(data.message);
+      if (typeof data.percent === "number") setPercent(data.percent);
+      if (data.stages) {
+        // Every message is a full snapshot of the job
+        const states: Record<string, StageState> = {};
+        const percents: Record<string, number> = {};
+        for (const [stage, entry] of Object.entries(data.stages as Record<string, { state: StageState; percent: number }>)) {
+          states[stage] = entry.state;
+          percents[stage] = entry.percent;
+        }
+        setStageStates(states);
+        setStagePercents(percents);
+      } else if (data.stage) {
+        setStageStates((prev) => ({ ...prev, [data.stage]: data.state }));
+      }
     };
 
     // Wait for WS to connect
@@ -89,7 +113,30 @@ function UploadVideo({ language, trickshotName }: { language: string; trickshotN
         throw new Error(`Upload failed: ${response.statusText}`);
       }
 
-      const blob = await response.blob();
+      const { job_id: jobId } = await response.json();
+
+      // Poll the job until the worker finishes it
+      while (true) {
+        await new Promise((resolve) => setTimeout(resolve, 2000));
+        const statusResponse = await fetch(`http://localhost:8000/jobs/${jobId}`);
+        if (!statusResponse.ok) {
+          throw new Error(`Status check failed: ${statusResponse.statusText}`);
+        }
+        const job = await statusResponse.json();
+        if (job.status === "failed") {
+          throw new Error(job.error || "Processing failed");
+        }
+        if (job.status === "done") {
+          break;
+        }
+      }
+
+      const resultResponse = await fetch(`http://localhost:8000/jobs/${jobId}/result`);
+      if (!resultResponse.ok) {
+        throw new Error(`Download failed: ${resultResponse.statusText}`);
+      }
+
+      const blob = await resultResponse.blob();
       const url = URL.createObjectURL(blob);
       setVideoUrl(url);
     } catch (err) {
@@ -100,6 +147,9 @@ function UploadVideo({ language, trickshotName }: { language: string; trickshotN
       wsRef.current = null;
       setLoading(false);
       setCurrentStep(0);
+      setStageStates({});
+      setStagePercents({});
+      setPercent(null);
       setStepMessage("");
     }
   };
@@ -121,7 +171,7 @@ function UploadVideo({ language, trickshotName }: { language: string; trickshotN
     }
   };
 
-  const progressPercent = (currentStep / 5) * 100;
+  const progressPercent = percent ?? (currentStep / 5) * 100;
 
   return (
     <div className="w-full max-w-2xl mx-auto">
@@ -156,12 +206,11 @@ function UploadVideo({ language, trickshotName }: { language: string; trickshotN
 
               {/* Step list */}
               <div className="space-y-2">
-                {STEPS.map((label, i) => {
-                  const stepNum = i + 1;
-                  const isDone = currentStep > stepNum;
-                  const isActive = currentStep === stepNum;
+                {STEPS.map(({ stage, label }) => {
+                  const isDone = stageStates[stage] === "done";
+                  const isActive = stageStates[stage] === "started";
                   return (
-                    <div key={i} className="flex items-center gap-3">
+                    <div key={stage} className="flex items-center gap-3">
                       {/* Icon */}
                       {isDone ? (
                         <svg className="w-5 h-5 flex-shrink-0" style={{ color: "#22c55e" }} fill="none" stroke="currentColor" viewBox="0 0 24 24">
@@ -191,6 +240,7 @@ function UploadVideo({ language, trickshotName }: { language: string; trickshotN
                         }}
                       >
                         {label}
+                        {isActive && stagePercents[stage] > 0 && ` (${Math.round(stagePercents[stage])}%)`}
                       </span>
                     </div>
                   );